@@ -0,0 +1,153 @@
+"""
+効果音・BGM エンジン（main_motor.py / sub.py 共通）
+
+- 起動時に全音源をデコードしてメモリに載せる（再生時にファイルを読まない）
+- 用途ごとにチャンネルを予約する（リールごと・演出の種類ごと）。
+  Sound.play() の自動割り当てと違い、別グループの音に奪われない
+- play() に渡したきっかけ時刻から、ミキサーへ渡し終わるまでの時間を記録する
+  （実際に鳴るのは、そこからミキサーバッファ1つ分あと：buffer_latency_ms）
+"""
+import threading
+import time
+from collections import deque
+
+import pygame
+
+import slotlog
+import timebase
+from stats import percentile
+
+FREQUENCY = 44100
+SIZE = -16
+CHANNELS = 2
+BUFFER = 512
+
+_log = slotlog.get("AUDIO")
+
+def pre_init():
+    """pygame.init() より前に呼ぶ（両基板で同じバッファ設定にする）"""
+    pygame.mixer.pre_init(FREQUENCY, SIZE, CHANNELS, BUFFER)
+
+class AudioEngine:
+    def __init__(self, groups, history=1024):
+        """
+        groups: {グループ名: 予約チャンネル数}
+          例）{"reel": 3, "se": 2, "bgm": 1}
+        """
+        self.available = True
+        try:
+            if not pygame.mixer.get_init():
+                pygame.mixer.init(FREQUENCY, SIZE, CHANNELS, BUFFER)
+        except pygame.error as e:
+            _log.error("[AUDIO] mixer initエラー: %s", e)
+            self.available = False
+
+        self._lock = threading.Lock()
+        self._sounds = {}     # 名前 -> (Sound, グループ)
+        self._streams = {}    # 名前 -> (パス, グループ)（Sound にできなかった BGM）
+        self._groups = {}     # グループ名 -> [Channel, ...]
+        self._latency = {}    # 名前 -> deque(ns)
+        self._started = {}    # Channel -> 鳴らし始めた時刻（横取り先を選ぶ用）
+        self._history = history
+        self.stolen = 0
+
+        if not self.available:
+            return
+        total = sum(groups.values())
+        pygame.mixer.set_num_channels(total)
+        # 予約しておくと、自動割り当て（Sound.play()）には使われない
+        pygame.mixer.set_reserved(total)
+        start = 0
+        for name, count in groups.items():
+            self._groups[name] = [pygame.mixer.Channel(start + i) for i in range(count)]
+            start += count
+
+    @property
+    def buffer_latency_ms(self):
+        return BUFFER / FREQUENCY * 1000
+
+    def load(self, name, path, group, stream_fallback=False):
+        """
+        path をデコードして name で登録する。失敗しても他の音には影響しない。
+        stream_fallback=True なら、Sound にできない形式は pygame.mixer.music で流す。
+        """
+        if not self.available:
+            return False
+        if group not in self._groups:
+            raise KeyError(f"未定義のチャンネルグループ: {group}")
+        t0 = time.perf_counter()
+        try:
+            sound = pygame.mixer.Sound(path)
+        except (FileNotFoundError, pygame.error) as e:
+            if stream_fallback:
+                _log.warn("[AUDIO] %s: デコード失敗のためストリーム再生（%s）", path, e)
+                self._streams[name] = (path, group)
+                return True
+            _log.error("[AUDIO] 効果音エラー: %s", e)
+            return False
+        self._sounds[name] = (sound, group)
+        _log.info("[AUDIO] %s: %s %.2f秒 (%.1f ms)", name, path, sound.get_length(), (time.perf_counter() - t0) * 1000)
+        return True
+
+    def has(self, name):
+        return name in self._sounds or name in self._streams
+
+    def _pick_channel_locked(self, group, index):
+        chans = self._groups[group]
+        if index is not None:
+            return chans[index % len(chans)]
+        for ch in chans:
+            if not ch.get_busy():
+                return ch
+        # 全部鳴っていたらグループ内で一番古いもの（他グループからは奪わない）
+        self.stolen += 1
+        return min(chans, key=lambda ch: self._started.get(ch, 0))
+
+    def play(self, name, loops=0, index=None, trigger_ns=None):
+        """
+        name を再生する。index 指定でグループ内の固定チャンネル（リール番号など）。
+        trigger_ns: きっかけの timebase.perf_counter_ns()（省略時は呼び出し時刻）
+        """
+        if trigger_ns is None:
+            trigger_ns = timebase.perf_counter_ns()
+        if name in self._sounds:
+            sound, group = self._sounds[name]
+            with self._lock:
+                ch = self._pick_channel_locked(group, index)
+                ch.play(sound, loops=loops)
+                self._started[ch] = trigger_ns
+        elif name in self._streams:
+            path, group = self._streams[name]
+            with self._lock:
+                try:
+                    pygame.mixer.music.load(path)
+                    pygame.mixer.music.play(loops)
+                except pygame.error as e:
+                    _log.error("[AUDIO] %s 再生失敗: %s", name, e)
+                    return False
+        else:
+            return False
+        elapsed = timebase.perf_counter_ns() - trigger_ns
+        # play はリール・受信スレッドから同時に呼ばれ、latency_report が並行して読む
+        with self._lock:
+            self._latency.setdefault(name, deque(maxlen=self._history)).append(elapsed)
+        return True
+
+    def stop(self, name):
+        if name in self._sounds:
+            self._sounds[name][0].stop()
+        elif name in self._streams:
+            pygame.mixer.music.stop()
+
+    def stop_group(self, group):
+        for ch in self._groups.get(group, ()):
+            ch.stop()
+
+    def latency_report(self):
+        lines = [f"--- 効果音 きっかけ→ミキサー投入（ms: p50 / p95 / p99, n）＋バッファ {self.buffer_latency_ms:.1f} ms / 横取り {self.stolen} ---"]
+        with self._lock:
+            series = [(name, sorted(vals)) for name, vals in self._latency.items()]
+        for name, vals in series:
+            p50, p95, p99 = (percentile(vals, p) / 1e6 for p in (50, 95, 99))
+            lines.append(f"  {name:<10} {p50:9.3f} / {p95:9.3f} / {p99:9.3f}  (n={len(vals)})")
+        return "\n".join(lines)
@@ -0,0 +1,82 @@
+"""
+受信メッセージの振り分け（sub.py 用）
+
+receiver_thread が put() したメッセージを、待っている側へ渡す。
+- wait_for(kinds, timeout) : 指定種別が来るまで眠って待つ（他の種別は消さずに残す）
+- get_nowait()             : 一番古いメッセージを取り出す（メインループ用）
+- put() から受け取りまでの時間を記録し、latency_report() で p50/p95/p99 を出す
+"""
+import threading
+import time
+from collections import deque
+
+from stats import percentile
+
+class MessageDispatcher:
+    def __init__(self, kind=None, on_put=None, history=1024):
+        self._kind = kind or (lambda m: m)
+        self._on_put = on_put
+        self._cond = threading.Condition()
+        self._items = deque()   # (put時刻ns, メッセージ)
+        self._wake_ns = deque(maxlen=history)   # wait_for で眠っていた側の起床遅延
+        self._queue_ns = deque(maxlen=history)  # get_nowait で取り出すまでの滞留時間
+
+    def put(self, msg):
+        with self._cond:
+            self._items.append((time.perf_counter_ns(), msg))
+            self._cond.notify_all()
+        if self._on_put is not None:
+            self._on_put()
+
+    def empty(self):
+        with self._cond:
+            return not self._items
+
+    def get_nowait(self):
+        """一番古いメッセージ（無ければ None）"""
+        with self._cond:
+            if not self._items:
+                return None
+            t, msg = self._items.popleft()
+            self._queue_ns.append(time.perf_counter_ns() - t)
+            return msg
+
+    def _take_locked(self, kinds):
+        for i, (t, msg) in enumerate(self._items):
+            if self._kind(msg) in kinds:
+                del self._items[i]
+                return t, msg
+        return None
+
+    def wait_for(self, kinds, timeout=None):
+        """
+        kinds（文字列 or その集合）に一致するメッセージを待って取り出す。
+        一致しないメッセージは順番を保ったまま残る。timeout 経過で None。
+        """
+        if isinstance(kinds, str):
+            kinds = (kinds,)
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while True:
+                hit = self._take_locked(kinds)
+                if hit is not None:
+                    self._wake_ns.append(time.perf_counter_ns() - hit[0])
+                    return hit[1]
+                if deadline is None:
+                    self._cond.wait()
+                else:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        return None
+                    self._cond.wait(remaining)
+
+    def latency_report(self):
+        lines = ["--- 受信→受け取り遅延（ms: p50 / p95 / p99, n） ---"]
+        with self._cond:
+            series = (("wait_for", sorted(self._wake_ns)), ("get_nowait", sorted(self._queue_ns)))
+        for name, vals in series:
+            if not vals:
+                continue
+            p50, p95, p99 = (percentile(vals, p) / 1e6 for p in (50, 95, 99))
+            lines.append(f"  {name:<10} {p50:9.3f} / {p95:9.3f} / {p99:9.3f}  (n={len(vals)})")
+        return "\n".join(lines)
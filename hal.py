@@ -0,0 +1,497 @@
+"""
+ハードウェア抽象化レイヤ（GPIO / PCA9685 / 連続回転サーボ）
+
+main_motor.py と sub.py はここから取得したバックエンド経由でハードを触る。
+  SLOT_BACKEND=rpi（既定） : RPi.GPIO + adafruit_pca9685（実機）
+  SLOT_BACKEND=sim         : ソフトウェアシミュレータ（実機なしでヘッドレス実行）
+
+バックエンドが提供するもの
+  backend.gpio                          RPi.GPIO 互換（setup/input/output/add_event_detect など）
+  backend.create_pca()                  PCA9685 互換（channels[i].duty_cycle / frequency / deinit）
+  backend.continuous_servo(ch, ...)     ContinuousServo 互換（throttle）
+  backend.bind_reel(pca_ch, sensor_pin) リール（サーボ）とセンサーの対応付け（simのみ意味を持つ）
+
+シミュレータの設定（環境変数）
+  SLOT_SIM_RPM       COUNTER_CLOCKWISE相当（スロットル0.8）での回転数 [rpm]（既定 40）
+  SLOT_SIM_NEUTRAL   静止するスロットル値（既定 0.3 = STOP_SPEED）
+  SLOT_SIM_COAST     全速から静止までの惰性時間 [秒]（直線減速、既定 0.08。0 で即停止）
+  SLOT_SIM_AUTOPLAY  1 ならレバー/STOP/PUSHボタンを自動で操作する
+  SLOT_SIM_REELS     0 ならリールを回さない（センサーは外から入れる。replay.py 用）
+"""
+import os
+import random
+import threading
+
+import slotlog
+import timebase
+
+_log = slotlog.get("SIM")
+
+_backend = None
+_backend_lock = threading.Lock()
+
+def get_backend():
+    """プロセス内で共有するバックエンドを返す（初回呼び出しで生成）"""
+    global _backend
+    with _backend_lock:
+        if _backend is None:
+            name = os.environ.get("SLOT_BACKEND", "rpi").lower()
+            if name == "sim":
+                _backend = SimBackend(
+                    rpm=float(os.environ.get("SLOT_SIM_RPM", "40")),
+                    neutral_throttle=float(os.environ.get("SLOT_SIM_NEUTRAL", "0.3")),
+                    coast=float(os.environ.get("SLOT_SIM_COAST", "0.08")),
+                    reels=os.environ.get("SLOT_SIM_REELS", "1") != "0",
+                )
+            elif name == "rpi":
+                _backend = RPiBackend()
+            else:
+                raise ValueError(f"未知のバックエンド: {name}")
+        return _backend
+
+class Backend:
+    """バックエンド共通インターフェース"""
+    name = "base"
+    simulated = False
+
+    def __init__(self):
+        self.gpio = None
+
+    def create_pca(self):
+        raise NotImplementedError
+
+    def continuous_servo(self, pwm_channel, min_pulse=750, max_pulse=2250):
+        raise NotImplementedError
+
+    def bind_reel(self, pca_channel, sensor_pin):
+        pass
+
+    def start_autoplay(self, lever_pin=None, stop_pins=(), push_pin=None):
+        pass
+
+# ===================== 実機 =====================
+class RPiBackend(Backend):
+    name = "rpi"
+
+    def __init__(self):
+        super().__init__()
+        import RPi.GPIO as GPIO
+        self.gpio = GPIO
+
+    def create_pca(self):
+        import board
+        import busio
+        from adafruit_pca9685 import PCA9685
+        i2c = busio.I2C(board.SCL, board.SDA)
+        return PCA9685(i2c)
+
+    def continuous_servo(self, pwm_channel, min_pulse=750, max_pulse=2250):
+        from adafruit_motor.servo import ContinuousServo
+        return ContinuousServo(pwm_channel, min_pulse=min_pulse, max_pulse=max_pulse)
+
+# ===================== シミュレータ：GPIO =====================
+class SimGPIO:
+    """RPi.GPIO 互換のソフトウェアGPIO（コールバックは専用スレッドで順に呼ぶ）"""
+    BCM = 11
+    BOARD = 10
+    OUT = 0
+    IN = 1
+    LOW = 0
+    HIGH = 1
+    PUD_OFF = 20
+    PUD_DOWN = 21
+    PUD_UP = 22
+    RISING = 31
+    FALLING = 32
+    BOTH = 33
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._mode = None
+        self._dirs = {}
+        self._levels = {}
+        self._detect = {}      # pin -> [edge, bouncetime(s), last_t, callbacks, detected]
+        self._output_listeners = []
+        self._cb_queue = timebase.Queue()
+        timebase.spawn(self._callback_worker, name="sim-gpio")
+
+    def setwarnings(self, flag):
+        pass
+
+    def setmode(self, mode):
+        self._mode = mode
+
+    def getmode(self):
+        return self._mode
+
+    def setup(self, pin, direction, pull_up_down=PUD_OFF, initial=-1):
+        if isinstance(pin, (list, tuple)):
+            for p in pin:
+                self.setup(p, direction, pull_up_down, initial)
+            return
+        with self._lock:
+            self._dirs[pin] = direction
+            if direction == self.OUT:
+                self._levels[pin] = self.LOW if initial == -1 else initial
+            elif pin not in self._levels:
+                # プル指定なしは HIGH 扱い（レバー未操作と同じ）
+                self._levels[pin] = self.LOW if pull_up_down == self.PUD_DOWN else self.HIGH
+
+    def input(self, pin):
+        with self._lock:
+            return self._levels.get(pin, self.LOW)
+
+    def output(self, pin, value):
+        with self._lock:
+            self._levels[pin] = self.HIGH if value else self.LOW
+            listeners = list(self._output_listeners)
+        for fn in listeners:
+            fn(pin, value)
+
+    def add_event_detect(self, pin, edge, callback=None, bouncetime=None):
+        with self._lock:
+            if pin in self._detect:
+                raise RuntimeError("Conflicting edge detection already enabled for this GPIO channel")
+            cbs = [callback] if callback is not None else []
+            self._detect[pin] = [edge, (bouncetime or 0) / 1000.0, -1e9, cbs, False]
+
+    def add_event_callback(self, pin, callback):
+        with self._lock:
+            if pin not in self._detect:
+                raise RuntimeError("Add event detection using add_event_detect first before adding a callback")
+            self._detect[pin][3].append(callback)
+
+    def remove_event_detect(self, pin):
+        with self._lock:
+            self._detect.pop(pin, None)
+
+    def event_detected(self, pin):
+        with self._lock:
+            d = self._detect.get(pin)
+            if d is None or not d[4]:
+                return False
+            d[4] = False
+            return True
+
+    def cleanup(self, pin=None):
+        with self._lock:
+            if pin is None:
+                self._detect.clear()
+                self._dirs.clear()
+            else:
+                self._detect.pop(pin, None)
+                self._dirs.pop(pin, None)
+
+    # ---- シミュレータ側から入力を動かす ----
+    def drive(self, pin, value):
+        """外部から入力ピンのレベルを変える（エッジならコールバック発火）"""
+        value = self.HIGH if value else self.LOW
+        with self._lock:
+            prev = self._levels.get(pin, self.LOW)
+            self._levels[pin] = value
+            if prev == value:
+                return
+            d = self._detect.get(pin)
+            if d is None:
+                return
+            edge = self.RISING if value == self.HIGH else self.FALLING
+            if d[0] != self.BOTH and d[0] != edge:
+                return
+            now = timebase.monotonic()
+            if now - d[2] < d[1]:
+                return
+            d[2] = now
+            d[4] = True
+            cbs = list(d[3])
+        for cb in cbs:
+            self._cb_queue.put((cb, pin))
+
+    def set_level(self, pin, value):
+        """入力ピンのレベルだけを変える（コールバックは呼ばない。replay.py 用）"""
+        with self._lock:
+            self._levels[pin] = self.HIGH if value else self.LOW
+
+    def trigger(self, pin):
+        """pin のコールバックをエッジ種別・チャタリング判定なしで呼ぶ（replay.py 用）"""
+        with self._lock:
+            d = self._detect.get(pin)
+            if d is None:
+                return
+            d[4] = True
+            cbs = list(d[3])
+        for cb in cbs:
+            self._cb_queue.put((cb, pin))
+
+    def add_output_listener(self, fn):
+        with self._lock:
+            self._output_listeners.append(fn)
+
+    def _callback_worker(self):
+        while True:
+            cb, pin = self._cb_queue.get()
+            try:
+                cb(pin)
+            except Exception as e:
+                _log.error("[SIM] GPIOコールバック例外 pin=%s: %s", pin, e)
+
+# ===================== シミュレータ：PCA9685 =====================
+class SimPWMChannel:
+    def __init__(self, pca, index):
+        self._pca = pca
+        self._index = index
+        self._duty = 0
+        self.servo_range = None   # (min_duty, duty_range)：サーボ接続時に設定
+
+    @property
+    def frequency(self):
+        return self._pca.frequency
+
+    @property
+    def duty_cycle(self):
+        return self._duty
+
+    @duty_cycle.setter
+    def duty_cycle(self, value):
+        if not 0 <= value <= 0xFFFF:
+            raise ValueError(f"Out of range: value {value} not 0 <= value <= 65,535")
+        self._duty = value
+        self._pca._notify(self._index, value)
+
+class SimPCA9685:
+    def __init__(self):
+        self.frequency = 50
+        self.channels = [SimPWMChannel(self, i) for i in range(16)]
+        self._listeners = []
+
+    def add_listener(self, fn):
+        self._listeners.append(fn)
+
+    def _notify(self, index, duty):
+        for fn in self._listeners:
+            fn(index, duty)
+
+    def reset(self):
+        pass
+
+    def deinit(self):
+        self.reset()
+
+class SimContinuousServo:
+    """adafruit_motor.servo.ContinuousServo と同じ throttle -> duty_cycle 換算"""
+    def __init__(self, pwm_out, min_pulse=750, max_pulse=2250):
+        self._pwm_out = pwm_out
+        self._min_duty = int((min_pulse * pwm_out.frequency) / 1000000 * 0xFFFF)
+        max_duty = (max_pulse * pwm_out.frequency) / 1000000 * 0xFFFF
+        self._duty_range = int(max_duty - self._min_duty)
+        pwm_out.servo_range = (self._min_duty, self._duty_range)
+
+    @property
+    def throttle(self):
+        if self._pwm_out.duty_cycle == 0:
+            return None
+        return (self._pwm_out.duty_cycle - self._min_duty) / self._duty_range * 2 - 1
+
+    @throttle.setter
+    def throttle(self, value):
+        if value is None:
+            self._pwm_out.duty_cycle = 0
+            return
+        if not -1.0 <= value <= 1.0:
+            raise ValueError("Throttle must be None or between -1.0 and +1.0")
+        self._pwm_out.duty_cycle = self._min_duty + int((value + 1) / 2 * self._duty_range)
+
+# ===================== シミュレータ：リール =====================
+class SimReel:
+    """1回転に1回センサーパルスを出すリール（angle は回転数、0.0 が7の位置）"""
+    def __init__(self, pca_channel, sensor_pin, pulse_width):
+        self.pca_channel = pca_channel
+        self.sensor_pin = sensor_pin
+        self.pulse_width = pulse_width
+        self.angle = random.random()
+        self.speed = 0.0          # 今の回転速度 [rev/s]
+        self.target_speed = 0.0   # サーボ指令の速度（惰性で speed がここへ近づく）
+        self.level = 0
+
+    def sensor_level(self):
+        return 1 if (self.angle % 1.0) < self.pulse_width else 0
+
+    def step(self, dt, accel):
+        """dt 秒進める（accel [rev/s^2] で target_speed へ直線的に近づく）"""
+        if self.speed != self.target_speed and accel > 0:
+            diff = self.target_speed - self.speed
+            t_ramp = min(dt, abs(diff) / accel)
+            a = accel if diff > 0 else -accel
+            self.angle += self.speed * t_ramp + a * t_ramp * t_ramp / 2
+            if t_ramp >= abs(diff) / accel:
+                self.speed = self.target_speed
+            else:
+                self.speed += a * t_ramp
+            dt -= t_ramp
+        else:
+            self.speed = self.target_speed
+        if self.speed != 0.0 and dt > 0:
+            self.angle += self.speed * dt
+        self.angle %= 1.0
+
+    @property
+    def ramping(self):
+        return self.speed != self.target_speed
+
+    def time_to_next_boundary(self):
+        if self.speed == 0.0:
+            return None
+        frac = self.angle % 1.0
+        if self.speed > 0:
+            targets = (self.pulse_width, 1.0)
+            dist = min(t - frac for t in targets if t > frac)
+        else:
+            targets = (0.0, self.pulse_width)
+            lower = [frac - t for t in targets if t < frac]
+            dist = min(lower) if lower else frac + (1.0 - self.pulse_width)
+        return dist / abs(self.speed)
+
+class SimBackend(Backend):
+    """
+    ソフトウェアのみで動くバックエンド。
+    - サーボの duty_cycle から回転速度を求め、リールの角度を進める
+    - 7の位置を通過するたびにセンサーピンへパルス（立ち上がり→立ち下がり）を出す
+    - 次のエッジ時刻まで眠るイベント駆動なので、待機中はCPUを使わない
+    """
+    name = "sim"
+    simulated = True
+
+    # 境界ちょうどで止まると同じエッジを繰り返すので、少しだけ通り過ぎる
+    _EDGE_EPS = 1e-6
+
+    # 惰性で減速中は、この周期で速度を更新しながら進める
+    _RAMP_STEP = 0.002
+
+    def __init__(self, rpm=40.0, neutral_throttle=0.3, full_throttle=0.8, pulse_width=0.03, deadband=0.02, coast=0.0, reels=True):
+        super().__init__()
+        self.gpio = SimGPIO()
+        self.rpm = rpm
+        self.neutral_throttle = neutral_throttle
+        self.full_throttle = full_throttle
+        self.pulse_width = pulse_width
+        self.deadband = deadband
+        # 全速 -> 静止 を coast 秒で（0 なら即座に速度が変わる）
+        self.accel = (rpm / 60.0) / coast if coast > 0 else 0.0
+        # False ならリールを結び付けない（センサーピンは外から set_level / trigger する）
+        self.reels = reels
+        self.pca = None
+        self._reels = {}   # pca_channel -> SimReel
+        self._lock = threading.Lock()
+        self._wake = timebase.Event()
+        self._t_last = timebase.monotonic()
+        self._thread = None
+
+    def create_pca(self):
+        if self.pca is None:
+            self.pca = SimPCA9685()
+            self.pca.add_listener(self._on_duty)
+        return self.pca
+
+    def continuous_servo(self, pwm_channel, min_pulse=750, max_pulse=2250):
+        return SimContinuousServo(pwm_channel, min_pulse=min_pulse, max_pulse=max_pulse)
+
+    def bind_reel(self, pca_channel, sensor_pin):
+        if not self.reels:
+            return
+        with self._lock:
+            self._advance(timebase.monotonic())
+            reel = SimReel(pca_channel, sensor_pin, self.pulse_width)
+            self._reels[pca_channel] = reel
+            reel.level = reel.sensor_level()
+            self.gpio.drive(sensor_pin, reel.level)
+        if self._thread is None:
+            self._thread = timebase.spawn(self._reel_worker, name="sim-reels")
+
+    def throttle_to_speed(self, throttle):
+        """スロットル -> 回転速度 [rev/s]（静止点からの差に比例）"""
+        if throttle is None:
+            return 0.0
+        delta = throttle - self.neutral_throttle
+        if abs(delta) < self.deadband:
+            return 0.0
+        return self.rpm / 60.0 * delta / (self.full_throttle - self.neutral_throttle)
+
+    def _on_duty(self, index, duty):
+        reel = self._reels.get(index)
+        if reel is None:
+            return
+        ch = self.pca.channels[index]
+        throttle = None
+        if duty != 0 and ch.servo_range is not None:
+            min_duty, duty_range = ch.servo_range
+            throttle = (duty - min_duty) / duty_range * 2 - 1
+        with self._lock:
+            self._advance(timebase.monotonic())
+            reel.target_speed = self.throttle_to_speed(throttle)
+            if self.accel == 0.0:
+                reel.speed = reel.target_speed
+        self._wake.set()
+
+    def _advance(self, now):
+        # _lock 保持中に呼ぶこと
+        dt = now - self._t_last
+        self._t_last = now
+        edges = []
+        for reel in self._reels.values():
+            if dt > 0:
+                reel.step(dt, self.accel)
+            level = reel.sensor_level()
+            if level != reel.level:
+                reel.level = level
+                edges.append((reel.sensor_pin, level))
+        return edges
+
+    def _reel_worker(self):
+        while True:
+            with self._lock:
+                waits = [r.time_to_next_boundary() for r in self._reels.values()]
+                if any(r.ramping for r in self._reels.values()):
+                    waits.append(self._RAMP_STEP)
+            waits = [w for w in waits if w is not None]
+            timeout = (min(waits) + self._EDGE_EPS) if waits else None
+            self._wake.wait(timeout)
+            self._wake.clear()
+            with self._lock:
+                edges = self._advance(timebase.monotonic())
+            for pin, level in edges:
+                self.gpio.drive(pin, level)
+
+    def start_autoplay(self, lever_pin=None, stop_pins=(), push_pin=None):
+        """プレイヤー操作を自動化（レバー→STOP×3 / PUSHボタン）"""
+        SimPlayer(self.gpio, lever_pin, stop_pins, push_pin).start()
+
+class SimPlayer:
+    """レバーを引き、少し待って STOP ボタンを順に押す。PUSHボタンも時々押す"""
+    def __init__(self, gpio, lever_pin=None, stop_pins=(), push_pin=None, cycle=3.0):
+        self.gpio = gpio
+        self.lever_pin = lever_pin
+        self.stop_pins = tuple(stop_pins)
+        self.push_pin = push_pin
+        self.cycle = cycle
+
+    def start(self):
+        return timebase.spawn(self.run, name="sim-player")
+
+    def _pulse(self, pin, active, width=0.1):
+        self.gpio.drive(pin, active)
+        timebase.sleep(width)
+        self.gpio.drive(pin, 1 - active)
+
+    def run(self):
+        # 待機レベル：レバー/STOPは HIGH、PUSHボタンは LOW（押すと HIGH）
+        if self.push_pin is not None:
+            self.gpio.drive(self.push_pin, SimGPIO.LOW)
+        while True:
+            if self.lever_pin is not None:
+                self._pulse(self.lever_pin, SimGPIO.LOW)
+            timebase.sleep(random.uniform(0.5, 1.5))
+            for pin in self.stop_pins:
+                self._pulse(pin, SimGPIO.LOW, 0.05)
+                timebase.sleep(random.uniform(0.2, 0.6))
+            if self.push_pin is not None:
+                self._pulse(self.push_pin, SimGPIO.HIGH)
+            timebase.sleep(self.cycle)
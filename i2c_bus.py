@@ -0,0 +1,136 @@
+"""
+I2C バスの調停（main_motor.py 用）
+
+PCA9685 への書き込みは、すべてこのバス担当スレッド1本が行う。
+優先度つきキューで、サーボ停止 > サーボ始動 > LED演出 の順に処理する。
+（LED の点滅が続いていても、リール停止がその後ろに並ばない）
+
+- write(duties, priority, wait, on_done)  : {チャンネル: duty} を投入。wait=True なら書き終わるまで待つ
+  on_done(t_ns) はバス担当スレッドが書き終わった時刻で呼ぶ（待てない GPIO コールバックからの停止用）
+- 前回と同じ値だけの書き込みは、バスに出さずに捨てる
+- report() : 優先度ごとの 投入→書き込み完了 の遅延と、キューの深さ
+"""
+import itertools
+import threading
+from collections import deque
+
+import slotlog
+import timebase
+from pca_batch import CHANNEL_COUNT, throttle_to_duty
+from stats import percentile
+
+PRIO_SERVO_STOP = 0
+PRIO_SERVO_START = 1
+PRIO_LED = 2
+
+PRIO_NAMES = {
+    PRIO_SERVO_STOP: "servo_stop",
+    PRIO_SERVO_START: "servo_start",
+    PRIO_LED: "led",
+}
+
+_CLOSE = object()
+
+_log = slotlog.get("I2C")
+
+class _Command:
+    __slots__ = ("duties", "all_off", "enqueue_ns", "done", "error", "on_done")
+
+    def __init__(self, duties, all_off=False, wait=False, on_done=None):
+        self.duties = duties
+        self.all_off = all_off
+        self.enqueue_ns = timebase.perf_counter_ns()
+        self.done = timebase.Event() if wait else None
+        self.error = None
+        self.on_done = on_done
+
+class I2CArbiter:
+    def __init__(self, batch, history=1024):
+        """batch: pca_batch.PCABatch（実際の書き込み先）"""
+        self.batch = batch
+        self._queue = timebase.PriorityQueue()
+        self._order = itertools.count()   # 同じ優先度は投入順
+        self._last = {}                    # チャンネル -> 最後に書いた duty
+        self._latency = {p: deque(maxlen=history) for p in PRIO_NAMES}
+        self._lock = threading.Lock()      # 統計用
+        self.written = 0
+        self.skipped = 0
+        self.max_depth = 0
+        self._thread = timebase.spawn(self._run, name="i2c-bus")
+
+    # ---------- 投入側 ----------
+    def _submit(self, priority, cmd):
+        depth = self._queue.qsize()
+        with self._lock:
+            if depth > self.max_depth:
+                self.max_depth = depth
+        self._queue.put((priority, next(self._order), cmd))
+        if cmd.done is not None:
+            cmd.done.wait()
+            if cmd.error is not None:
+                raise cmd.error
+
+    def write(self, duties, priority, wait=False, on_done=None):
+        self._submit(priority, _Command(dict(duties), wait=wait, on_done=on_done))
+
+    def set_throttles(self, throttles, priority, wait=True, on_done=None):
+        self.write({s.channel: throttle_to_duty(s, t) for s, t in throttles.items()}, priority, wait, on_done)
+
+    def all_off(self, wait=True):
+        self._submit(PRIO_SERVO_STOP, _Command(None, all_off=True, wait=wait))
+
+    @property
+    def depth(self):
+        return self._queue.qsize()
+
+    def close(self):
+        """溜まっている分を書き終えてからバス担当スレッドを止める"""
+        self._queue.put((PRIO_LED + 1, next(self._order), _CLOSE))
+        self._thread.join(timeout=1.0)
+
+    # ---------- バス担当スレッド ----------
+    def _run(self):
+        while True:
+            priority, _, cmd = self._queue.get()
+            if cmd is _CLOSE:
+                return
+            try:
+                self._execute(cmd)
+                with self._lock:
+                    self._latency[priority].append(timebase.perf_counter_ns() - cmd.enqueue_ns)
+            except Exception as e:
+                cmd.error = e
+                if cmd.done is None:
+                    _log.error("[I2C] 書き込み失敗（%s）: %s", PRIO_NAMES[priority], e)
+            finally:
+                # 失敗しても呼ぶ（完了を待っている側を止めない）
+                if cmd.on_done is not None:
+                    cmd.on_done(timebase.perf_counter_ns())
+                if cmd.done is not None:
+                    cmd.done.set()
+
+    def _execute(self, cmd):
+        if cmd.all_off:
+            self.batch.all_off()
+            self._last = dict.fromkeys(range(CHANNEL_COUNT), 0)
+            self.written += 1
+            return
+        changed = {ch: d for ch, d in cmd.duties.items() if self._last.get(ch) != d}
+        if not changed:
+            self.skipped += 1
+            return
+        self.batch.write(changed)
+        self._last.update(changed)
+        self.written += 1
+
+    # ---------- 計測 ----------
+    def report(self):
+        lines = [f"--- I2C 投入→書き込み完了（ms: p50 / p95 / p99, n）書き込み {self.written} / 同値スキップ {self.skipped} / 最大キュー深さ {self.max_depth} ---"]
+        with self._lock:
+            series = [(PRIO_NAMES[p], sorted(v)) for p, v in self._latency.items()]
+        for name, vals in series:
+            if not vals:
+                continue
+            p50, p95, p99 = (percentile(vals, p) / 1e6 for p in (50, 95, 99))
+            lines.append(f"  {name:<12} {p50:9.3f} / {p95:9.3f} / {p99:9.3f}  (n={len(vals)})")
+        return "\n".join(lines)
@@ -0,0 +1,328 @@
+"""
+入出力トレース（GPIO エッジ・PCA 書き込み・抽選の rn をナノ秒で記録する）
+
+現場でしか起きないタイミングの不具合を持ち帰るための記録。
+SLOT_IO_TRACE=<ディレクトリ> のとき main_motor.py / sub.py が
+  <ディレクトリ>/main-YYYYmmdd-HHMMSS.iot  /  sub-YYYYmmdd-HHMMSS.iot
+に書き出す。再生と比較は python replay.py <ファイル>。
+
+記録するもの（時刻は記録開始からの ns。timebase.perf_counter_ns）
+  EDGE    : アプリに届いたエッジコールバック（チャタリング除去後。値は 1=立ち上がり / 0=立ち下がり）
+  PIN     : watch() したピン（アプリがポーリングしかしないレバー・PUSH）の両エッジとそのレベル
+  LEVEL   : input() が前回読んだときと違う値を返した（ポーリングで見えたレベル）
+  OUT     : GPIO.output
+  PCA     : PCA9685 のチャンネルへ実際に書いた duty（I2CArbiter がバスに出した値）
+  ALL_OFF : PCA9685 の全消灯
+  RN      : 抽選の rn（draw() 経由。double のビット列そのまま）
+  MARK    : 区間の印（ラウンド開始・button 演出の開始/終了）
+
+ファイル：ヘッダ（MAGIC, 版, 役割, 開始時刻 epoch ns）のあと、1件 18 バイトの固定長レコード
+  <q 時刻ns> <B 種別> <B ピン/チャンネル/印> <Q 値>
+レコードは呼び出し元でバッファに積むだけで、ファイルへは書き出しスレッドが1秒ごとにまとめて書く。
+電源断で最後のレコードが欠けても、読むときに端数を捨てる。
+
+記録しないときは wrap_gpio / wrap_batch が元のオブジェクトをそのまま返し、draw / mark は何もしない。
+"""
+import os
+import struct
+import threading
+import time
+from collections import deque, namedtuple
+
+import numpy as np
+
+import timebase
+
+MAGIC = b"SLIO"
+VERSION = 1
+HEADER = struct.Struct("<4sBBq")
+RECORD = struct.Struct("<qBBQ")
+
+# ===================== 種別 =====================
+EDGE = 1
+PIN = 2
+LEVEL = 3
+OUT = 4
+PCA = 5
+ALL_OFF = 6
+RN = 7
+MARK = 8
+
+KIND_NAMES = {EDGE: "edge", PIN: "pin", LEVEL: "level", OUT: "out", PCA: "pca", ALL_OFF: "all_off", RN: "rn", MARK: "mark"}
+
+# 入力（replay で流し込む側）と出力（比べる側）
+INPUT_KINDS = (EDGE, PIN, LEVEL)
+ACTUATOR_KINDS = (OUT, PCA, ALL_OFF)
+
+# MARK の印
+MARK_ROUND = 1          # main: loop の1周の始まり（値 = ラウンド番号）
+MARK_BUTTON_BEGIN = 2   # sub : button_loop_movie_until_gpio_high に入った
+MARK_BUTTON_END = 3     # sub : 同・抜けた（値 = 1 なら確定）
+MARK_CLEANUP = 4        # main: 終了処理の始まり（ここから後は比べない）
+
+ROLES = {"main": 1, "sub": 2}
+ROLE_NAMES = {v: k for k, v in ROLES.items()}
+
+DTYPE = np.dtype([("t", "<i8"), ("kind", "u1"), ("pin", "u1"), ("value", "<u8")])
+
+# ===================== 記録 =====================
+class Recorder:
+    def __init__(self, path, role, flush_interval=1.0):
+        self.path = path
+        self.role = role
+        self.flush_interval = flush_interval
+        self._t0 = timebase.perf_counter_ns()
+        self._file = open(path, "wb")
+        self._file.write(HEADER.pack(MAGIC, VERSION, ROLES[role], time.time_ns()))
+        self._buf = []
+        self._lock = threading.Lock()
+        self._levels = {}      # ピン -> input() で最後に読んだレベル
+        self._closed = False
+        self.count = 0
+        self._stop = timebase.Event()
+        self._thread = timebase.spawn(self._flush_loop, name="io-trace")
+
+    def elapsed_ns(self):
+        return timebase.perf_counter_ns() - self._t0
+
+    def record(self, kind, pin, value):
+        rec = RECORD.pack(timebase.perf_counter_ns() - self._t0, kind, pin, value)
+        with self._lock:
+            if self._closed:
+                return
+            self._buf.append(rec)
+            self.count += 1
+            if kind == LEVEL:
+                self._levels[pin] = value
+
+    def observe(self, pin, value):
+        """input() の結果。前回と違うときだけ LEVEL として残す"""
+        value = 1 if value else 0
+        if self._levels.get(pin) != value:
+            self.record(LEVEL, pin, value)
+
+    def flush(self):
+        with self._lock:
+            buf, self._buf = self._buf, []
+        if buf and not self._file.closed:
+            self._file.write(b"".join(buf))
+            self._file.flush()
+
+    def _flush_loop(self):
+        while not self._stop.wait(self.flush_interval):
+            self.flush()
+
+    def close(self):
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+        self._stop.set()
+        self._thread.join(timeout=1.0)
+        self.flush()
+        self._file.close()
+
+class RecordingGPIO:
+    """RPi.GPIO 互換のまま入出力を記録する（記録しない関数・定数はそのまま元へ渡す）"""
+    def __init__(self, gpio, recorder):
+        self._gpio = gpio
+        self._rec = recorder
+        self._edges = {}   # ピン -> add_event_detect の edge
+
+    def __getattr__(self, name):
+        return getattr(self._gpio, name)
+
+    def input(self, pin):
+        value = self._gpio.input(pin)
+        self._rec.observe(pin, value)
+        return value
+
+    def output(self, pin, value):
+        self._gpio.output(pin, value)
+        self._rec.record(OUT, pin, 1 if value else 0)
+
+    def _wrap(self, pin, callback):
+        def _cb(channel):
+            edge = self._edges.get(pin)
+            if edge == self._gpio.RISING:
+                level = 1
+            elif edge == self._gpio.FALLING:
+                level = 0
+            else:
+                level = 1 if self._gpio.input(pin) else 0
+            self._rec.record(EDGE, pin, level)
+            callback(channel)
+        return _cb
+
+    def add_event_detect(self, pin, edge, callback=None, bouncetime=None):
+        self._edges[pin] = edge
+        kwargs = {}
+        if callback is not None:
+            kwargs["callback"] = self._wrap(pin, callback)
+        if bouncetime is not None:
+            kwargs["bouncetime"] = bouncetime
+        self._gpio.add_event_detect(pin, edge, **kwargs)
+
+    def add_event_callback(self, pin, callback):
+        self._gpio.add_event_callback(pin, self._wrap(pin, callback))
+
+    def watch(self, pin):
+        """アプリがポーリングしかしない入力ピン（レバー・PUSH）の両エッジを記録する"""
+        def _cb(channel):
+            self._rec.record(PIN, pin, 1 if self._gpio.input(pin) else 0)
+        self._gpio.add_event_detect(pin, self._gpio.BOTH, callback=_cb)
+
+class RecordingBatch:
+    """pca_batch.PCABatch の書き込みを記録する"""
+    def __init__(self, batch, recorder):
+        self._batch = batch
+        self._rec = recorder
+
+    def __getattr__(self, name):
+        return getattr(self._batch, name)
+
+    def write(self, duties):
+        self._batch.write(duties)
+        for ch, duty in sorted(duties.items()):
+            self._rec.record(PCA, ch, duty)
+
+    def all_off(self):
+        self._batch.all_off()
+        self._rec.record(ALL_OFF, 0, 0)
+
+# ===================== 現在の記録 =====================
+_recorder = None
+_draws = None
+
+def install(recorder):
+    """記録先を差し替える（wrap_gpio / wrap_batch より前に呼ぶこと）"""
+    global _recorder
+    _recorder = recorder
+    return recorder
+
+def current():
+    return _recorder
+
+def from_env(role):
+    """SLOT_IO_TRACE にディレクトリがあれば記録を始める（無ければ None）"""
+    directory = os.environ.get("SLOT_IO_TRACE")
+    if not directory:
+        return None
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"{role}-{time.strftime('%Y%m%d-%H%M%S')}.iot")
+    print(f"[IOTRACE] 記録開始: {path}")
+    return install(Recorder(path, role))
+
+def wrap_gpio(gpio):
+    return gpio if _recorder is None else RecordingGPIO(gpio, _recorder)
+
+def wrap_batch(batch):
+    return batch if _recorder is None else RecordingBatch(batch, _recorder)
+
+def watch(gpio, pin):
+    if isinstance(gpio, RecordingGPIO):
+        gpio.watch(pin)
+
+def draw(fn):
+    """抽選の rn を引く（replay 中は記録の値を順に返す）"""
+    if _draws:
+        rn = _draws.popleft()
+    else:
+        rn = fn()
+    if _recorder is not None:
+        _recorder.record(RN, 0, struct.unpack("<Q", struct.pack("<d", rn))[0])
+    return rn
+
+def replay_draws(values):
+    """draw() が返す rn を記録の値に固定する（使い切ったら fn() に戻る）"""
+    global _draws
+    _draws = deque(values)
+
+def mark(code, value=0):
+    if _recorder is not None:
+        _recorder.record(MARK, code, value)
+
+def close():
+    if _recorder is not None:
+        _recorder.close()
+
+# ===================== 読み込み =====================
+Trace = namedtuple("Trace", "path role started_ns records")
+
+def read(path):
+    with open(path, "rb") as f:
+        data = f.read()
+    if len(data) < HEADER.size:
+        raise ValueError(f"{path}: ヘッダが短い")
+    magic, version, role, started = HEADER.unpack_from(data)
+    if magic != MAGIC:
+        raise ValueError(f"{path}: トレースファイルではない")
+    if version != VERSION:
+        raise ValueError(f"{path}: 未対応の版 {version}")
+    body = data[HEADER.size:]
+    body = body[:len(body) - len(body) % RECORD.size]
+    records = np.frombuffer(body, dtype=DTYPE)
+    # 書き出しスレッドはスレッドごとに積んだ順に書くので、時刻順に並べ直す
+    records = records[np.argsort(records["t"], kind="stable")]
+    return Trace(path, ROLE_NAMES.get(role, str(role)), started, records)
+
+def rn_values(records):
+    sel = records[records["kind"] == RN]["value"]
+    return list(sel.astype("<u8").view("<f8"))
+
+def select(records, kinds, t_from=None, t_to=None):
+    sel = np.isin(records["kind"], kinds)
+    if t_from is not None:
+        sel &= records["t"] >= t_from
+    if t_to is not None:
+        sel &= records["t"] <= t_to
+    return records[sel]
+
+def marks(records, code):
+    return records[(records["kind"] == MARK) & (records["pin"] == code)]
+
+def summary(trace):
+    recs = trace.records
+    span = (int(recs["t"][-1]) if len(recs) else 0) / 1e9
+    counts = " / ".join(f"{name} {int((recs['kind'] == k).sum())}" for k, name in KIND_NAMES.items())
+    started = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(trace.started_ns / 1e9))
+    return f"{trace.path}: {trace.role} / 開始 {started} / {span:.1f} 秒 / {len(recs)} 件（{counts}）"
+
+# ===================== 出力の比較 =====================
+Comparison = namedtuple("Comparison", "diffs_ns problems")
+
+def _series(records):
+    out = {}
+    for t, kind, pin, value in zip(records["t"], records["kind"], records["pin"], records["value"]):
+        out.setdefault((int(kind), int(pin)), []).append((int(t), int(value)))
+    return out
+
+def compare(expected, actual, names=None, tolerance_ns=20_000_000):
+    """
+    出力レコード（時刻は比較の基準点からの ns）をチャンネルごとに順に突き合わせる。
+    値の並びが食い違ったらそのチャンネルはそこで打ち切る。
+    diffs_ns : 値が一致した組の時刻差（actual - expected）
+    problems : 食い違い・件数違い・許容を超えた遅れ/早まり
+    """
+    names = names or {}
+    exp, act = _series(expected), _series(actual)
+    diffs, problems = [], []
+    for key in sorted(set(exp) | set(act)):
+        kind, pin = key
+        label = names.get(key, f"{KIND_NAMES[kind]}:{pin}")
+        e, a = exp.get(key, []), act.get(key, [])
+        worst = None
+        for i, ((te, ve), (ta, va)) in enumerate(zip(e, a)):
+            if ve != va:
+                problems.append(f"{label}: {i}件目の値が違う（記録 {ve} @ {te / 1e9:.3f} s / 再生 {va} @ {ta / 1e9:.3f} s）")
+                break
+            d = ta - te
+            diffs.append(d)
+            if abs(d) > tolerance_ns and (worst is None or abs(d) > abs(worst[1])):
+                worst = (te, d)
+        else:
+            if len(e) != len(a):
+                problems.append(f"{label}: 件数が違う（記録 {len(e)} / 再生 {len(a)}）")
+        if worst is not None:
+            problems.append(f"{label}: 時刻のずれが許容超え（{worst[0] / 1e9:.3f} s で {worst[1] / 1e6:+.1f} ms）")
+    return Comparison(diffs, problems)
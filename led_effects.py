@@ -0,0 +1,190 @@
+"""
+LED 演出エンジン（main_motor.py 用、PCA9685 のランプチャンネル）
+
+演出は「キーフレームの列」として先に作っておき、スケジューラスレッド1本が再生する。
+- キーフレーム時刻は演出開始からの絶対時刻（timebase.monotonic）。sleep の誤差が積み重ならない
+- レイヤー：上のレイヤーが持っているチャンネルが優先。下のレイヤーは裏で進み続ける
+- 同じレイヤーに play() すると前の演出を置き換える（途中でも止める）
+- 出力が変わったときだけ書き込み、書き込み間隔は 1/max_rate 秒以上あける
+
+演出の作り方（flash / blackout / fade / chase）はこのファイルの下の関数。
+"""
+import slotlog
+import timebase
+
+_log = slotlog.get("LED")
+
+class Effect:
+    """
+    keyframes: [(開始からの秒, {チャンネル: duty}), ...]（時刻順）
+    duration : 演出の長さ（秒）。None なら stop() されるまで最後の状態を保つ
+    loop     : True なら duration ごとに先頭から繰り返す
+    """
+    def __init__(self, name, keyframes, duration=None, loop=False):
+        self.name = name
+        self.keyframes = sorted(keyframes, key=lambda kf: kf[0])
+        self.duration = duration
+        self.loop = loop and duration is not None and duration > 0
+
+    def state_at(self, t):
+        """開始から t 秒の時点の {チャンネル: duty}（終わっていれば None）"""
+        if self.duration is not None and not self.loop and t >= self.duration:
+            return None
+        if self.loop:
+            t %= self.duration
+        state = {}
+        for kt, duties in self.keyframes:
+            if kt > t:
+                break
+            state.update(duties)
+        return state
+
+    def next_change(self, t):
+        """t より後で最初に状態が変わる時刻（開始からの秒、無ければ None）"""
+        base = 0.0
+        if self.loop:
+            base = (t // self.duration) * self.duration
+            t -= base
+        for kt, _ in self.keyframes:
+            if kt > t:
+                return base + kt
+        if self.duration is not None and t < self.duration:
+            return base + self.duration
+        return None
+
+class _Playing:
+    __slots__ = ("effect", "start")
+
+    def __init__(self, effect, start):
+        self.effect = effect
+        self.start = start
+
+class LedEngine:
+    def __init__(self, channels, write, base_duty, max_rate=50.0):
+        """
+        channels : 対象チャンネル
+        write    : {チャンネル: duty} を受け取って書き込む関数
+        base_duty: どの演出も持っていないチャンネルの値（常時点灯など）
+        """
+        self.channels = tuple(channels)
+        self._write = write
+        self._base = base_duty
+        self.min_interval = 1.0 / max_rate
+        self._cond = timebase.Condition()
+        self._layers = {}        # レイヤー番号 -> _Playing
+        self._last_out = None
+        self._last_write = 0.0
+        self._closed = False
+        self.writes = 0
+        self.max_late_ms = 0.0
+        self._thread = timebase.spawn(self._run, name="led-effects")
+
+    # ---------- 操作 ----------
+    def play(self, effect, layer):
+        with self._cond:
+            self._layers[layer] = _Playing(effect, timebase.monotonic())
+            self._cond.notify()
+
+    def stop(self, layer):
+        with self._cond:
+            if self._layers.pop(layer, None) is not None:
+                self._cond.notify()
+
+    def is_playing(self, layer):
+        with self._cond:
+            return layer in self._layers
+
+    def set_base(self, duty):
+        with self._cond:
+            self._base = duty
+            self._cond.notify()
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._layers.clear()
+            self._cond.notify()
+        self._thread.join(timeout=1.0)
+
+    # ---------- スケジューラ ----------
+    def _compose_locked(self, now):
+        out = dict.fromkeys(self.channels, self._base)
+        next_t = None
+        for layer in sorted(self._layers):
+            playing = self._layers[layer]
+            t = now - playing.start
+            state = playing.effect.state_at(t)
+            if state is None:
+                del self._layers[layer]
+                continue
+            for ch, duty in state.items():
+                if ch in out:
+                    out[ch] = duty
+            nc = playing.effect.next_change(t)
+            if nc is not None:
+                at = playing.start + nc
+                if next_t is None or at < next_t:
+                    next_t = at
+        return out, next_t
+
+    def _run(self):
+        with self._cond:
+            while not self._closed:
+                now = timebase.monotonic()
+                out, next_t = self._compose_locked(now)
+                if out != self._last_out:
+                    # 書き込み間隔の上限：早すぎるときは次の許容時刻まで待って、その時点の状態を書く
+                    allowed = self._last_write + self.min_interval
+                    if now < allowed:
+                        self._cond.wait(allowed - now)
+                        continue
+                    self._last_out = out
+                    self._last_write = now
+                    self.writes += 1
+                    try:
+                        self._write(out)
+                    except Exception as e:
+                        _log.error("[LED] 書き込み失敗: %s", e)
+                if next_t is None:
+                    self._cond.wait()
+                else:
+                    self._cond.wait(max(0.0, next_t - timebase.monotonic()))
+                    late = (timebase.monotonic() - next_t) * 1000
+                    if late > self.max_late_ms:
+                        self.max_late_ms = late
+
+# ===================== 演出の作り方 =====================
+def flash(channels, duty_on, duty_off, duration, interval):
+    """全チャンネル一斉点滅（interval ごとに ON/OFF）。終わるとベースに戻る"""
+    keyframes = []
+    n = int(duration / interval)
+    for i in range(n):
+        duty = duty_on if i % 2 == 0 else duty_off
+        keyframes.append((i * interval, dict.fromkeys(channels, duty)))
+    return Effect("flash", keyframes, duration=duration)
+
+def blackout(channels, duty_off):
+    """消灯したまま保持（stop() まで）"""
+    return Effect("blackout", [(0.0, dict.fromkeys(channels, duty_off))])
+
+def fade(channels, duty_from, duty_to, duration, steps=32):
+    """duty_from → duty_to へ直線的に変化し、最後の値を保持"""
+    keyframes = []
+    for i in range(steps + 1):
+        duty = int(duty_from + (duty_to - duty_from) * i / steps)
+        keyframes.append((duration * i / steps, dict.fromkeys(channels, duty)))
+    return Effect("fade", keyframes)
+
+def chase(channels, duty_on, duty_off, step, loops=1):
+    """1チャンネルずつ順に点灯（step 秒ごとに隣へ）。loops=None で止めるまで繰り返す"""
+    channels = tuple(channels)
+    keyframes = []
+    for i, lit in enumerate(channels):
+        keyframes.append((i * step, {ch: (duty_on if ch == lit else duty_off) for ch in channels}))
+    period = step * len(channels)
+    if loops is None:
+        return Effect("chase", keyframes, duration=period, loop=True)
+    frames = []
+    for n in range(loops):
+        frames.extend((n * period + t, d) for t, d in keyframes)
+    return Effect("chase", frames, duration=period * loops)
@@ -1,15 +1,32 @@
-import RPi.GPIO as GPIO
-import time
 import random
-import board
-import busio
-from adafruit_pca9685 import PCA9685
-from adafruit_motor.servo import ContinuousServo
 import os
 import atexit
 import threading
 import pygame
 
+import audio
+import hal
+import i2c_bus
+import io_trace
+import led_effects
+import outcomes
+import pca_batch
+import protocol
+import reel_tracker
+import rendezvous
+import shared_state
+import slotlog
+import stop_trace
+import timebase
+import timeline
+
+# ===================== バックエンド（実機 / シミュレータ） =====================
+backend = hal.get_backend()
+
+# SLOT_IO_TRACE=<ディレクトリ> なら GPIO・PCA の入出力を記録する（python replay.py で再生）
+io_trace.from_env("main")
+GPIO = io_trace.wrap_gpio(backend.gpio)
+
 # ===================== ピン設定 =====================
 LEVER_PIN = 14
 PUSH_BUTTON_PIN = 15  # ※現状未使用（残してOK）
@@ -26,6 +43,10 @@ PCA_CHANNEL  = 15  # 第1リール
 PCA_CHANNEL2 = 8   # 第2リール
 PCA_CHANNEL3 = 0   # 第3リール
 
+PCA_FREQUENCY = 50       # サーボのPWM周波数（Hz）
+SERVO_MIN_PULSE = 700    # サーボのパルス幅（us）
+SERVO_MAX_PULSE = 2300
+
 LED_PIN = 18  # GPIO側（今は未使用でOK）
 
 # ===== PCA9685 LED =====
@@ -35,26 +56,39 @@ LED_DUTY_OFF = 0x0000              # 消灯
 LED_FLASH_DURATION = 3.0           # フラッシュ時間（秒）
 LED_FLASH_INTERVAL = 0.08          # 点滅間隔（短いほど速い）
 
-# ★追加：ブラックアウト演出範囲
-BLACKOUT_MIN = 0.15
-BLACKOUT_MAX = 0.20
-
 # ===================== 速度設定 =====================
 CLOCKWISE_SPEED = -0.5
 COUNTER_CLOCKWISE_SPEED = 0.8
 FREEZE_SPEED = 0.08
 STOP_SPEED = 0.3  # あなたの環境に合わせた静止点
 
-# 後告知判定（random.random() は 0.0〜1.0）
-AFTER_NOTICE_THRESHOLD = 0.25
-
-# Freeze当選範囲
-FREEZE_MIN = 0.25
-FREEZE_MAX = 0.3
+# 当たり・後告知・FREEZE・ブラックアウトなどの rn の範囲は outcomes.py の抽選テーブル
+
+# ===================== センサー検出設定 =====================
+SENSOR_EDGE_ENABLED = True     # センサー立ち上がりエッジで停止（Falseで従来のポーリングのみ）
+SENSOR_BOUNCETIME = 5          # センサーエッジのチャタリング除去（ms）
+SENSOR_FALLBACK_POLL = 0.05    # エッジ待ち中のフォールバック確認周期（秒）
+SENSOR_POLL_INTERVAL = 0.001   # エッジ検出が使えない場合の従来ポーリング周期（秒）
+LOSE_SLIP_DELAY = 0.2          # はずれ時：センサー反応後に滑らせる時間（秒）
+PREDICTIVE_STOP_ENABLED = True # はずれ時：回転周期が推定できていればセンサーを待たずに同じ位置で止める
+COAST_COMPENSATION_ENABLED = True  # 停止指令後の惰性（リールごとに学習）の分だけ早めに指令する
+SENSOR_WINDOW = 0.03           # センサーがHIGHになる幅（1回転に対する割合）。7停止はこの中央を狙う
+COAST_SETTLE_MARGIN = 0.05     # 惰性の観測：静止を待つときに学習値へ足す余裕（秒）
+COAST_SETTLE_MIN = 0.2         # 惰性がまだ学習できていなくても、静止を待つ最低時間（秒）
+# 当たりで7（センサー窓）から外れて止まったとき、ゆっくり回して7に合わせる
+# （手前で止まったら正転、通り過ぎたら逆転。ゆっくりなので惰性はほぼ無く、センサーで止めれば窓に収まる）
+# 停止通知・停止音は最初の停止で出す。stopped（全リール停止待ち）は合わせ終わってから
+SEVEN_RECOVERY_ENABLED = True
+SEVEN_CREEP_FORWARD_SPEED = 0.35   # STOP_SPEED より少しだけ正転側
+SEVEN_CREEP_BACKWARD_SPEED = 0.25  # STOP_SPEED より少しだけ逆転側
+SEVEN_CREEP_TIMEOUT = 5.0          # これ以上センサーが来なければあきらめて止める（秒）
 
 # ===================== FIFO設定 =====================
 fifo_path = '/tmp/notify_pipe'
 
+# ===================== 共有メモリ（サブ基盤へリール・ラウンド状態を公開） =====================
+state = shared_state.StateWriter()
+
 # ===================== GPIO初期化 =====================
 GPIO.setmode(GPIO.BCM)
 GPIO.setup(SENSOR_PIN1, GPIO.IN, pull_up_down=GPIO.PUD_DOWN)
@@ -66,61 +100,92 @@ GPIO.setup(STOP_BUTTON2, GPIO.IN, pull_up_down=GPIO.PUD_UP)
 GPIO.setup(STOP_BUTTON3, GPIO.IN, pull_up_down=GPIO.PUD_UP)
 
 GPIO.setup(LEVER_PIN, GPIO.IN)
+io_trace.watch(GPIO, LEVER_PIN)   # レバーはポーリングなので、記録用にエッジも取る
 GPIO.setup(LED_PIN, GPIO.OUT)
 
 # ===================== PCA9685初期化 =====================
-i2c = busio.I2C(board.SCL, board.SDA)
-pca = PCA9685(i2c)
-pca.frequency = 50
+pca = backend.create_pca()
+pca.frequency = PCA_FREQUENCY
+
+# サーボへの書き込みは bus 経由で、duty は ServoSpec（この設定）から計算する。
+# ライブラリのサーボはシミュレータがスロットル換算を覚えるためだけに作る（実機では何も書かない）
+for _ch in (PCA_CHANNEL, PCA_CHANNEL2, PCA_CHANNEL3):
+    backend.continuous_servo(pca.channels[_ch], min_pulse=SERVO_MIN_PULSE, max_pulse=SERVO_MAX_PULSE)
+
+continuous_servo  = pca_batch.ServoSpec(PCA_CHANNEL,  SERVO_MIN_PULSE, SERVO_MAX_PULSE, PCA_FREQUENCY)
+continuous_servo2 = pca_batch.ServoSpec(PCA_CHANNEL2, SERVO_MIN_PULSE, SERVO_MAX_PULSE, PCA_FREQUENCY)
+continuous_servo3 = pca_batch.ServoSpec(PCA_CHANNEL3, SERVO_MIN_PULSE, SERVO_MAX_PULSE, PCA_FREQUENCY)
+
+REEL_SERVOS = (continuous_servo, continuous_servo2, continuous_servo3)
+
+# 複数チャンネルは1回のI2C書き込みでまとめて更新する（リール間の動き出し・止まりのずれをなくす）
+# バスへの書き込みは bus の担当スレッド1本だけが行う（サーボ停止 > サーボ始動 > LED の優先順）
+# ※ PCA への書き込みはすべて bus 経由にすること（シャドウレジスタがずれるため）
+bus = i2c_bus.I2CArbiter(io_trace.wrap_batch(pca_batch.PCABatch(pca)))
+
+def servo_priority(value):
+    return i2c_bus.PRIO_SERVO_STOP if value == STOP_SPEED else i2c_bus.PRIO_SERVO_START
+
+def set_servo_throttle(servo, value):
+    # サーボは書き終わるまで待つ（停止時刻の計測・次の処理の順序を保つ）
+    bus.set_throttles({servo: value}, servo_priority(value))
+
+def set_reels_throttle(value):
+    bus.set_throttles({servo: value for servo in REEL_SERVOS}, servo_priority(value))
 
-continuous_servo  = ContinuousServo(pca.channels[PCA_CHANNEL],  min_pulse=700, max_pulse=2300)
-continuous_servo2 = ContinuousServo(pca.channels[PCA_CHANNEL2], min_pulse=700, max_pulse=2300)
-continuous_servo3 = ContinuousServo(pca.channels[PCA_CHANNEL3], min_pulse=700, max_pulse=2300)
+# シミュレータではサーボとセンサーを結び付けてリールを回す（実機では何もしない）
+backend.bind_reel(PCA_CHANNEL,  SENSOR_PIN1)
+backend.bind_reel(PCA_CHANNEL2, SENSOR_PIN2)
+backend.bind_reel(PCA_CHANNEL3, SENSOR_PIN3)
+
+# ===================== SE初期化 =====================
+audio.pre_init()
+pygame.init()
+sound = audio.AudioEngine({"reel": 3})
+sound.load("stop", "stop_se.wav", "reel")
 
 # ===================== PCA LED制御 =====================
-_led_lock = threading.Lock()
-_led_stop_event = threading.Event()
-_led_flash_thread = None
+# 演出はキーフレーム列として LedEngine（スレッド1本）が再生する
+LED_MAX_UPDATE_HZ = 50     # LED の書き込み上限（回/秒）
 
-def leds_set(duty: int):
-    with _led_lock:
-        for ch in LED_CHANNELS:
-            try:
-                pca.channels[ch].duty_cycle = duty
-            except Exception as e:
-                print(f"[LED] duty_cycle 設定失敗 ch={ch}: {e}")
+# 演出レイヤー（数字が大きいほど上に重なる）
+LED_LAYER_BLACKOUT = 0
+LED_LAYER_FLASH = 1
+
+def _leds_write(duties):
+    # LED は待たない（バスが空いたときに書かれる）
+    bus.write(duties, i2c_bus.PRIO_LED)
+
+leds = led_effects.LedEngine(LED_CHANNELS, _leds_write, LED_DUTY_ON, max_rate=LED_MAX_UPDATE_HZ)
 
 def leds_on():
-    leds_set(LED_DUTY_ON)
+    leds.set_base(LED_DUTY_ON)
 
 def leds_off():
-    leds_set(LED_DUTY_OFF)
-
-def _flash_worker(duration: float, interval: float):
-    end_t = time.time() + duration
-    state = False
-    while time.time() < end_t and not _led_stop_event.is_set():
-        state = not state
-        leds_set(LED_DUTY_ON if state else LED_DUTY_OFF)
-        time.sleep(interval)
-    if not _led_stop_event.is_set():
-        leds_on()
+    leds.set_base(LED_DUTY_OFF)
 
 def flash_leds(duration: float = LED_FLASH_DURATION, interval: float = LED_FLASH_INTERVAL):
-    global _led_flash_thread
-    if _led_flash_thread is not None and _led_flash_thread.is_alive():
-        return
-    _led_flash_thread = threading.Thread(target=_flash_worker, args=(duration, interval), daemon=True)
-    _led_flash_thread.start()
+    # 再生中に呼ばれたら最初からやり直す
+    leds.play(led_effects.flash(LED_CHANNELS, LED_DUTY_ON, LED_DUTY_OFF, duration, interval), LED_LAYER_FLASH)
+
+def blackout_start():
+    leds.play(led_effects.blackout(LED_CHANNELS, LED_DUTY_OFF), LED_LAYER_BLACKOUT)
+
+def blackout_end():
+    leds.stop(LED_LAYER_BLACKOUT)
 
 # 起動時：常時点灯
 leds_on()
 
 # ===================== STOP受付（回転中のみ有効） =====================
-spin_active = threading.Event()
+spin_active = timebase.Event()
 
 def stop_accept_enable():
+    # 前の回転の打刻（途中で捨てた停止など）を残さない
+    for reel in (reel1, reel2, reel3):
+        tracer.clear(reel.name)
     spin_active.set()
+    state.set_phase(shared_state.PHASE_SPIN)
 
 def stop_accept_disable():
     spin_active.clear()
@@ -137,6 +202,7 @@ def set_spin_rn(v: float):
     global spin_rn
     with rn_lock:
         spin_rn = v
+    state.set_spin_rn(v)
 
 def get_spin_rn() -> float:
     with rn_lock:
@@ -151,22 +217,33 @@ def get_original_rn() -> float:
     with rn_lock:
         return original_rn
 
+# ===================== ログ =====================
+# 割り込み・リールスレッド・fifo_lock の中からは print せずに slotlog へ積む（書き出しは別スレッド）
+log = slotlog.get("MAIN")
+log_fifo = slotlog.get("FIFO")
+log_reel = slotlog.get("REEL")
+
 # ===================== FIFO（STOPスレッドからも送る） =====================
 fifo_lock = threading.Lock()
 fifo_global = None
+encoder = protocol.Encoder()
 
 def set_fifo_global(f):
     global fifo_global
     with fifo_lock:
         fifo_global = f
 
-def send_fifo_threadsafe(message: str):
+def _send_locked(fifo, kind, value):
+    # fifo_lock 保持中に呼ぶこと。連番を振るのと書き込みを1つにする
+    # （分かれていると N+1 が N より先に届き、受信側が N を重複として捨てる）
+    log_fifo.info("[通知] 送信: %s", kind if value is None else f"{kind}={value}")
+    fifo.send(encoder.encode(kind, value))
+
+def send_fifo_threadsafe(kind: str, value=None):
     with fifo_lock:
         if fifo_global is None:
             return
-        print(f"[通知] 送信: {message}")
-        fifo_global.write(message + "\n")
-        fifo_global.flush()
+        _send_locked(fifo_global, kind, value)
 
 # ===================== 第一停止通知（ラウンド中1回だけ） =====================
 first_stop_lock = threading.Lock()
@@ -187,14 +264,13 @@ def notify_first_stop_once():
     return True
 
 # ===================== ユーティリティ（メインスレッド用） =====================
-def send_fifo(fifo, message: str):
-    print(f"[通知] 送信: {message}")
-    fifo.write(message + "\n")
-    fifo.flush()
+def send_fifo(fifo, kind: str, value=None):
+    with fifo_lock:
+        _send_locked(fifo, kind, value)
 
 def wait_all_reels_stop():
     while not (reel1.stopped.is_set() and reel2.stopped.is_set() and reel3.stopped.is_set()):
-        time.sleep(0.005)
+        timebase.sleep(0.005)
 
 # ===================== STOP割り込みのON/OFF（フリーズ中は無効化） =====================
 _interrupts_enabled = True
@@ -211,7 +287,7 @@ def disable_stop_interrupts():
             except Exception:
                 pass
         _interrupts_enabled = False
-        print("[FREEZE] STOP割り込み無効化（押下は完全に無視）")
+        log.info("[FREEZE] STOP割り込み無効化（押下は完全に無視）")
 
 def enable_stop_interrupts():
     global _interrupts_enabled
@@ -220,39 +296,55 @@ def enable_stop_interrupts():
             return
         setup_button_interrupts()
         _interrupts_enabled = True
-        print("[FREEZE] STOP割り込み有効化")
+        log.info("[FREEZE] STOP割り込み有効化")
 
 # ===================== クリーンアップ =====================
 def cleanup():
+    # 溜まっているログを先に出してからレポートを print する
+    slotlog.flush()
     print("--- クリーンアップ処理を開始 ---")
+    io_trace.mark(io_trace.MARK_CLEANUP)
+
+    # 途中のシーケンスが後からサーボ/LEDを書かないように止める
+    try:
+        sequencer.cancel_all()
+    except Exception:
+        pass
+
+    if tracer.enabled:
+        print(tracer.report())
+
+    print(sound.latency_report())
+
+    try:
+        for reel in (reel1, reel2, reel3):
+            print(reel.coast.describe())
+    except Exception:
+        pass
 
     # LED停止＆消灯
     try:
-        _led_stop_event.set()
-        leds_off()
+        leds.close()
+        _leds_write(dict.fromkeys(LED_CHANNELS, LED_DUTY_OFF))
     except Exception:
         pass
 
     try:
-        continuous_servo.throttle = STOP_SPEED
-        continuous_servo2.throttle = STOP_SPEED
-        continuous_servo3.throttle = STOP_SPEED
-        time.sleep(0.1)
+        set_reels_throttle(STOP_SPEED)
+        timebase.sleep(0.1)
     except Exception as e:
         print(f"スロットル設定エラー: {e}")
 
     try:
-        for i in range(16):
-            try:
-                pca.channels[i].duty_cycle = 0
-            except Exception:
-                pass
+        bus.all_off()
+        print(bus.report())
+        bus.close()
         pca.deinit()
     except Exception as e:
         print(f"PCA deinit エラー: {e}")
 
     try:
-        for pin in (STOP_BUTTON1, STOP_BUTTON2, STOP_BUTTON3):
+        for pin in (STOP_BUTTON1, STOP_BUTTON2, STOP_BUTTON3, SENSOR_PIN1, SENSOR_PIN2, SENSOR_PIN3):
             try:
                 GPIO.remove_event_detect(pin)
             except Exception:
@@ -265,12 +357,14 @@ def cleanup():
     except Exception:
         pass
 
+    # パイプは消さない（サブ基盤が同じパスで待ち続けられるように。次回起動時に再利用する）
     try:
-        if os.path.exists(fifo_path):
-            os.remove(fifo_path)
-            print("[通知] パイプを削除しました。")
+        if fifo_global is not None:
+            fifo_global.close()
     except Exception as e:
-        print(f"パイプ削除エラー: {e}")
+        print(f"パイプクローズエラー: {e}")
+
+    io_trace.close()
 
 atexit.register(cleanup)
 
@@ -283,38 +377,37 @@ def rotate(isFirst):
     while True:
         if GPIO.input(LEVER_PIN) == GPIO.LOW:
             break
-        time.sleep(0.01)
+        timebase.sleep(0.01)
 
-    print("レバーオン")
-    time.sleep(0.3)
+    log.info("レバーオン")
+    timebase.sleep(0.3)
 
     if isFirst:
-        rn = random.random()
+        rn = io_trace.draw(random.random)
+        outcome = outcomes.lookup(rn)
 
         # ★フリーズ当選なら「回転しない」で返す（静止状態から演出スタート）
-        if FREEZE_MIN <= rn < FREEZE_MAX:
-            continuous_servo.throttle = STOP_SPEED
-            continuous_servo2.throttle = STOP_SPEED
-            continuous_servo3.throttle = STOP_SPEED
-            print("[FREEZE] 当選：回転開始せず静止のまま")
+        if outcome.has(outcomes.FREEZE):
+            set_reels_throttle(STOP_SPEED)
+            log.info("[FREEZE] 当選：回転開始せず静止のまま")
+            state.set_phase(shared_state.PHASE_FREEZE)
             return rn
 
         # ---- ここから通常の回転開始 ----
-        if 0.1 <= rn < 0.15:
-            continuous_servo.throttle = COUNTER_CLOCKWISE_SPEED
-            time.sleep(0.5)
-            continuous_servo2.throttle = COUNTER_CLOCKWISE_SPEED
-            time.sleep(0.5)
-            continuous_servo3.throttle = COUNTER_CLOCKWISE_SPEED
-            print(f"サーボ：反時計回りに回転開始 (速度: {COUNTER_CLOCKWISE_SPEED})")
+        reset_trackers()
+        if outcome.has(outcomes.STAGGER):
+            set_servo_throttle(continuous_servo, COUNTER_CLOCKWISE_SPEED)
+            timebase.sleep(0.5)
+            set_servo_throttle(continuous_servo2, COUNTER_CLOCKWISE_SPEED)
+            timebase.sleep(0.5)
+            set_servo_throttle(continuous_servo3, COUNTER_CLOCKWISE_SPEED)
+            log.info("サーボ：反時計回りに回転開始 (速度: %s)", COUNTER_CLOCKWISE_SPEED)
 
             # ★回転開始したのでSTOP有効
             stop_accept_enable()
         else:
-            continuous_servo.throttle = COUNTER_CLOCKWISE_SPEED
-            continuous_servo2.throttle = COUNTER_CLOCKWISE_SPEED
-            continuous_servo3.throttle = COUNTER_CLOCKWISE_SPEED
-            print(f"サーボ：反時計回りに回転開始 (速度: {COUNTER_CLOCKWISE_SPEED})")
+            set_reels_throttle(COUNTER_CLOCKWISE_SPEED)
+            log.info("サーボ：反時計回りに回転開始 (速度: %s)", COUNTER_CLOCKWISE_SPEED)
 
             # ★回転開始したのでSTOP有効
             stop_accept_enable()
@@ -323,10 +416,9 @@ def rotate(isFirst):
 
     else:
         rn = get_original_rn()
-        continuous_servo.throttle = COUNTER_CLOCKWISE_SPEED
-        continuous_servo2.throttle = COUNTER_CLOCKWISE_SPEED
-        continuous_servo3.throttle = COUNTER_CLOCKWISE_SPEED
-        print(f"サーボ：反時計回りに回転開始 (速度: {COUNTER_CLOCKWISE_SPEED})")
+        reset_trackers()
+        set_reels_throttle(COUNTER_CLOCKWISE_SPEED)
+        log.info("サーボ：反時計回りに回転開始 (速度: %s)", COUNTER_CLOCKWISE_SPEED)
 
         # ★回転開始したのでSTOP有効
         stop_accept_enable()
@@ -335,22 +427,217 @@ def rotate(isFirst):
 
 # ===================== STOP処理（リール別・並行） =====================
 class ReelStopper:
-    def __init__(self, name, button_pin, sensor_pin, servo):
+    def __init__(self, index, name, button_pin, sensor_pin, servo):
+        self.index = index
         self.name = name
         self.button_pin = button_pin
         self.sensor_pin = sensor_pin
         self.servo = servo
-        self.stop_requested = threading.Event()
-        self.stopped = threading.Event()
+        self.stop_requested = timebase.Event()
+        self.stopped = timebase.Event()
+
+        # センサー待ち（エッジ割り込み側と共有）
+        self.edge_enabled = False
+        self.sensor_hit = timebase.Event()
+        self._sensor_lock = threading.Lock()
+        self._waiting_sensor = False
+        self._direct_stop = False   # Trueならセンサーエッジの中で直接STOPを書く
+        self._trace_sensor = True   # Falseなら惰性の観測用（停止トレースに打刻しない）
+        self._halted = False
+        self.halt_written = timebase.Event()   # 停止の書き込みが終わり halt_t が確定した
+        self.sensor_t = 0
+        self.halt_t = 0
+
+        # センサーエッジの履歴から回転周期・現在角度を推定する
+        self.tracker = reel_tracker.ReelTracker(name)
+        # 停止指令 → 静止 までの惰性を7停止のたびに学習する
+        self.coast = reel_tracker.CoastModel(name)
 
     def reset_for_new_round(self):
         self.stop_requested.clear()
         self.stopped.clear()
+        state.set_reel_stopped(self.index, False)
 
     def request_stop(self):
         if not self.stopped.is_set():
+            # センサー待ち中に押し直されても、最初の受付の時刻を残す
+            tracer.mark(self.name, stop_trace.STAGE_REQUEST, first=True)
             self.stop_requested.set()
 
+    def _halt_locked(self):
+        # _sensor_lock 保持中に呼ぶこと
+        # GPIOコールバックからも呼ばれるので、バスには投入するだけで書き込みは待たない
+        # （待つと他のリールのセンサー・STOPボタンのコールバックが後ろで止まる）
+        if self._halted:
+            return
+        self._halted = True
+        self.halt_written.clear()
+        bus.set_throttles({self.servo: STOP_SPEED}, i2c_bus.PRIO_SERVO_STOP, wait=False, on_done=self._on_halt_written)
+
+    def _on_halt_written(self, t):
+        # バス担当スレッドから呼ばれる
+        self.halt_t = t
+        tracer.mark(self.name, stop_trace.STAGE_HALT, t)
+        self.halt_written.set()
+
+    def _halt(self):
+        """リールスレッドから止める。書き込みが終わるまで待つ（halt_t が確定する）"""
+        with self._sensor_lock:
+            self._halt_locked()
+        self.halt_written.wait()
+
+    def on_sensor_edge(self, channel=None):
+        """センサー立ち上がり（GPIOコールバック/フォールバック両方から呼ばれる）"""
+        t = timebase.perf_counter_ns()
+        if channel is not None:
+            # 本物のエッジ（GPIOコールバック）だけ周期推定に使う
+            self.tracker.record(t)
+        with self._sensor_lock:
+            if not self._waiting_sensor:
+                return
+            self._waiting_sensor = False
+            self.sensor_t = t
+            if self._trace_sensor:
+                tracer.mark(self.name, stop_trace.STAGE_SENSOR, t)
+            # 7まで滑る場合はエッジの中で即停止（スレッド切替・ポーリング周期分の遅れをなくす）
+            if self._direct_stop:
+                self._halt_locked()
+        self.sensor_hit.set()
+
+    def _arm_sensor(self, direct_stop, trace=True):
+        with self._sensor_lock:
+            self.sensor_hit.clear()
+            self._direct_stop = direct_stop
+            self._trace_sensor = trace
+            self._halted = False
+            self._waiting_sensor = True
+
+    def _wait_sensor(self):
+        # すでにセンサー上にいる場合は従来通り即反応
+        if GPIO.input(self.sensor_pin) == 1:
+            self.on_sensor_edge()
+            return
+
+        if self.edge_enabled:
+            # エッジ割り込み待ち。取りこぼし対策に低頻度でレベルも確認する
+            while not self.sensor_hit.wait(SENSOR_FALLBACK_POLL):
+                if GPIO.input(self.sensor_pin) == 1:
+                    self.on_sensor_edge()
+                    return
+        else:
+            # 従来のポーリング
+            while GPIO.input(self.sensor_pin) != 1:
+                timebase.sleep(SENSOR_POLL_INTERVAL)
+            self.on_sensor_edge()
+
+    def _wait_sensor_until(self, timeout):
+        """_arm_sensor 済みのセンサーを timeout 秒まで待つ（来たら True）"""
+        if self.edge_enabled:
+            return self.sensor_hit.wait(timeout)
+        deadline = timebase.monotonic() + timeout
+        while timebase.monotonic() < deadline:
+            if GPIO.input(self.sensor_pin) == 1:
+                self.on_sensor_edge()
+                return True
+            timebase.sleep(SENSOR_POLL_INTERVAL)
+        return False
+
+    def _settle_time(self):
+        return max(2 * self.coast.lag_s, COAST_SETTLE_MIN) + COAST_SETTLE_MARGIN
+
+    def _stop_predicted(self, est):
+        """はずれ：7（センサー位置）から LOSE_SLIP_DELAY 分まわった角度に次に来る時刻で止める"""
+        with self._sensor_lock:
+            self._waiting_sensor = False
+            self._halted = False
+        target = (LOSE_SLIP_DELAY * 1e9 / est.period_ns) % 1.0
+        coast = self.coast.coast_rev(est.period_ns) if COAST_COMPENSATION_ENABLED else 0.0
+        # 惰性で進む分だけ手前で指令する
+        command = (target - coast) % 1.0
+        now = timebase.perf_counter_ns()
+        wait_ns = self.tracker.time_to_angle(command, now, est)
+        # 予定時刻を sensor_t に入れておく（停止ログの「予定→停止」）
+        self.sensor_t = now + int(wait_ns)
+        log_reel.info("[%s] はずれ。推定位置で停止（%.0f ms 後, 角度 %.2f, 惰性 %.3f） %s",
+                      self.name, wait_ns / 1e6, target, coast, self.tracker.describe(est))
+        # ログを積んだ分だけずれないよう、予定時刻まで寝る
+        timebase.sleep(max(0, self.sensor_t - timebase.perf_counter_ns()) / 1e9)
+
+    def _stop_seven_early(self, est, lead):
+        """
+        あたり：惰性でセンサー窓の中央に止まるよう、センサーの lead 回転手前で止める。
+        センサーは惰性の観測（_observe_seven_early）のためだけに待てるよう、止める前に構えておく
+        """
+        with self._sensor_lock:
+            self._waiting_sensor = False
+            self._halted = False
+        now = timebase.perf_counter_ns()
+        wait_ns = self.tracker.time_to_angle(1.0 - lead, now, est)
+        planned = now + int(wait_ns)
+        log_reel.info("[%s] あたり。7の手前で停止（%.0f ms 後, 手前 %.3f）", self.name, wait_ns / 1e6, lead)
+        timebase.sleep(max(0, planned - timebase.perf_counter_ns()) / 1e9)
+
+        # エッジで止めるのではなく、先に止めている（停止トレースにも打刻しない）
+        self._arm_sensor(direct_stop=False, trace=False)
+        self._halt()
+        self.sensor_t = planned
+
+    def _observe_seven_early(self, est, lead):
+        """
+        早め停止の後、指令からセンサーまでの時間で惰性を学習する（True ならセンサーまで届いた）。
+        届かなければ惰性を短く見直す
+        """
+        planned, halt_t = self.sensor_t, self.halt_t
+        if self._wait_sensor_until(self._settle_time()):
+            self.coast.observe_edge(lead, (self.sensor_t - halt_t) / 1e9, est.period_ns)
+            self.sensor_t = planned
+            return True
+
+        with self._sensor_lock:
+            self._waiting_sensor = False
+        self.sensor_t = planned
+        self.coast.observe_short(lead, est.period_ns)
+        log_reel.warn("[%s] 7に届かず（%s）", self.name, self.coast.describe())
+        return False
+
+    def _creep_to_seven(self, forward):
+        """7から外れて止まった：ゆっくり回してセンサーで止める（正転=手前から / 逆転=通り過ぎた側から）"""
+        log_reel.warn("[%s] 7からずれたので%sで合わせる", self.name, "正転" if forward else "逆転")
+        self._arm_sensor(direct_stop=True, trace=False)
+        set_servo_throttle(self.servo, SEVEN_CREEP_FORWARD_SPEED if forward else SEVEN_CREEP_BACKWARD_SPEED)
+        if not self._wait_sensor_until(SEVEN_CREEP_TIMEOUT):
+            log_reel.error("[%s] 7に合わせられず（%.1f 秒センサーなし）", self.name, SEVEN_CREEP_TIMEOUT)
+        self._halt()
+
+    def _observe_seven_stop(self, period_ns, lead):
+        """
+        7停止の静止後にセンサー窓の中にいるか確認する。
+        lead：センサーの何回転手前で指令したか（None なら回し直したので学習しない）
+        """
+        timebase.sleep(self._settle_time())
+        if GPIO.input(self.sensor_pin) == 1:
+            self.coast.in_window += 1
+            return True
+        if lead is not None and period_ns is not None:
+            # 窓を通り過ぎた：惰性は「指令位置から窓の終わりまで」より長い
+            self.coast.observe_passed(lead + SENSOR_WINDOW, period_ns)
+        return False
+
+    def _settle_on_seven(self, est, early_lead, seven_lead):
+        """
+        当たりの停止後：惰性を学習し、7から外れていれば合わせる。
+        early_lead：7の手前で止めたときの手前の角度（それ以外は None）
+        """
+        if early_lead is not None:
+            if not self._observe_seven_early(est, early_lead):
+                if SEVEN_RECOVERY_ENABLED:
+                    self._creep_to_seven(forward=True)
+                return
+            seven_lead = early_lead
+        # センサーで止めた（または早め停止で届いた）のに窓に無ければ、通り過ぎている
+        if not self._observe_seven_stop(est.period_ns if est else None, seven_lead) and SEVEN_RECOVERY_ENABLED:
+            self._creep_to_seven(forward=False)
+
     def run(self):
         while True:
             self.stop_requested.wait()
@@ -359,46 +646,103 @@ class ReelStopper:
             if self.stopped.is_set():
                 continue
 
+            tracer.mark(self.name, stop_trace.STAGE_WAKE)
             rn = get_spin_rn()
-            print(f"[{self.name}] STOP ON (spin_rn={rn})")
-
-            if rn > 0.5:
-                print(f"[{self.name}] はずれ。滑って停止。")
-                while True:
-                    if GPIO.input(self.sensor_pin) == 1:
-                        print(f"[{self.name}] センサー反応")
-                        time.sleep(0.2)
-                        break
-                    time.sleep(0.001)
+            log_reel.info("[%s] STOP ON (spin_rn=%s)", self.name, rn)
+            win = outcomes.lookup(rn).win
+
+            branch = stop_trace.BRANCH_SLIP7 if win else stop_trace.BRANCH_LOSE
+            now_est = self.tracker.estimate()
+            est = now_est if (not win and PREDICTIVE_STOP_ENABLED) else None
+            # 7停止：惰性が分かっていれば窓の中央に止まるよう手前で指令する
+            lead = 0.0
+            if win and now_est is not None and COAST_COMPENSATION_ENABLED:
+                lead = self.coast.coast_rev(now_est.period_ns) - SENSOR_WINDOW / 2
+            seven_lead = None
+            early_lead = None
+
+            if est is not None:
+                self._stop_predicted(est)
+                branch = stop_trace.BRANCH_PREDICT
+            elif not win:
+                log_reel.info("[%s] はずれ。滑って停止。", self.name)
+                self._arm_sensor(direct_stop=False)
+                self._wait_sensor()
+                log_reel.info("[%s] センサー反応", self.name)
+                # 指令後の惰性（平均速度は半分）で進む分だけ早めに止める
+                slip = LOSE_SLIP_DELAY - (self.coast.lag_s / 2 if COAST_COMPENSATION_ENABLED else 0.0)
+                timebase.sleep(max(0.0, slip))
+            elif lead > 0:
+                # 停止の通知・停止音を先に出し、惰性の観測はその後
+                self._stop_seven_early(now_est, lead)
+                branch = stop_trace.BRANCH_SEVEN_EARLY
+                early_lead = lead
             else:
-                print(f"[{self.name}] あたり。7まで滑る。")
-                while True:
-                    if GPIO.input(self.sensor_pin) == 1:
-                        print(f"[{self.name}] センサー反応")
-                        break
-                    time.sleep(0.001)
-
-            self.servo.throttle = STOP_SPEED
-            self.stopped.set()
+                log_reel.info("[%s] あたり。7まで滑る。", self.name)
+                self._arm_sensor(direct_stop=True)
+                self._wait_sensor()
+                log_reel.info("[%s] センサー反応", self.name)
+                seven_lead = 0.0
+
+            self._halt()
+            tracer.commit(self.name, branch)
 
             notify_first_stop_once()
 
-            stop_se.play()
-            print(f"[{self.name}] モーター停止")
+            # リールごとの予約チャンネルで鳴らす（3リール同時停止でも欠けない）
+            sound.play("stop", index=self.index, trigger_ns=self.halt_t)
+            predicted = branch in (stop_trace.BRANCH_PREDICT, stop_trace.BRANCH_SEVEN_EARLY)
+            label = "予定→停止" if predicted else "センサー→停止"
+            log_reel.info("[%s] モーター停止（%s %.2f ms）", self.name, label, (self.halt_t - self.sensor_t) / 1e6)
+
+            # 当たりは7に収まってから停止済みにする（全リール停止待ちの後で全リールに STOP を書くため）
+            if win:
+                self._settle_on_seven(now_est, early_lead, seven_lead)
+            self.stopped.set()
+            state.set_reel_stopped(self.index)
+
+tracer = stop_trace.from_env(("REEL1", "REEL2", "REEL3"))
+
+reel1 = ReelStopper(0, "REEL1", STOP_BUTTON1, SENSOR_PIN1, continuous_servo)
+reel2 = ReelStopper(1, "REEL2", STOP_BUTTON2, SENSOR_PIN2, continuous_servo2)
+reel3 = ReelStopper(2, "REEL3", STOP_BUTTON3, SENSOR_PIN3, continuous_servo3)
+
+def reset_trackers():
+    """回転開始・速度変更のときに呼ぶ（前の速度のエッジを周期推定に混ぜない）"""
+    for reel in (reel1, reel2, reel3):
+        reel.tracker.reset()
 
-reel1 = ReelStopper("REEL1", STOP_BUTTON1, SENSOR_PIN1, continuous_servo)
-reel2 = ReelStopper("REEL2", STOP_BUTTON2, SENSOR_PIN2, continuous_servo2)
-reel3 = ReelStopper("REEL3", STOP_BUTTON3, SENSOR_PIN3, continuous_servo3)
+timebase.spawn(reel1.run, name="REEL1")
+timebase.spawn(reel2.run, name="REEL2")
+timebase.spawn(reel3.run, name="REEL3")
+
+def setup_sensor_interrupts():
+    if not SENSOR_EDGE_ENABLED:
+        return
+    for reel in (reel1, reel2, reel3):
+        try:
+            GPIO.remove_event_detect(reel.sensor_pin)
+        except Exception:
+            pass
+        try:
+            GPIO.add_event_detect(reel.sensor_pin, GPIO.RISING, callback=reel.on_sensor_edge, bouncetime=SENSOR_BOUNCETIME)
+            reel.edge_enabled = True
+        except Exception as e:
+            # エッジ検出が使えない場合はポーリングで動かす
+            reel.edge_enabled = False
+            log_reel.warn("[%s] センサーエッジ検出の設定失敗（ポーリングで継続）: %s", reel.name, e)
 
-threading.Thread(target=reel1.run, daemon=True).start()
-threading.Thread(target=reel2.run, daemon=True).start()
-threading.Thread(target=reel3.run, daemon=True).start()
+setup_sensor_interrupts()
 
 def _btn_callback_factory(reel: ReelStopper):
     def _cb(channel):
         # ★回転中以外はSTOP押下を無効化
         if not spin_active.is_set():
             return
+        # 打刻は回転中の最初の押下だけ（停止済み・受付済みの押し直しは数えない）
+        if reel.stopped.is_set() or reel.stop_requested.is_set():
+            return
+        tracer.mark(reel.name, stop_trace.STAGE_BUTTON, first=True)
         reel.request_stop()
     return _cb
 
@@ -415,16 +759,75 @@ def setup_button_interrupts():
 
 setup_button_interrupts()
 
+if backend.simulated and os.environ.get("SLOT_SIM_AUTOPLAY") == "1":
+    backend.start_autoplay(lever_pin=LEVER_PIN, stop_pins=(STOP_BUTTON1, STOP_BUTTON2, STOP_BUTTON3))
+
+# ===================== 演出シーケンス =====================
+# 「何秒後に何をするか」はデータで持ち、sequencer が開始時刻基準の絶対時刻で実行する
+sequencer = timeline.Scheduler()
+
+def _freeze_enter():
+    disable_stop_interrupts()
+    for reel in (reel1, reel2, reel3):
+        reel.stop_requested.clear()
+    set_reels_throttle(STOP_SPEED)
+
+def _freeze_slow():
+    reset_trackers()
+    set_reels_throttle(FREEZE_SPEED)
+    log.info("[FREEZE] FREEZE状態 (速度: %s)", FREEZE_SPEED)
+
+def _freeze_pause():
+    set_reels_throttle(STOP_SPEED)
+    log.info("[FREEZE] 再開前STOP (1秒)")
+
+def _freeze_resume():
+    reset_trackers()
+    set_reels_throttle(COUNTER_CLOCKWISE_SPEED)
+    log.info("[FREEZE] 回転再開 (速度: %s)", COUNTER_CLOCKWISE_SPEED)
+
+    # ★回転再開したのでSTOP有効
+    stop_accept_enable()
+
+    set_spin_rn(0.1)
+    enable_stop_interrupts()
+
+    log.info("[FREEZE] STOP受付開始：ボタンで7停止してください")
+
+FREEZE_TIMELINE = timeline.Timeline("freeze", [
+    (0.0,  "静止",       _freeze_enter),
+    (2.0,  "FREEZE",     _freeze_slow),
+    (10.0, "再開前STOP", _freeze_pause),
+    (11.0, "回転再開",   _freeze_resume),
+])
+
+def _send_lose():
+    send_fifo_threadsafe("lose")
+
+# 後告知：いったんハズレを見せてから 0.5秒後に再回転（再回転はレバー待ちなのでシーケンスの外）
+AFTER_NOTICE_TIMELINE = timeline.Timeline("after_notice", [
+    (0.0, "ハズレ通知", _send_lose),
+], duration=0.5)
+
+def _bonus():
+    # 7揃い確定（bonus送信）→LEDフラッシュ
+    flash_leds()
+    state.set_phase(shared_state.PHASE_BONUS)
+    send_fifo_threadsafe("bonus")
+
+BONUS_TIMELINE = timeline.Timeline("bonus", [
+    (0.0, "bonus", _bonus),
+], duration=10.0)
+
 # ===================== 結果通知（後告知対応） =====================
-def lose(fifo, rn):
+def lose(fifo, outcome):
     send_fifo(fifo, "lose")
 
-def win(fifo, rn):
-    if rn < AFTER_NOTICE_THRESHOLD:
-        print("後告知")
+def win(fifo, outcome):
+    if outcome.has(outcomes.AFTER_NOTICE):
+        log.info("後告知")
 
-        send_fifo(fifo, "lose")
-        time.sleep(0.5)
+        sequencer.run(AFTER_NOTICE_TIMELINE)
 
         reset_first_stop()
         reel1.reset_for_new_round()
@@ -438,131 +841,98 @@ def win(fifo, rn):
 
         # ★停止したのでSTOP無効
         stop_accept_disable()
+        state.set_phase(shared_state.PHASE_STOPPED)
 
-        continuous_servo.throttle = STOP_SPEED
-        continuous_servo2.throttle = STOP_SPEED
-        continuous_servo3.throttle = STOP_SPEED
-        print("サーボの回転停止（後告知2回目）")
+        set_reels_throttle(STOP_SPEED)
+        log.info("サーボの回転停止（後告知2回目）")
 
-        # 7揃い確定（bonus送信）→LEDフラッシュ
-        flash_leds()
-        send_fifo(fifo, "bonus")
-        time.sleep(10)
+        sequencer.run(BONUS_TIMELINE)
     else:
-        print("即告知")
-        flash_leds()
-        send_fifo(fifo, "bonus")
-        time.sleep(10)
+        log.info("即告知")
+        sequencer.run(BONUS_TIMELINE)
 
 # ===================== メインループ =====================
-def loop(fifo):
-    while True:
-        time.sleep(0.5)
+def loop(fifo, rounds=None, after_round=None):
+    """
+    rounds を指定するとそのラウンド数で戻る（soak.py 用。省略時はずっと回す）
+    after_round(outcome) はラウンドの終わり（リール静止後）に呼ぶ（soak.py の確認用）
+    """
+    done = 0
+    while rounds is None or done < rounds:
+        io_trace.mark(io_trace.MARK_ROUND, done)
+        timebase.sleep(0.5)
 
         reset_first_stop()
         reel1.reset_for_new_round()
         reel2.reset_for_new_round()
         reel3.reset_for_new_round()
+        state.new_round()
 
         rn = rotate(True)
         set_original_rn(rn)
+        outcome = outcomes.lookup(rn)
+        log.info("[抽選] rn=%.4f → %s", rn, outcome.describe())
 
         # ★追加：このラウンドのブラックアウト判定
-        blackout_active = (BLACKOUT_MIN <= rn < BLACKOUT_MAX)
+        blackout_active = outcome.has(outcomes.BLACKOUT)
         if blackout_active:
-            print("[LED] BLACKOUT 開始（0.15<=rn<0.20）：リール停止まで消灯")
-            leds_off()
+            log.info("[LED] BLACKOUT 開始：リール停止まで消灯")
+            blackout_start()
 
         # 通常の停止ロジック（フリーズ時は後で上書きする）
-        if rn < AFTER_NOTICE_THRESHOLD:
+        if outcome.has(outcomes.AFTER_NOTICE):
             set_spin_rn(0.9)   # 1回目はハズレ停止
         else:
             set_spin_rn(rn)
 
-        print(f"[通知] 送信: {rn}")
-        fifo.write(str(rn) + "\n")
-        fifo.flush()
+        # サブ基盤には結果IDだけを送る（演出はサブ基盤側で同じテーブルから引く）
+        send_fifo(fifo, "outcome", outcome.id)
 
         # ===================== FREEZE演出（静止から開始） =====================
-        if FREEZE_MIN <= rn < FREEZE_MAX:
-            print("[FREEZE] 演出開始（静止状態から）")
-
-            disable_stop_interrupts()
-
-            reel1.stop_requested.clear()
-            reel2.stop_requested.clear()
-            reel3.stop_requested.clear()
-
-            continuous_servo.throttle = STOP_SPEED
-            continuous_servo2.throttle = STOP_SPEED
-            continuous_servo3.throttle = STOP_SPEED
-            time.sleep(2)
-
-            continuous_servo.throttle = FREEZE_SPEED
-            continuous_servo2.throttle = FREEZE_SPEED
-            continuous_servo3.throttle = FREEZE_SPEED
-            print(f"[FREEZE] FREEZE状態 (速度: {FREEZE_SPEED})")
-
-            time.sleep(8)
-
-            continuous_servo.throttle = STOP_SPEED
-            continuous_servo2.throttle = STOP_SPEED
-            continuous_servo3.throttle = STOP_SPEED
-            print("[FREEZE] 再開前STOP (1秒)")
-            time.sleep(1)
-
-            continuous_servo.throttle = COUNTER_CLOCKWISE_SPEED
-            continuous_servo2.throttle = COUNTER_CLOCKWISE_SPEED
-            continuous_servo3.throttle = COUNTER_CLOCKWISE_SPEED
-            print(f"[FREEZE] 回転再開 (速度: {COUNTER_CLOCKWISE_SPEED})")
-
-            # ★回転再開したのでSTOP有効
-            stop_accept_enable()
-
-            set_spin_rn(0.1)
-            enable_stop_interrupts()
-
-            print("[FREEZE] STOP受付開始：ボタンで7停止してください")
+        if outcome.has(outcomes.FREEZE):
+            log.info("[FREEZE] 演出開始（静止状態から）")
+            sequencer.run(FREEZE_TIMELINE)
         # ===============================================================
 
         wait_all_reels_stop()
 
         # ★停止したのでSTOP無効
         stop_accept_disable()
+        state.set_phase(shared_state.PHASE_STOPPED)
 
         # ★追加：ブラックアウト復帰（リール停止後に点灯へ）
         if blackout_active:
-            print("[LED] BLACKOUT 終了：リール停止 → 点灯復帰")
-            leds_on()
+            log.info("[LED] BLACKOUT 終了：リール停止 → 点灯復帰")
+            blackout_end()
 
-        continuous_servo.throttle = STOP_SPEED
-        continuous_servo2.throttle = STOP_SPEED
-        continuous_servo3.throttle = STOP_SPEED
-        print("サーボの回転停止（1回目）")
+        set_reels_throttle(STOP_SPEED)
+        log.info("サーボの回転停止（1回目）")
 
-        if rn > 0.5:
-            lose(fifo, rn)
+        if outcome.win:
+            win(fifo, outcome)
         else:
-            win(fifo, rn)
+            lose(fifo, outcome)
 
-        print("1 loop comp")
+        log.info("1 loop comp")
+        if after_round is not None:
+            after_round(outcome)
+        done += 1
 
 # ===================== FIFO作成〜開始 =====================
-if os.path.exists(fifo_path):
-    os.remove(fifo_path)
-os.mkfifo(fifo_path)
+def main():
+    # 既存のFIFOは作り直さない（サブ基盤が open 待ちしているパスをそのまま使う）
+    rendezvous.ensure_fifo(fifo_path)
 
-# ===================== SE初期化 =====================
-pygame.mixer.pre_init(44100, -16, 2, 512)
-pygame.init()
-pygame.mixer.init()
-stop_se = pygame.mixer.Sound("stop_se.wav")
-
-try:
-    with open(fifo_path, 'w') as fifo:
+    try:
+        # サブ基盤が開くまで待つ。サブ基盤が再起動したら裏でつなぎ直し、"start" を送り直す
+        fifo = rendezvous.FifoWriter(fifo_path, hello=lambda: encoder.encode("start"))
+        log.info("[通知] サブ基盤待機中...")
+        fifo.connect()
         set_fifo_global(fifo)
-        send_fifo(fifo, "start")
-        time.sleep(3)
+        timebase.sleep(3)
         loop(fifo)
-except Exception as e:
-    print(f"エラーが発生しました: {e}")
+    except Exception as e:
+        log.error("エラーが発生しました: %s", e)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,181 @@
+"""
+抽選・演出の分布を NumPy でまとめて試すシミュレータ（実機・pygame 不要）
+
+  python montecarlo.py                     # 1000万ラウンド
+  python montecarlo.py -n 50000000 --seed 1
+  python montecarlo.py --lever 1.5 --spin 3.0
+
+両基盤が使う outcomes.py の抽選テーブルをそのまま引き、次を表示する：
+  - 当たり率と、結果・演出フラグごとの出現率（シミュレーション値と、範囲の幅から出した理論値）
+  - 当たり・ハズレの連続回数（ハマり）
+  - 1ラウンドの所要時間（固定の sleep・演出シーケンスの長さ ＋ プレイヤー操作の仮定）
+  - 表の検査（outcomes.check_table：範囲の重なり・抜け、両基盤で食い違うフラグの組み合わせ）
+"""
+import argparse
+import sys
+import time
+from collections import namedtuple
+
+import numpy as np
+
+import outcomes
+
+# ===================== 所要時間（main_motor.py の固定待ち） =====================
+ROUND_SLEEP = 0.5          # loop 先頭の sleep
+LEVER_DEBOUNCE = 0.3       # rotate: レバーオン後の sleep
+STAGGER_DELAY = 1.0        # rotate: 1リールずつの回転開始（0.5秒 × 2）
+FREEZE_DURATION = 11.0     # FREEZE_TIMELINE（回転再開まで）
+AFTER_NOTICE_GAP = 0.5     # AFTER_NOTICE_TIMELINE
+BONUS_DURATION = 10.0      # BONUS_TIMELINE
+
+CHUNK = 5_000_000
+
+def round_duration(outcome, lever, spin):
+    """1ラウンド（main_motor.py の loop 1周）の秒数"""
+    one_spin = lever + LEVER_DEBOUNCE + spin
+    t = ROUND_SLEEP + one_spin
+    if outcome.has(outcomes.STAGGER):
+        t += STAGGER_DELAY
+    if outcome.has(outcomes.FREEZE):
+        t += FREEZE_DURATION
+    if outcome.has(outcomes.AFTER_NOTICE):
+        t += AFTER_NOTICE_GAP + one_spin
+    if outcome.win:
+        t += BONUS_DURATION
+    return t
+
+# ===================== シミュレーション =====================
+class _Runs:
+    """当たり/ハズレの連続回数をチャンクをまたいで数える"""
+    def __init__(self):
+        self.hist = {True: np.zeros(1, dtype=np.int64), False: np.zeros(1, dtype=np.int64)}
+        self.value = None
+        self.length = 0
+
+    def _add(self, value, lengths):
+        h = self.hist[value]
+        counts = np.bincount(lengths)
+        if len(counts) > len(h):
+            h = np.concatenate([h, np.zeros(len(counts) - len(h), dtype=np.int64)])
+            self.hist[value] = h
+        h[:len(counts)] += counts
+
+    def feed(self, wins):
+        starts = np.concatenate([[0], np.flatnonzero(wins[1:] != wins[:-1]) + 1])
+        lengths = np.diff(np.concatenate([starts, [len(wins)]]))
+        values = wins[starts]
+        if self.value is not None and values[0] == self.value:
+            lengths[0] += self.length
+        elif self.value is not None:
+            self._add(self.value, np.array([self.length]))
+        # 最後の連続はまだ続いているかもしれないので持ち越す
+        for value in (True, False):
+            sel = values[:-1] == value
+            if sel.any():
+                self._add(value, lengths[:-1][sel])
+        self.value = bool(values[-1])
+        self.length = int(lengths[-1])
+
+    def finish(self):
+        if self.value is not None:
+            self._add(self.value, np.array([self.length]))
+            self.value = None
+
+def _hist_percentile(hist, p):
+    """度数分布 hist[長さ] のパーセンタイル（最近傍順位法）"""
+    total = int(hist.sum())
+    if total == 0:
+        return None
+    cum = np.cumsum(hist)
+    rank = max(1, int(np.ceil(p / 100.0 * total)))
+    return int(np.searchsorted(cum, rank))
+
+def simulate(n, seed=None, lever=1.0, spin=2.0, chunk=CHUNK):
+    """n ラウンド分の rn を引いて集計する"""
+    rng = np.random.default_rng(seed)
+    bounds = np.asarray(outcomes.BOUNDS)
+    is_win = np.array([o.win for o in outcomes.OUTCOMES])
+    last = len(outcomes.OUTCOMES) - 1
+    counts = np.zeros(len(outcomes.OUTCOMES), dtype=np.int64)
+    runs = _Runs()
+    done = 0
+    while done < n:
+        rn = rng.random(min(chunk, n - done))
+        # outcomes.lookup と同じ bisect_right をまとめて
+        index = np.minimum(np.searchsorted(bounds, rn, side="right"), last)
+        counts += np.bincount(index, minlength=len(counts))
+        runs.feed(is_win[index])
+        done += len(rn)
+    runs.finish()
+    durations = [round_duration(o, lever, spin) for o in outcomes.OUTCOMES]
+    return Result(n, counts, runs.hist, durations)
+
+Result = namedtuple("Result", "n counts streaks durations")
+
+# ===================== 表示 =====================
+def _streak_line(label, hist):
+    total = int(hist.sum())
+    if total == 0:
+        return f"  {label:<8} なし"
+    lengths = np.arange(len(hist))
+    mean = float((hist * lengths).sum()) / total
+    p50, p95, p99 = (_hist_percentile(hist, p) for p in (50, 95, 99))
+    return (f"  {label:<8} 平均 {mean:6.2f} / p50 {p50} / p95 {p95} / p99 {p99} / 最大 {len(hist) - 1}"
+            f"（{total}回）")
+
+def report(result, elapsed=None):
+    table = outcomes.OUTCOMES
+    n = result.n
+    lines = []
+    head = f"--- {n:,} ラウンド"
+    if elapsed is not None:
+        head += f"（{elapsed:.2f} 秒, {n / elapsed / 1e6:.1f} M/秒）"
+    lines.append(head + " ---")
+    wins = sum(int(c) for o, c in zip(table, result.counts) if o.win)
+    lines.append(f"当たり率 {wins / n * 100:.4f} %（理論 {sum(o.hi - o.lo for o in table if o.win) * 100:.4f} %）")
+
+    lines.append("--- 結果ごとの出現率（%: シミュレーション / 理論）と所要時間 ---")
+    for o, c, d in zip(table, result.counts, result.durations):
+        lines.append(f"  #{o.id} {o.name:<14} {c / n * 100:9.4f} / {(o.hi - o.lo) * 100:9.4f}  {d:6.2f} 秒")
+
+    lines.append("--- 演出フラグごとの出現率（%: シミュレーション / 理論） ---")
+    for flag, name in outcomes.FLAG_NAMES.items():
+        c = sum(int(c) for o, c in zip(table, result.counts) if o.flags & flag)
+        exact = sum(o.hi - o.lo for o in table if o.flags & flag)
+        lines.append(f"  {name:<14} {c / n * 100:9.4f} / {exact * 100:9.4f}")
+
+    lines.append("--- 連続回数（ラウンド） ---")
+    lines.append(_streak_line("当たり", result.streaks[True]))
+    lines.append(_streak_line("ハズレ", result.streaks[False]))
+
+    # 所要時間は結果ごとに決まるので、結果の度数から平均・パーセンタイルを出す
+    order = np.argsort(result.durations)
+    values = np.asarray(result.durations)[order]
+    cum = np.cumsum(result.counts[order])
+    mean = float(np.dot(result.counts, result.durations)) / n
+    lines.append("--- 1ラウンドの所要時間（秒） ---")
+    lines.append(f"  平均 {mean:.3f}")
+    for p in (50, 95, 99):
+        rank = max(1, int(np.ceil(p / 100.0 * n)))
+        lines.append(f"  p{p:<3} {values[int(np.searchsorted(cum, rank))]:.3f}")
+
+    problems = outcomes.check_table()
+    lines.append(f"--- 抽選テーブルの検査（{len(problems)} 件） ---")
+    lines.extend("  " + p for p in problems)
+    return "\n".join(lines)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="抽選・演出の分布を NumPy で試す")
+    parser.add_argument("-n", "--rounds", type=int, default=10_000_000, help="ラウンド数")
+    parser.add_argument("--seed", type=int, default=None, help="乱数のシード（再現用）")
+    parser.add_argument("--lever", type=float, default=1.0, help="準備完了からレバーを引くまでの秒（仮定）")
+    parser.add_argument("--spin", type=float, default=2.0, help="回転開始から全リール停止までの秒（仮定）")
+    args = parser.parse_args(argv)
+
+    t0 = time.perf_counter()
+    result = simulate(args.rounds, seed=args.seed, lever=args.lever, spin=args.spin)
+    print(report(result, time.perf_counter() - t0))
+    return 1 if outcomes.check_table() else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,125 @@
+"""
+抽選テーブル（main_motor.py と sub.py で共通）
+
+random.random() の値 rn を、下の OUTCOME_TABLE の累積上限で bisect して
+「結果ID」と「演出フラグ」に変換する。範囲は lo <= rn < 上限。
+- 範囲・演出を変えるときはこのテーブルだけを直す（両基盤の if 文には閾値を書かない）
+- メイン基盤は結果IDだけをサブ基盤へ送る（protocol の "outcome"）
+- 表の検査（check_table）と分布の確認は python montecarlo.py
+"""
+from bisect import bisect_right
+from collections import namedtuple
+
+# ===================== 演出フラグ =====================
+WIN = 1 << 0                # 当たり（7揃いまで行く）
+AFTER_NOTICE = 1 << 1       # main: 1回目はハズレ停止 → 0.5秒後に再回転して7揃い
+FIRST_STOP_NOTICE = 1 << 2  # sub : 第一停止で当たりを鳴らす
+LOSE_THEN_WIN = 1 << 3      # sub : ハズレ通知を見てから当たりを鳴らす（後告知）
+FREEZE = 1 << 4             # main: 回転せず静止から FREEZE シーケンス / sub: FREEZE演出
+BUTTON = 1 << 5             # sub : button.mp4 ループ → PUSHボタン待ち
+PREMIUM = 1 << 6            # sub : 先バレ告知（ポキュン）
+START_SE = 1 << 7           # sub : レバーオンの開始音
+STAGGER = 1 << 8            # main: 1リールずつ回転開始
+BLACKOUT = 1 << 9           # main: リール停止までランプ消灯
+
+FLAG_NAMES = {
+    WIN: "win",
+    AFTER_NOTICE: "after_notice",
+    FIRST_STOP_NOTICE: "first_stop",
+    LOSE_THEN_WIN: "lose_then_win",
+    FREEZE: "freeze",
+    BUTTON: "button",
+    PREMIUM: "premium",
+    START_SE: "start_se",
+    STAGGER: "stagger",
+    BLACKOUT: "blackout",
+}
+
+class Outcome(namedtuple("Outcome", "id name lo hi flags")):
+    __slots__ = ()
+
+    def has(self, flag):
+        return bool(self.flags & flag)
+
+    @property
+    def win(self):
+        return self.has(WIN)
+
+    def describe(self):
+        names = [name for flag, name in FLAG_NAMES.items() if self.flags & flag]
+        return f"#{self.id} {self.name}（{self.lo:.2f}〜{self.hi:.2f}: {' '.join(names) or '-'}）"
+
+# ===================== 抽選テーブル =====================
+# (結果ID, 名前, 上限, フラグ)。上から順に、前の行の上限 <= rn < この行の上限
+OUTCOME_TABLE = [
+    (1, "premium",      0.05, WIN | AFTER_NOTICE | FIRST_STOP_NOTICE | PREMIUM),
+    (2, "first_stop",   0.10, WIN | AFTER_NOTICE | FIRST_STOP_NOTICE),
+    (3, "stagger",      0.15, WIN | AFTER_NOTICE | FIRST_STOP_NOTICE | START_SE | STAGGER),
+    (4, "blackout",     0.20, WIN | AFTER_NOTICE | LOSE_THEN_WIN | START_SE | BLACKOUT),
+    (5, "after_notice", 0.25, WIN | AFTER_NOTICE | LOSE_THEN_WIN | START_SE),
+    (6, "freeze",       0.30, WIN | FREEZE | START_SE),
+    (7, "button",       0.35, WIN | BUTTON | START_SE),
+    (8, "immediate",    0.50, WIN | START_SE),
+    (0, "lose",         1.00, START_SE),
+]
+
+def _build(table):
+    outcomes, bounds = [], []
+    lo = 0.0
+    for outcome_id, name, hi, flags in table:
+        outcomes.append(Outcome(outcome_id, name, lo, hi, flags))
+        bounds.append(hi)
+        lo = hi
+    return outcomes, bounds
+
+OUTCOMES, BOUNDS = _build(OUTCOME_TABLE)
+BY_ID = {o.id: o for o in OUTCOMES}
+
+# 演出の強制用（再回転・FREEZE後の7停止など、抽選によらず当たり/ハズレで止めたいとき）
+LOSE = BY_ID[0]
+
+def lookup(rn):
+    """rn（0.0〜1.0）→ Outcome"""
+    return OUTCOMES[min(bisect_right(BOUNDS, rn), len(OUTCOMES) - 1)]
+
+def by_id(outcome_id):
+    """結果ID → Outcome（知らないIDは KeyError）"""
+    return BY_ID[outcome_id]
+
+# ===================== 表の検査 =====================
+# 当たりのときだけ意味があるフラグ
+WIN_ONLY = AFTER_NOTICE | FIRST_STOP_NOTICE | LOSE_THEN_WIN | FREEZE | BUTTON | PREMIUM
+# sub の当たり演出（winnnig）はどれか1つ（無ければ即告知）
+SUB_NOTICES = (FIRST_STOP_NOTICE, LOSE_THEN_WIN, FREEZE, BUTTON)
+
+def check_table(table=None):
+    """範囲の重なり・抜けと、両基盤で食い違うフラグの組み合わせを文字列のリストで返す（無ければ空）"""
+    table = OUTCOMES if table is None else table
+    problems = []
+    ids = [o.id for o in table]
+    if len(set(ids)) != len(ids):
+        problems.append(f"結果IDが重複: {ids}")
+    if any(not 0 <= i <= 0xFF for i in ids):
+        problems.append("結果IDは 0〜255（protocol の u8）")
+    prev = 0.0
+    for o in table:
+        if o.lo != prev:
+            problems.append(f"{o.name}: {prev:.3f}〜{o.lo:.3f} がどの結果にも入らない")
+        if o.hi <= o.lo:
+            problems.append(f"{o.name}: 範囲が空か逆順（{o.lo:.3f}〜{o.hi:.3f}）")
+        prev = max(prev, o.hi)
+    if prev != 1.0:
+        problems.append(f"最後の上限が 1.0 ではない（{prev:.3f}）")
+
+    for o in table:
+        if not o.win and o.flags & WIN_ONLY:
+            problems.append(f"{o.name}: ハズレなのに当たり演出のフラグ（{o.describe()}）")
+        notices = [FLAG_NAMES[f] for f in SUB_NOTICES if o.flags & f]
+        if len(notices) > 1:
+            problems.append(f"{o.name}: sub の当たり演出が重なる（{' / '.join(notices)}）")
+        # main が "lose" を送るのは後告知のときだけ。送らないと sub が待ち続ける
+        if o.has(LOSE_THEN_WIN) and not o.has(AFTER_NOTICE):
+            problems.append(f"{o.name}: sub はハズレ通知を待つが main は後告知しない")
+        if o.has(FREEZE) and o.has(AFTER_NOTICE):
+            problems.append(f"{o.name}: FREEZE と後告知は同時に使えない")
+    return problems
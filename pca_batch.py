@@ -0,0 +1,129 @@
+"""
+PCA9685 まとめ書き（main_motor.py 用）
+
+adafruit_pca9685 の duty_cycle はチャンネル1つにつき I2C 1回（6バイト）。
+3リールを順に書くと、その間だけリールごとに動き出し・止まりがずれる。
+
+ここでは MODE1 の自動インクリメント（AI）を使い、LEDn_ON_L (0x06 + 4*n) から
+連続する複数チャンネルを1回の書き込みで送る。PCA9685 は STOP 条件で出力を切り替えるので
+（MODE2.OCH=0、既定）、1回で書いたチャンネルは同時に切り替わる。
+- 書いていない間のチャンネルは、シャドウ（最後に書いた値）で埋める
+  → すべての書き込みをここ経由にすること（直接 duty_cycle を書くとシャドウがずれる）
+- 全消灯は ALL_LED (0xFA) への1回で済ませる
+- シミュレータ（i2c_device が無い）ではチャンネルごとの duty_cycle 書き込みにフォールバック
+- サーボは ServoSpec（チャンネル・パルス幅・周波数）で指定し、throttle -> duty はここで計算する
+"""
+import struct
+import threading
+
+MODE1 = 0x00
+MODE1_AI = 0x20
+LED0_ON_L = 0x06
+ALL_LED_ON_L = 0xFA
+CHANNEL_COUNT = 16
+FULL = 0x1000   # ON_H / OFF_H の full on / full off ビット
+
+def duty_to_regs(duty):
+    """16bit duty -> (ON, OFF)（adafruit_pca9685.PWMChannel と同じ換算）"""
+    if not 0 <= duty <= 0xFFFF:
+        raise ValueError(f"Out of range: value {duty} not 0 <= value <= 65,535")
+    if duty == 0xFFFF:
+        return (FULL, 0)
+    if duty < 0x0010:
+        return (0, FULL)
+    return (0, duty >> 4)
+
+class ServoSpec:
+    """
+    連続回転サーボ1つ分の設定（チャンネル・パルス幅 [us]・PWM周波数 [Hz]）。
+    duty の換算はライブラリの内部属性を読まず、この設定から adafruit_motor と同じ式で計算する
+    """
+    __slots__ = ("channel", "min_duty", "duty_range")
+
+    def __init__(self, channel, min_pulse, max_pulse, frequency):
+        self.channel = channel
+        self.min_duty = int((min_pulse * frequency) / 1000000 * 0xFFFF)
+        max_duty = (max_pulse * frequency) / 1000000 * 0xFFFF
+        self.duty_range = int(max_duty - self.min_duty)
+
+def throttle_to_duty(servo, throttle):
+    """ServoSpec と throttle -> duty_cycle（adafruit_motor の ContinuousServo と同じ換算）"""
+    if throttle is None:
+        return 0
+    if not -1.0 <= throttle <= 1.0:
+        raise ValueError("Throttle must be None or between -1.0 and +1.0")
+    return servo.min_duty + int((throttle + 1) / 2 * servo.duty_range)
+
+class PCABatch:
+    def __init__(self, pca):
+        self.pca = pca
+        self._dev = getattr(pca, "i2c_device", None)
+        self._lock = threading.Lock()
+        self._shadow = [None] * CHANNEL_COUNT   # (ON, OFF)
+        self.transactions = 0
+        if self._dev is not None:
+            self._enable_auto_increment()
+            self._read_shadow()
+
+    # ---------- レジスタ直接アクセス ----------
+    def _write(self, reg, data):
+        with self._dev as i2c:
+            i2c.write(bytes([reg]) + data)
+        self.transactions += 1
+
+    def _read(self, reg, length):
+        buf = bytearray(length)
+        with self._dev as i2c:
+            i2c.write_then_readinto(bytes([reg]), buf)
+        return buf
+
+    def _enable_auto_increment(self):
+        mode1 = self._read(MODE1, 1)[0]
+        if not mode1 & MODE1_AI:
+            self._write(MODE1, bytes([mode1 | MODE1_AI]))
+
+    def _read_shadow(self):
+        raw = self._read(LED0_ON_L, 4 * CHANNEL_COUNT)
+        for ch in range(CHANNEL_COUNT):
+            self._shadow[ch] = struct.unpack_from("<HH", raw, 4 * ch)
+
+    # ---------- 公開API ----------
+    def write(self, duties):
+        """{チャンネル: 16bit duty} を1回の書き込みで反映する（変化が無ければ何もしない）"""
+        regs = {ch: duty_to_regs(d) for ch, d in duties.items()}
+        with self._lock:
+            if self._dev is None:
+                for ch, d in duties.items():
+                    self.pca.channels[ch].duty_cycle = d
+                return
+            changed = [ch for ch, r in regs.items() if self._shadow[ch] != r]
+            if not changed:
+                return
+            # 変わったチャンネルの最小〜最大を1回で書く（間のチャンネルはシャドウの値で上書き）。
+            # リールのサーボ（0/8/15）をまとめて書くと LED（1/7/14）も同じ値で書き直すことになるが、
+            # 3リールを同じ STOP 条件で切り替えるために、あえて1回の書き込みにしている
+            first, last = min(changed), max(changed)
+            words = []
+            for ch in range(first, last + 1):
+                words.extend(regs.get(ch, self._shadow[ch]))
+            self._write(LED0_ON_L + 4 * first, struct.pack(f"<{len(words)}H", *words))
+            for ch in range(first, last + 1):
+                if ch in regs:
+                    self._shadow[ch] = regs[ch]
+
+    def set_throttles(self, throttles):
+        """{ServoSpec: throttle} をまとめて反映（全リール同時に動かす/止める）"""
+        self.write({s.channel: throttle_to_duty(s, t) for s, t in throttles.items()})
+
+    def set_throttle(self, servo, throttle):
+        self.set_throttles({servo: throttle})
+
+    def all_off(self):
+        """全チャンネル消灯（ALL_LED の full off を1回）"""
+        with self._lock:
+            if self._dev is None:
+                for ch in range(CHANNEL_COUNT):
+                    self.pca.channels[ch].duty_cycle = 0
+                return
+            self._write(ALL_LED_ON_L, struct.pack("<HH", 0, FULL))
+            self._shadow = [(0, FULL)] * CHANNEL_COUNT
@@ -0,0 +1,62 @@
+"""
+起動時アセット読み込み（sub.py 用）
+
+画像・効果音・動画インデックスをスレッドプールで並行に読み、
+FIFO の待ち合わせ中に終わらせる。アセットごとの所要時間を report() で出す。
+"""
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import slotlog
+
+_log = slotlog.get("BOOT")
+
+class Preloader:
+    def __init__(self, t0, max_workers=4):
+        """t0: 起動時刻（time.perf_counter()）。report() の時刻はここからの経過"""
+        self.t0 = t0
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="preload")
+        self._futures = {}
+        self._results = {}  # 名前 -> 結果（失敗は None。失敗の表示は1回だけ）
+        self._times = {}    # 名前 -> (開始, 終了)
+
+    def submit(self, name, fn, *args):
+        def run():
+            start = time.perf_counter()
+            try:
+                return fn(*args)
+            finally:
+                self._times[name] = (start, time.perf_counter())
+        self._futures[name] = self._pool.submit(run)
+
+    def record(self, name, start, end=None):
+        """プール外（メインスレッド）でやった段階も同じ表に載せる"""
+        self._times[name] = (start, time.perf_counter() if end is None else end)
+
+    def result(self, name):
+        """name の結果（失敗していれば None。失敗は最初に取り出したときだけ表示する）"""
+        if name not in self._results:
+            try:
+                self._results[name] = self._futures[name].result()
+            except Exception as e:
+                _log.error("[BOOT] %s 読み込み失敗: %s", name, e)
+                self._results[name] = None
+        return self._results[name]
+
+    def wait(self):
+        """全部終わるまで待って {名前: 結果} を返す"""
+        results = {name: self.result(name) for name in self._futures}
+        self._pool.shutdown(wait=False)
+        return results
+
+    def report(self):
+        now = time.perf_counter()
+        items = sorted(self._times.items(), key=lambda kv: kv[1][0])
+        pooled = [(start, end) for name, (start, end) in items if name in self._futures]
+        serial = sum(end - start for start, end in pooled)
+        assets_done = max((end for _, end in pooled), default=self.t0)
+        lines = [f"--- 起動 {(now - self.t0) * 1000:.0f} ms で準備完了 / アセット {(assets_done - self.t0) * 1000:.0f} ms"
+                 f"（並行読み込みの合計 {serial * 1000:.0f} ms） 開始 / 所要 ms ---"]
+        for name, (start, end) in items:
+            lines.append(f"  {name:<24} {(start - self.t0) * 1000:8.1f} / {(end - start) * 1000:8.1f}")
+        return "\n".join(lines)
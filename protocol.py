@@ -0,0 +1,128 @@
+"""
+メイン基盤 → サブ基盤のフレーム化バイナリプロトコル
+
+1フレーム = ヘッダ(18バイト) + ペイロード（リトルエンディアン）
+  magic(u8)=0xD5, version(u8), type(u8), flags(u8), seq(u32), send_ns(u64), payload_len(u16)
+  send_ns は送信時の time.monotonic_ns()（同じ基板上のプロセス間で共通の時計）
+
+Encoder が連番を振り、Decoder が欠番・重複と片道遅延（受信時刻 - send_ns）を数える。
+"start" を受け取ると新しいセッションとして連番の追跡をやり直す（メイン基盤の再起動）。
+抽選結果は rn ではなく結果ID（outcomes.py）で送る（version 2）。
+"""
+import struct
+import threading
+import time
+from collections import deque, namedtuple
+
+from stats import percentile
+
+MAGIC = 0xD5
+VERSION = 2
+HEADER = struct.Struct("<BBBBIQH")
+
+MSG_START = 1
+MSG_OUTCOME = 2
+MSG_FIRST_STOP = 3
+MSG_LOSE = 4
+MSG_BONUS = 5
+
+KIND_TO_TYPE = {
+    "start": MSG_START,
+    "outcome": MSG_OUTCOME,
+    "first_stop": MSG_FIRST_STOP,
+    "lose": MSG_LOSE,
+    "bonus": MSG_BONUS,
+}
+TYPE_TO_KIND = {v: k for k, v in KIND_TO_TYPE.items()}
+
+# 種別ごとのペイロード形式（無いものは空）
+PAYLOADS = {
+    MSG_OUTCOME: struct.Struct("<B"),   # outcomes.py の結果ID
+}
+
+class Message(namedtuple("Message", "kind seq send_ns recv_ns value")):
+    __slots__ = ()
+
+    @property
+    def latency_ns(self):
+        return self.recv_ns - self.send_ns
+
+    def __str__(self):
+        body = self.kind if self.value is None else f"{self.kind}={self.value}"
+        return f"{body} (#{self.seq}, {self.latency_ns / 1e6:.3f} ms)"
+
+class Encoder:
+    def __init__(self):
+        self._seq = 0
+        self._lock = threading.Lock()
+
+    def encode(self, kind, value=None):
+        msg_type = KIND_TO_TYPE[kind]
+        fmt = PAYLOADS.get(msg_type)
+        payload = fmt.pack(value) if fmt is not None else b""
+        with self._lock:
+            seq = self._seq
+            self._seq = (self._seq + 1) & 0xFFFFFFFF
+        return HEADER.pack(MAGIC, VERSION, msg_type, 0, seq, time.monotonic_ns(), len(payload)) + payload
+
+class Decoder:
+    """バイト列を feed() すると、完成したフレームを Message のリストで返す"""
+    def __init__(self, history=1024):
+        self._buf = bytearray()
+        self._expected = None
+        self.lost = 0
+        self.duplicated = 0
+        self.corrupt = 0
+        self._latency = {}
+        self._history = history
+
+    def reset(self):
+        self._buf.clear()
+        self._expected = None
+
+    def feed(self, data):
+        self._buf += data
+        out = []
+        while True:
+            if len(self._buf) < HEADER.size:
+                break
+            magic, version, msg_type, _flags, seq, send_ns, length = HEADER.unpack_from(self._buf, 0)
+            if magic != MAGIC or version != VERSION or msg_type not in TYPE_TO_KIND:
+                # 1バイトずらして同期を取り直す
+                del self._buf[0]
+                self.corrupt += 1
+                continue
+            end = HEADER.size + length
+            if len(self._buf) < end:
+                break
+            payload = bytes(self._buf[HEADER.size:end])
+            del self._buf[:end]
+
+            fmt = PAYLOADS.get(msg_type)
+            value = fmt.unpack(payload)[0] if fmt is not None and len(payload) == fmt.size else None
+            msg = Message(TYPE_TO_KIND[msg_type], seq, send_ns, time.monotonic_ns(), value)
+            if self._track(msg):
+                out.append(msg)
+        return out
+
+    def _track(self, msg):
+        """欠番・重複を数える。重複は False（捨てる）"""
+        if msg.kind == "start":
+            self._expected = None
+        if self._expected is not None:
+            gap = (msg.seq - self._expected) & 0xFFFFFFFF
+            if gap >= 0x80000000:
+                self.duplicated += 1
+                return False
+            self.lost += gap
+        self._expected = (msg.seq + 1) & 0xFFFFFFFF
+        self._latency.setdefault(msg.kind, deque(maxlen=self._history)).append(msg.latency_ns)
+        return True
+
+    def report(self):
+        lines = [f"--- IPC（欠番 {self.lost} / 重複 {self.duplicated} / 破損 {self.corrupt}）片道遅延 ms: p50 / p95 / p99, n ---"]
+        for kind, vals in self._latency.items():
+            vals = sorted(vals)
+            p50, p95, p99 = (percentile(vals, p) / 1e6 for p in (50, 95, 99))
+            lines.append(f"  {kind:<10} {p50:9.3f} / {p95:9.3f} / {p99:9.3f}  (n={len(vals)})")
+        return "\n".join(lines)
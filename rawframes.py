@@ -0,0 +1,100 @@
+"""
+表示サイズのRGB生フレームコンテナ（.rgbf）
+
+transcode_assets.py で事前に作り、sub.py は mmap で開いてそのまま blit する。
+リサイズ・色変換・フレームごとのメモリ確保は再生時に一切しない。
+
+レイアウト（リトルエンディアン）
+  0      ヘッダ  HEADER_FMT（magic, version, width, height, channels, 予約, fps,
+                  frame_count, frame_bytes, data_offset, index_offset）
+  4096   フレーム本体（frame_bytes 固定長 × frame_count、ページ境界から開始）
+  index  フレームごとの開始オフセット（uint64 × frame_count）
+"""
+import mmap
+import os
+import struct
+
+MAGIC = b"DCEF"
+VERSION = 1
+HEADER_FMT = "<4sHHHHHdIIQQ"
+HEADER_SIZE = struct.calcsize(HEADER_FMT)
+DATA_ALIGN = 4096
+EXT = ".rgbf"
+
+def raw_path(video_path):
+    """動画パスに対応するコンテナのパス"""
+    return os.path.splitext(video_path)[0] + EXT
+
+class RawFrameWriter:
+    def __init__(self, path, size, fps):
+        self.path = path
+        self.size = size
+        self.fps = float(fps)
+        self.frame_bytes = size[0] * size[1] * 3
+        self.count = 0
+        self._tmp = path + ".tmp"
+        self._f = open(self._tmp, "wb")
+        self._f.write(b"\0" * DATA_ALIGN)
+
+    def write(self, rgb):
+        """rgb: 高さ×幅×3 の uint8 配列（または同じ長さのバイト列）"""
+        mv = memoryview(rgb).cast("B")
+        if len(mv) != self.frame_bytes:
+            raise ValueError(f"フレームサイズ不一致: {len(mv)} != {self.frame_bytes}")
+        self._f.write(mv)
+        self.count += 1
+
+    def close(self):
+        index_offset = DATA_ALIGN + self.count * self.frame_bytes
+        self._f.write(struct.pack(f"<{self.count}Q", *(DATA_ALIGN + i * self.frame_bytes for i in range(self.count))))
+        self._f.seek(0)
+        self._f.write(struct.pack(
+            HEADER_FMT, MAGIC, VERSION, self.size[0], self.size[1], 3, 0,
+            self.fps, self.count, self.frame_bytes, DATA_ALIGN, index_offset,
+        ))
+        self._f.close()
+        # 書き終わってから置き換える（再生中の sub.py が中途半端なファイルを開かないように）
+        os.replace(self._tmp, self.path)
+
+    def abort(self):
+        self._f.close()
+        if os.path.exists(self._tmp):
+            os.remove(self._tmp)
+
+class RawClip:
+    """mmap で開いたコンテナ。frame(i) はコピーなしの memoryview を返す"""
+    def __init__(self, path):
+        self.path = path
+        self._f = open(path, "rb")
+        try:
+            self._mm = mmap.mmap(self._f.fileno(), 0, access=mmap.ACCESS_READ)
+        except Exception:
+            self._f.close()
+            raise
+        (magic, version, w, h, ch, _, fps, count, frame_bytes,
+         _data_offset, index_offset) = struct.unpack_from(HEADER_FMT, self._mm, 0)
+        if magic != MAGIC or version != VERSION or ch != 3:
+            self.close()
+            raise ValueError(f"rgbfコンテナではありません: {path}")
+        self.size = (w, h)
+        self.fps = fps
+        self.count = count
+        self.frame_bytes = frame_bytes
+        self.offsets = struct.unpack_from(f"<{count}Q", self._mm, index_offset)
+        self._view = memoryview(self._mm)
+        # 先読みヒント（対応OSのみ）
+        if hasattr(self._mm, "madvise") and hasattr(mmap, "MADV_SEQUENTIAL"):
+            self._mm.madvise(mmap.MADV_SEQUENTIAL)
+
+    def frame(self, i):
+        off = self.offsets[i]
+        return self._view[off:off + self.frame_bytes]
+
+    def close(self):
+        try:
+            if getattr(self, "_view", None) is not None:
+                self._view.release()
+            self._mm.close()
+        except Exception:
+            pass
+        self._f.close()
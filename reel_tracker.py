@@ -0,0 +1,168 @@
+"""
+リール位置の推定（main_motor.py 用）
+
+センサーは1回転に1回（7の位置で）立ち上がる。そのエッジ時刻をすべてリングバッファに記録し、
+直近の周期・位相・ばらつきから「今リールがどこにいるか」を推定する。
+
+角度は 1回転 = 1.0 の割合で表す（0.0 = センサー位置 = 7）。
+time_to_angle(a) で「角度 a に来るまでの時間」が分かるので、
+センサーを待たずに狙った位置で止められる。
+
+CoastModel は停止指令から静止までの惰性（時間 lag と、その間に進む角度）をリールごとに学習する。
+直線的に減速すると仮定すると、速度 v0 で指令してから lag 秒で止まり、その間に v0*lag/2 回転進む。
+"""
+import threading
+from collections import namedtuple
+
+import numpy as np
+
+import timebase
+
+# 周期の推定に使う直近の間隔数
+WINDOW = 8
+# 直近の間隔からこれ以上ずれた間隔は「速度が変わる前」とみなして使わない
+SPEED_TOLERANCE = 0.2
+# 最後のエッジから周期の何倍エッジが来なければ推定を無効にする（減速・停止）
+STALE_FACTOR = 1.5
+# 惰性の計測：センサーまでの時間が等速のときよりこの割合以上遅れたものだけ使う
+EDGE_MIN_SLOWDOWN = 0.1
+# 窓を通り過ぎたとき、惰性を「窓の先まで進む時間」の何倍まで伸ばすか
+PASSED_MARGIN = 1.1
+
+Estimate = namedtuple("Estimate", "period_ns jitter_ns last_edge_ns samples")
+
+class ReelTracker:
+    def __init__(self, name, capacity=64):
+        self.name = name
+        self._edges = np.zeros(capacity, dtype=np.int64)
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def record(self, t_ns):
+        """センサーエッジ（timebase.perf_counter_ns()）を記録する。GPIOコールバックから呼ぶ"""
+        with self._lock:
+            self._edges[self._count % len(self._edges)] = t_ns
+            self._count += 1
+
+    def reset(self):
+        """速度を変えたとき（回転開始など）に古い周期を捨てる"""
+        with self._lock:
+            self._count = 0
+
+    def _recent(self, n):
+        # 古い順に最大 n 個（ロック保持中に呼ぶ）
+        n = min(n, self._count, len(self._edges))
+        idx = (np.arange(self._count - n, self._count)) % len(self._edges)
+        return self._edges[idx]
+
+    def estimate(self, now_ns=None):
+        """周期の推定（エッジ不足・速度変化直後・止まりかけなら None）"""
+        with self._lock:
+            edges = self._recent(WINDOW + 1)
+        if len(edges) < 3:
+            return None
+        diffs = np.diff(edges)
+        latest = diffs[-1]
+        if latest <= 0:
+            return None
+        # 後ろから、直近と同じ速度とみなせる間隔だけを使う
+        ok = np.abs(diffs - latest) <= SPEED_TOLERANCE * latest
+        k = len(ok) if ok.all() else len(ok) - 1 - int(np.flatnonzero(~ok)[-1])
+        if k < 2:
+            return None
+        use = diffs[-k:]
+        period = float(np.median(use))
+        est = Estimate(period, float(np.std(use)), int(edges[-1]), k)
+        if now_ns is None:
+            now_ns = timebase.perf_counter_ns()
+        if now_ns - est.last_edge_ns > STALE_FACTOR * period:
+            return None
+        return est
+
+    def angle(self, now_ns=None, est=None):
+        """今の角度（0.0〜1.0、推定できなければ None）"""
+        if now_ns is None:
+            now_ns = timebase.perf_counter_ns()
+        est = est or self.estimate(now_ns)
+        if est is None:
+            return None
+        return ((now_ns - est.last_edge_ns) / est.period_ns) % 1.0
+
+    def time_to_angle(self, target, now_ns=None, est=None):
+        """角度 target に次に来るまでの ns（推定できなければ None）"""
+        if now_ns is None:
+            now_ns = timebase.perf_counter_ns()
+        est = est or self.estimate(now_ns)
+        if est is None:
+            return None
+        current = ((now_ns - est.last_edge_ns) / est.period_ns) % 1.0
+        return ((target - current) % 1.0) * est.period_ns
+
+    def describe(self, est=None):
+        est = est or self.estimate()
+        if est is None:
+            return f"[{self.name}] 推定なし（エッジ {self._count}）"
+        return (f"[{self.name}] 周期 {est.period_ns / 1e6:.1f} ms / ばらつき {est.jitter_ns / 1e6:.2f} ms"
+                f"（{est.samples}間隔）")
+
+# ===================== 惰性の学習 =====================
+class CoastModel:
+    """
+    停止指令 → 静止 の時間 lag_s を学習する（直線減速を仮定）。
+    観測は7停止のときのセンサーから取る：
+      - 手前で指令して、惰性中にセンサーが来た : 来るまでの時間から lag を計算（observe_edge）
+      - 手前で指令して、センサーが来なかった   : lag は「その距離を進む時間」より短い（observe_short）
+      - 静止後にセンサー窓を通り過ぎていた     : lag は「窓の先まで進む時間」より長い（observe_passed）
+    """
+    def __init__(self, name, lag_s=0.0, alpha=0.3, history=256):
+        self.name = name
+        self.lag_s = lag_s
+        self.alpha = alpha
+        self.samples = np.zeros(history, dtype=np.float64)
+        self.count = 0
+        self.short = 0
+        self.passed = 0
+        self.in_window = 0
+
+    def coast_rev(self, period_ns):
+        """今の速度（周期 period_ns）で停止指令したときに惰性で進む角度"""
+        v0 = 1e9 / period_ns
+        return v0 * self.lag_s / 2
+
+    def _add(self, lag):
+        self.samples[self.count % len(self.samples)] = lag
+        self.count += 1
+        if self.count == 1:
+            self.lag_s = lag
+        else:
+            self.lag_s += self.alpha * (lag - self.lag_s)
+
+    def observe_edge(self, lead_rev, dt_s, period_ns):
+        """センサーの lead_rev 手前で指令し、dt_s 後にセンサーが来た"""
+        v0 = 1e9 / period_ns
+        # v0*(t - t^2/(2*lag)) = lead_rev を lag について解く。
+        # 減速の影響が小さい（等速とほぼ同じ時間で来た）ときは誤差が大きいので使わない
+        denom = 2 * (dt_s - lead_rev / v0)
+        if denom <= EDGE_MIN_SLOWDOWN * 2 * dt_s:
+            return
+        self._add(dt_s * dt_s / denom)
+
+    def observe_short(self, lead_rev, period_ns):
+        """センサーの lead_rev 手前で指令し、センサーまで届かずに止まった"""
+        self.short += 1
+        bound = 2 * lead_rev * period_ns / 1e9
+        self.lag_s = min(self.lag_s, bound) * 0.8
+
+    def observe_passed(self, beyond_rev, period_ns):
+        """指令位置から beyond_rev 先（センサー窓の終わり）を通り過ぎて止まった"""
+        self.passed += 1
+        bound = 2 * beyond_rev * period_ns / 1e9
+        # 大きく伸ばすと次は手前で止まりすぎるので、下限を少し越えるところまでにする
+        if self.lag_s < bound:
+            self.lag_s = bound * PASSED_MARGIN
+
+    def describe(self):
+        n = min(self.count, len(self.samples))
+        spread = f" / ばらつき {np.std(self.samples[:n]) * 1000:.1f} ms" if n >= 2 else ""
+        return (f"[{self.name}] 惰性 {self.lag_s * 1000:.1f} ms{spread}（計測 {self.count} / 窓内 {self.in_window}"
+                f" / 届かず {self.short} / 通過 {self.passed}）")
@@ -0,0 +1,154 @@
+"""
+メイン基盤とサブ基盤の FIFO 待ち合わせ
+
+- wait_for_path(path) : FIFO ができるまで inotify で眠って待つ（CPUを使わない）
+- ensure_fifo(path)   : FIFO が無ければ作る。既にあれば作り直さない
+                         （作り直すと、古いパスで open 待ちしている相手が取り残される）
+- FifoWriter          : メイン基盤側の送信口。相手が落ちたら裏で再接続を待ち、
+                         つながったら hello（"start" フレーム）を送り直す
+"""
+import ctypes
+import ctypes.util
+import errno
+import os
+import select
+import stat
+import threading
+import time
+
+import slotlog
+
+_IN_MOVED_TO = 0x00000080
+_IN_CREATE = 0x00000100
+_IN_CLOEXEC = 0o2000000
+
+_libc = None
+
+_log = slotlog.get("FIFO")
+
+def _inotify_libc():
+    global _libc
+    if _libc is None:
+        _libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+    return _libc
+
+def _inotify_watch_dir(directory):
+    """ディレクトリへの作成/移動を監視する fd を返す（使えなければ -1）"""
+    try:
+        libc = _inotify_libc()
+        fd = libc.inotify_init1(_IN_CLOEXEC)
+        if fd < 0:
+            return -1
+        if libc.inotify_add_watch(fd, os.fsencode(directory), _IN_CREATE | _IN_MOVED_TO) < 0:
+            os.close(fd)
+            return -1
+        return fd
+    except (OSError, AttributeError):
+        return -1
+
+def wait_for_path(path, timeout=None, poll_interval=0.2):
+    """path ができるまで待つ。できたら True、timeout なら False"""
+    if os.path.exists(path):
+        return True
+    deadline = None if timeout is None else time.monotonic() + timeout
+    fd = _inotify_watch_dir(os.path.dirname(os.path.abspath(path)))
+    try:
+        # 監視を始めてからもう一度確認（その間に作られた分を取りこぼさない）
+        while not os.path.exists(path):
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                return False
+            if fd < 0:
+                # inotify が使えない環境：従来より粗い間隔で確認
+                time.sleep(poll_interval if remaining is None else min(poll_interval, remaining))
+                continue
+            ready, _, _ = select.select([fd], [], [], remaining)
+            if ready:
+                os.read(fd, 4096)
+        return True
+    finally:
+        if fd >= 0:
+            os.close(fd)
+
+def ensure_fifo(path):
+    try:
+        st = os.stat(path)
+        if stat.S_ISFIFO(st.st_mode):
+            return
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+    os.mkfifo(path)
+
+class FifoWriter:
+    """
+    FIFO へのフレーム送信。読み手（sub.py）が再起動しても、こちらは再起動不要。
+    - connect() : 読み手が開くまで待って接続し、hello() の戻り値を送る
+    - send()    : 1フレーム（bytes）送る。切断中は捨てて False（裏の再接続スレッドがつなぎ直す）
+    PIPE_BUF 以下の write は途中で混ざらないので、1フレーム = 1回の os.write にする。
+    """
+    def __init__(self, path, hello=None):
+        self.path = path
+        self.hello = hello
+        self._lock = threading.Lock()
+        self._fd = None
+        self._reconnecting = False
+
+    @property
+    def connected(self):
+        return self._fd is not None
+
+    def _open_blocking(self):
+        # O_CREAT なしで開く（消えていたら FIFO を作り直してから）
+        while True:
+            try:
+                return os.open(self.path, os.O_WRONLY)
+            except FileNotFoundError:
+                ensure_fifo(self.path)
+
+    def connect(self):
+        fd = self._open_blocking()
+        with self._lock:
+            self._fd = fd
+            self._reconnecting = False
+            if self.hello is not None:
+                self._write_locked(self.hello())
+        _log.info("[FIFO] サブ基盤接続")
+
+    def _write_locked(self, data):
+        try:
+            os.write(self._fd, data)
+            return True
+        except OSError as e:
+            if e.errno not in (errno.EPIPE, errno.EBADF):
+                raise
+            try:
+                os.close(self._fd)
+            except OSError:
+                pass
+            self._fd = None
+            _log.warn("[FIFO] サブ基盤切断：再接続待ち")
+            self._start_reconnect_locked()
+            return False
+
+    def _start_reconnect_locked(self):
+        if self._reconnecting:
+            return
+        self._reconnecting = True
+        threading.Thread(target=self.connect, daemon=True).start()
+
+    def send(self, data):
+        with self._lock:
+            if self._fd is None:
+                _log.warn("[FIFO] 未接続のため破棄: %dバイト", len(data))
+                return False
+            return self._write_locked(data)
+
+    def close(self):
+        with self._lock:
+            if self._fd is not None:
+                try:
+                    os.close(self._fd)
+                except OSError:
+                    pass
+                self._fd = None
@@ -0,0 +1,259 @@
+"""
+io_trace の記録を再生して、出力（PCA・GPIO 出力）の時刻を記録と比べる（実機不要）
+
+  python replay.py /var/log/slot/main-20261018-101500.iot
+  python replay.py sub-20261018-101500.iot --tolerance 80
+  python replay.py main-20261018-101500.iot --info     # 中身の概要だけ
+
+main の記録：仮想時間（timebase.VirtualClock）で main_motor.py を動かす。
+  - 記録のエッジ・レベル（レバー・STOP・センサー）を同じ時刻にシミュレータの GPIO へ入れる（リールは回さない）
+  - 抽選の rn は記録の値を順に使う
+  - 記録の最初のラウンド開始（MARK_ROUND）の時刻から loop() を回し、そこを基準に出力を突き合わせる
+  → ReelStopper・rotate の判断や停止指令のタイミングが変わっていれば、食い違い・ずれとして出る
+sub の記録：button_loop_movie_until_gpio_high を区間ごとに実時間で呼び直す（pygame はダミー）。
+  PUSHボタンのレベルを記録どおりに動かし、LED 出力・区間の長さ・確定したかを比べる。
+
+入力の入れ方：
+  EDGE  : コールバックだけ呼ぶ（レベルは変えない。センサーのパルス幅は記録に無いため）
+  PIN   : レベルを変える（レバー・PUSH は両エッジが記録にある）
+  LEVEL : アプリが読んだ値。読む時刻より LEVEL_LEAD_NS だけ先に入れる（PIN のあるピンは使わない）
+実機の記録は処理の遅れ（スレッドの起床・I2C）の分だけ読む時刻が後ろにずれているので、
+仮想時間の再生とは ms 未満〜数 ms の差が出る。
+"""
+import argparse
+import contextlib
+import os
+import sys
+import tempfile
+
+import io_trace
+import slotlog
+import timebase
+from stats import percentile
+
+DEFAULT_TOLERANCE_MS = {"main": 20.0, "sub": 80.0}
+
+class _NullFifo:
+    """サブ基盤への送信は捨てる"""
+    def send(self, data):
+        pass
+
+    def close(self):
+        pass
+
+# LEVEL は「その時刻にアプリが読んだ値」。記録側の処理の遅れがあるので、読む側より先に入れておく
+LEVEL_LEAD_NS = 2_000_000
+# 記録の終わりとちょうど同じ時刻に始まるラウンド（最後のラウンドの直後）は数えない。
+# 仮想時間の sleep は秒の float を通るので、再生では ns 単位で前後する
+ROUND_END_MARGIN_NS = 1_000_000
+
+def _schedule(inputs):
+    """(時刻, 種別, ピン, 値) を入れる順に（PIN のあるピンの LEVEL は捨てる）"""
+    watched = set(int(p) for p in inputs["pin"][inputs["kind"] == io_trace.PIN])
+    out = []
+    for t, kind, pin, value in zip(inputs["t"], inputs["kind"], inputs["pin"], inputs["value"]):
+        t, kind, pin, value = int(t), int(kind), int(pin), int(value)
+        if kind == io_trace.LEVEL:
+            if pin in watched:
+                continue
+            t -= LEVEL_LEAD_NS
+        out.append((t, kind, pin, value))
+    out.sort(key=lambda x: x[0])
+    return out
+
+def _feed(gpio, inputs, elapsed_ns, offset_ns=0):
+    """記録の入力を同じ時刻（offset_ns ずらし）にシミュレータの GPIO へ入れる"""
+    for t, kind, pin, value in _schedule(inputs):
+        wait_ns = t + offset_ns - elapsed_ns()
+        if wait_ns > 0:
+            timebase.sleep(wait_ns / 1e9)
+        if kind != io_trace.EDGE:
+            gpio.set_level(pin, value)
+        if kind != io_trace.LEVEL:
+            gpio.trigger(pin)
+
+def _rebase(records, t0, length=None):
+    r = records[records["t"] >= t0].copy()
+    r["t"] -= t0
+    if length is not None:
+        r = r[r["t"] < length]
+    return r
+
+def _prepare_env(role):
+    os.environ["SLOT_BACKEND"] = "sim"
+    os.environ.pop("SLOT_SIM_AUTOPLAY", None)
+    os.environ.pop("SLOT_IO_TRACE", None)
+    os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+    if role == "main":
+        # センサーは記録から入れるので、シミュレータのリールは回さない
+        os.environ["SLOT_SIM_REELS"] = "0"
+        os.environ["SLOT_STATE_PATH"] = os.path.join(tempfile.mkdtemp(prefix="replay-"), "state")
+    else:
+        os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+
+# ===================== main =====================
+def replay_main(trace, out_path, tail, quiet):
+    recs = trace.records
+    rounds = io_trace.marks(recs, io_trace.MARK_ROUND)
+    if not len(rounds):
+        return None, ["ラウンド開始の印（MARK_ROUND）が無い"]
+    start = int(rounds["t"][0])
+    # 終了処理（cleanup）の書き込みは再生しないので、その手前までを比べる
+    cleanup = io_trace.marks(recs, io_trace.MARK_CLEANUP)
+    end = int(cleanup["t"][0]) if len(cleanup) else int(recs["t"][-1])
+    length = end - start
+    rounds = rounds[rounds["t"] < end - ROUND_END_MARGIN_NS]
+
+    _prepare_env("main")
+    timebase.install(timebase.VirtualClock())
+    rec = io_trace.install(io_trace.Recorder(out_path, "main"))
+    io_trace.replay_draws(io_trace.rn_values(recs))
+
+    out = open(os.devnull, "w") if quiet else sys.stdout
+    # 書き出しスレッドは redirect を抜けた後に書くことがあるので、ログの書き出し先も固定する
+    slotlog.set_output(out)
+    with contextlib.redirect_stdout(out):
+        import main_motor
+        main_motor.set_fifo_global(_NullFifo())
+        timebase.spawn(_feed, name="replay-feed",
+                       args=(main_motor.backend.gpio, io_trace.select(recs, io_trace.INPUT_KINDS), rec.elapsed_ns))
+        # main() の接続待ちの間は進めない（ラウンド開始を記録に合わせる）
+        timebase.sleep(max(0, start - rec.elapsed_ns()) / 1e9)
+        timebase.spawn(main_motor.loop, name="replay-loop", args=(main_motor.fifo_global,))
+        timebase.sleep((length + tail * 1e9) / 1e9)
+        rec.close()
+        slotlog.flush()
+
+    actual = io_trace.read(out_path).records
+    got = io_trace.marks(actual, io_trace.MARK_ROUND)
+    if len(got):
+        got = got[got["t"] - got["t"][0] < length - ROUND_END_MARGIN_NS]
+    problems = []
+    if len(got) != len(rounds):
+        problems.append(f"ラウンド数が違う（記録 {len(rounds)} / 再生 {len(got)}）")
+    if not len(got):
+        return None, problems
+
+    names = {}
+    for name, ch in (("REEL1", main_motor.PCA_CHANNEL), ("REEL2", main_motor.PCA_CHANNEL2), ("REEL3", main_motor.PCA_CHANNEL3)):
+        names[(io_trace.PCA, ch)] = name
+    for i, ch in enumerate(main_motor.LED_CHANNELS):
+        names[(io_trace.PCA, ch)] = f"LED{i + 1}"
+    expected = _rebase(io_trace.select(recs, io_trace.ACTUATOR_KINDS), start, length)
+    replayed = _rebase(io_trace.select(actual, io_trace.ACTUATOR_KINDS), int(got["t"][0]), length)
+    return (expected, replayed, names), problems
+
+# ===================== sub =====================
+def _segments(records):
+    """(開始, 終了, 確定) の button 演出区間"""
+    out = []
+    ends = io_trace.marks(records, io_trace.MARK_BUTTON_END)
+    for tb in io_trace.marks(records, io_trace.MARK_BUTTON_BEGIN)["t"]:
+        later = ends[ends["t"] >= tb]
+        if len(later):
+            out.append((int(tb), int(later["t"][0]), bool(later["value"][0])))
+    return out
+
+def replay_sub(trace, out_path, quiet):
+    recs = trace.records
+    segments = _segments(recs)
+    if not segments:
+        return [], ["button 演出の区間が無い"]
+
+    _prepare_env("sub")
+    rec = io_trace.install(io_trace.Recorder(out_path, "sub"))
+
+    out = open(os.devnull, "w") if quiet else sys.stdout
+    slotlog.set_output(out)
+    with contextlib.redirect_stdout(out):
+        import pygame
+        import sub
+        sub.gpio_init()
+        gpio = sub.backend.gpio
+        pin = sub.GPIO_PIN_BUTTON
+        screen = pygame.display.set_mode((sub.SCREEN_WIDTH, sub.SCREEN_HEIGHT))
+        clock = pygame.time.Clock()
+        for tb, te, _ in segments:
+            inputs = io_trace.select(recs, io_trace.INPUT_KINDS)
+            inputs = inputs[inputs["pin"] == pin]
+            before = inputs[inputs["t"] <= tb]
+            if len(before):
+                gpio.set_level(pin, int(before["value"][-1]))
+            during = inputs[(inputs["t"] > tb) & (inputs["t"] <= te)]
+            feeder = timebase.spawn(_feed, name="replay-feed",
+                                    args=(gpio, during, rec.elapsed_ns, rec.elapsed_ns() - tb))
+            sub.button_loop_movie_until_gpio_high(screen, clock)
+            feeder.join()
+        rec.close()
+        slotlog.flush()
+
+    actual = io_trace.read(out_path).records
+    got = _segments(actual)
+    problems = []
+    if len(got) != len(segments):
+        problems.append(f"区間の数が違う（記録 {len(segments)} / 再生 {len(got)}）")
+    pairs = []
+    names = {(io_trace.OUT, sub.LED_PIN): "PUSH_LED"}
+    for i, ((eb, ee, ec), (ab, ae, ac)) in enumerate(zip(segments, got)):
+        if ec != ac:
+            problems.append(f"区間{i + 1}: 確定が違う（記録 {ec} / 再生 {ac}）")
+        expected = _rebase(io_trace.select(recs, io_trace.ACTUATOR_KINDS), eb, ee - eb)
+        replayed = _rebase(io_trace.select(actual, io_trace.ACTUATOR_KINDS), ab, ae - ab)
+        pairs.append((f"区間{i + 1}（{(ee - eb) / 1e9:.2f} 秒 / 再生 {(ae - ab) / 1e9:.2f} 秒）", expected, replayed, names))
+    return pairs, problems
+
+# ===================== 表示 =====================
+def _diff_line(diffs):
+    if not diffs:
+        return "  比べられる出力なし"
+    vals = sorted(abs(d) for d in diffs)
+    p50, p95, p99 = (percentile(vals, p) / 1e6 for p in (50, 95, 99))
+    worst = max(diffs, key=abs) / 1e6
+    return f"  {p50:9.3f} / {p95:9.3f} / {p99:9.3f} / 最大 {worst:+.3f}  (n={len(diffs)})"
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="io_trace の記録を再生して出力の時刻を比べる")
+    parser.add_argument("trace", help="記録ファイル（main-*.iot / sub-*.iot）")
+    parser.add_argument("--info", action="store_true", help="記録の概要だけ表示する")
+    parser.add_argument("--tolerance", type=float, default=None,
+                        help="出力の時刻ずれの許容（ms、既定 main 20 / sub 80）")
+    parser.add_argument("--tail", type=float, default=1.0, help="main: 記録の終わりから余分に回す秒")
+    parser.add_argument("--out", default=None, help="再生中の記録の保存先（既定は一時ファイル）")
+    parser.add_argument("--verbose", action="store_true", help="main_motor.py / sub.py の表示を出す")
+    args = parser.parse_args(argv)
+
+    trace = io_trace.read(args.trace)
+    print(io_trace.summary(trace))
+    if args.info:
+        return 0
+
+    out_path = args.out or os.path.join(tempfile.mkdtemp(prefix="replay-"), f"replay-{trace.role}.iot")
+    tolerance_ns = int((args.tolerance if args.tolerance is not None else DEFAULT_TOLERANCE_MS[trace.role]) * 1e6)
+    if trace.role == "main":
+        result, problems = replay_main(trace, out_path, args.tail, not args.verbose)
+        pairs = [("全体", *result)] if result is not None else []
+    elif trace.role == "sub":
+        pairs, problems = replay_sub(trace, out_path, not args.verbose)
+    else:
+        print(f"未知の役割: {trace.role}")
+        return 2
+
+    diffs = []
+    print(f"--- 出力の時刻差 再生−記録（ms: p50 / p95 / p99 は絶対値, 許容 {tolerance_ns / 1e6:.0f} ms） ---")
+    for label, expected, replayed, names in pairs:
+        comparison = io_trace.compare(expected, replayed, names, tolerance_ns)
+        print(label)
+        print(_diff_line(comparison.diffs_ns))
+        diffs.extend(comparison.diffs_ns)
+        problems.extend(f"{label}: {p}" if len(pairs) > 1 else p for p in comparison.problems)
+    if len(pairs) > 1:
+        print("合計")
+        print(_diff_line(diffs))
+    print(f"--- 食い違い（{len(problems)} 件） ---")
+    for p in problems:
+        print("  " + p)
+    print(f"再生の記録: {out_path}")
+    return 1 if problems else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,182 @@
+"""
+メイン基盤 → サブ基盤の共有メモリ（リール・ラウンド状態）
+
+main_motor.py が書き、sub.py がフレームごとに読む。読む側はシステムコールもロックも使わない。
+FIFO（protocol.py）は「出来事」を、こちらは「今の状態」を渡す。
+
+seqlock:
+  書く側は seq を奇数にしてから中身を書き、書き終えたら偶数に戻す。
+  読む側は seq → 中身 → seq と読み、前後が同じ偶数なら一貫した中身とみなす（違えば読み直す）。
+
+レイアウト（リトルエンディアン）
+  0   magic(4s), version(u16), 予約(u16)
+  8   seq(u32)
+  12  round(u32), phase(u8), stopped[3](u8), spin_rn(f64), updated_ns(u64)
+      updated_ns は time.monotonic_ns()（同じ基板上のプロセス間で共通の時計）
+"""
+import mmap
+import os
+import struct
+import tempfile
+import threading
+import time
+from collections import namedtuple
+
+MAGIC = b"DCES"
+VERSION = 1
+HEADER = struct.Struct("<4sHH")
+SEQ = struct.Struct("<I")
+BODY = struct.Struct("<IB3BdQ")
+SEQ_OFFSET = HEADER.size
+BODY_OFFSET = SEQ_OFFSET + SEQ.size
+SIZE = BODY_OFFSET + BODY.size
+
+REEL_COUNT = 3
+
+PHASE_IDLE = 0      # レバー待ち
+PHASE_SPIN = 1      # 回転中（STOP受付中）
+PHASE_FREEZE = 2    # フリーズ演出中
+PHASE_STOPPED = 3   # 全リール停止
+PHASE_BONUS = 4     # 7揃い確定
+
+PHASE_NAMES = {
+    PHASE_IDLE: "idle",
+    PHASE_SPIN: "spin",
+    PHASE_FREEZE: "freeze",
+    PHASE_STOPPED: "stopped",
+    PHASE_BONUS: "bonus",
+}
+
+# 読み直しの上限（書き込み中に当たり続けたら前回の値を返す）
+READ_RETRIES = 100
+
+def default_path():
+    shm = "/dev/shm"
+    base = shm if os.path.isdir(shm) else tempfile.gettempdir()
+    return os.path.join(base, "dce_slot_state")
+
+STATE_PATH = os.environ.get("SLOT_STATE_PATH") or default_path()
+
+class Snapshot(namedtuple("Snapshot", "seq round phase stopped spin_rn updated_ns")):
+    __slots__ = ()
+
+    @property
+    def phase_name(self):
+        return PHASE_NAMES.get(self.phase, str(self.phase))
+
+class StateWriter:
+    """
+    メイン基盤側。リールスレッドからも書くので、書き込み同士はロックで直列化する。
+    既存のファイルは作り直さない（読む側の mmap がそのまま使えるように）。
+    """
+    def __init__(self, path=STATE_PATH):
+        self.path = path
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            if os.fstat(fd).st_size < SIZE:
+                os.ftruncate(fd, SIZE)
+            self._mm = mmap.mmap(fd, SIZE)
+        finally:
+            os.close(fd)
+        self._lock = threading.Lock()
+        magic, version, _ = HEADER.unpack_from(self._mm, 0)
+        seq = SEQ.unpack_from(self._mm, SEQ_OFFSET)[0] if (magic, version) == (MAGIC, VERSION) else 0
+        # 前回のメイン基盤が書き込み途中で落ちていても偶数から始める
+        self._seq = (seq + 1) & ~1 & 0xFFFFFFFF
+        self._round = 0
+        self._phase = PHASE_IDLE
+        self._stopped = [0] * REEL_COUNT
+        self._spin_rn = 0.0
+        with self._lock:
+            self._publish_locked()
+        HEADER.pack_into(self._mm, 0, MAGIC, VERSION, 0)
+
+    def _publish_locked(self):
+        SEQ.pack_into(self._mm, SEQ_OFFSET, (self._seq + 1) & 0xFFFFFFFF)
+        BODY.pack_into(self._mm, BODY_OFFSET, self._round, self._phase, *self._stopped,
+                       self._spin_rn, time.monotonic_ns())
+        self._seq = (self._seq + 2) & 0xFFFFFFFF
+        SEQ.pack_into(self._mm, SEQ_OFFSET, self._seq)
+
+    def new_round(self):
+        """ラウンド番号を進め、停止フラグを落としてレバー待ちにする"""
+        with self._lock:
+            self._round = (self._round + 1) & 0xFFFFFFFF
+            self._phase = PHASE_IDLE
+            self._stopped = [0] * REEL_COUNT
+            self._publish_locked()
+
+    def set_phase(self, phase):
+        with self._lock:
+            if self._phase == phase:
+                return
+            self._phase = phase
+            self._publish_locked()
+
+    def set_reel_stopped(self, index, stopped=True):
+        with self._lock:
+            v = 1 if stopped else 0
+            if self._stopped[index] == v:
+                return
+            self._stopped[index] = v
+            self._publish_locked()
+
+    def set_spin_rn(self, rn):
+        with self._lock:
+            self._spin_rn = float(rn)
+            self._publish_locked()
+
+    def close(self):
+        with self._lock:
+            self._mm.close()
+
+class StateReader:
+    """
+    サブ基盤側。read() は最新の Snapshot（まだ書かれていなければ None）。
+    ファイルが無い間は REOPEN_INTERVAL 秒ごとにだけ開き直しを試みる。
+    """
+    REOPEN_INTERVAL = 1.0
+
+    def __init__(self, path=STATE_PATH):
+        self.path = path
+        self._mm = None
+        self._next_try = 0.0
+        self._last = None
+        self.retries = 0
+
+    def _try_open(self):
+        now = time.monotonic()
+        if now < self._next_try:
+            return False
+        self._next_try = now + self.REOPEN_INTERVAL
+        try:
+            with open(self.path, "rb") as f:
+                if os.fstat(f.fileno()).st_size < SIZE:
+                    return False
+                self._mm = mmap.mmap(f.fileno(), SIZE, access=mmap.ACCESS_READ)
+        except OSError:
+            return False
+        return True
+
+    def read(self):
+        if self._mm is None and not self._try_open():
+            return None
+        mm = self._mm
+        if HEADER.unpack_from(mm, 0)[:2] != (MAGIC, VERSION):
+            return None
+        for _ in range(READ_RETRIES):
+            s1 = SEQ.unpack_from(mm, SEQ_OFFSET)[0]
+            if s1 & 1:
+                self.retries += 1
+                continue
+            rnd, phase, r1, r2, r3, spin_rn, updated_ns = BODY.unpack_from(mm, BODY_OFFSET)
+            if SEQ.unpack_from(mm, SEQ_OFFSET)[0] == s1:
+                self._last = Snapshot(s1, rnd, phase, (r1, r2, r3), spin_rn, updated_ns)
+                return self._last
+            self.retries += 1
+        return self._last
+
+    def close(self):
+        if self._mm is not None:
+            self._mm.close()
+            self._mm = None
@@ -0,0 +1,174 @@
+"""
+非同期ロガー（GPIO コールバック・リールスレッド・毎フレームの処理から print しない）
+
+print() は stdout（tty・journald のパイプ）が詰まるとその場で止まる。
+GPIO コールバックや ReelStopper の中で止まると、そのまま停止の遅れになる。
+ここでは呼び出し側はスレッドごとのバッファに (時刻, レベル, 書式, 引数) を積むだけで、
+書式化と書き出しは書き出しスレッドが FLUSH_INTERVAL ごとにまとめて行う。
+
+  log = slotlog.get("REEL")
+  log.info("[%s] STOP ON (spin_rn=%s)", name, rn)   # % の書式化は書き出しスレッドで
+
+- レベル：DEBUG < INFO < WARN < ERROR。SLOT_LOG_LEVEL 未満は積まずに捨てる
+    SLOT_LOG_LEVEL=WARN              全体を WARN 以上に
+    SLOT_LOG_LEVEL=INFO,REEL=DEBUG   名前ごとに上書き（既定 INFO）
+- バッファはスレッドごとの deque。積むのはそのスレッドだけ、取り出すのは書き出しスレッドだけ（ロック無し）
+- 満杯（SLOT_LOG_CAPACITY 件、既定 1024）なら新しい記録を捨てて数える。
+  捨てた件数は次の書き出しで「[LOG] <スレッド>: N件欠落」として出す
+- 書き出しスレッドは timebase を通さない（仮想時間でも時刻送りに参加しない）
+- 1回の書き出しの中では時刻順に並べ直す。print() で直接出した行とは前後することがある
+- flush() で溜まっている分をすぐ書く（終了処理でレポートを出す前に呼ぶ）
+- 書き出し先はふだん書き出す時点の sys.stdout。set_output() で固定できる
+  （redirect_stdout は書き出しスレッドの書き出しより先に抜けることがあるので、soak.py・replay.py は固定する）
+"""
+import atexit
+import itertools
+import os
+import sys
+import threading
+from collections import deque
+
+import timebase
+
+DEBUG = 10
+INFO = 20
+WARN = 30
+ERROR = 40
+
+LEVELS = {"DEBUG": DEBUG, "INFO": INFO, "WARN": WARN, "WARNING": WARN, "ERROR": ERROR}
+
+FLUSH_INTERVAL = 0.05
+CAPACITY = int(os.environ.get("SLOT_LOG_CAPACITY", "1024"))
+
+def _parse_levels(spec):
+    """"INFO,REEL=DEBUG" -> (既定レベル, {名前: レベル})"""
+    default, per_name = INFO, {}
+    for part in (p.strip() for p in spec.split(",")):
+        if not part:
+            continue
+        name, _, level = part.rpartition("=")
+        if level.upper() not in LEVELS:
+            raise ValueError(f"SLOT_LOG_LEVEL が不正: {spec}")
+        if name:
+            per_name[name.strip()] = LEVELS[level.upper()]
+        else:
+            default = LEVELS[level.upper()]
+    return default, per_name
+
+_default_level, _name_levels = _parse_levels(os.environ.get("SLOT_LOG_LEVEL", ""))
+
+# ===================== スレッドごとのバッファ =====================
+class _Buffer:
+    __slots__ = ("thread", "records", "dropped", "reported")
+
+    def __init__(self, thread):
+        self.thread = thread
+        self.records = deque()
+        self.dropped = 0       # 積むスレッドだけが増やす
+        self.reported = 0      # 書き出しスレッドだけが進める
+
+_local = threading.local()
+_buffers = []
+_buffers_lock = threading.Lock()   # バッファの登録・削除だけ（記録のたびには取らない）
+_seq = itertools.count()           # 同じ時刻の記録の順番
+
+def _buffer():
+    buf = getattr(_local, "buffer", None)
+    if buf is None:
+        buf = _Buffer(threading.current_thread())
+        _local.buffer = buf
+        with _buffers_lock:
+            _buffers.append(buf)
+    return buf
+
+class Logger:
+    def __init__(self, name, level):
+        self.name = name
+        self.level = level
+
+    def enabled(self, level):
+        return level >= self.level
+
+    def _log(self, level, msg, args):
+        if level < self.level:
+            return
+        buf = _buffer()
+        if len(buf.records) >= CAPACITY:
+            buf.dropped += 1
+            return
+        buf.records.append((timebase.perf_counter_ns(), next(_seq), msg, args))
+
+    def debug(self, msg, *args):
+        self._log(DEBUG, msg, args)
+
+    def info(self, msg, *args):
+        self._log(INFO, msg, args)
+
+    def warn(self, msg, *args):
+        self._log(WARN, msg, args)
+
+    def error(self, msg, *args):
+        self._log(ERROR, msg, args)
+
+_loggers = {}
+
+def get(name):
+    """名前ごとのロガー（レベルは SLOT_LOG_LEVEL から）"""
+    logger = _loggers.get(name)
+    if logger is None:
+        logger = _loggers.setdefault(name, Logger(name, _name_levels.get(name, _default_level)))
+    return logger
+
+# ===================== 書き出し =====================
+_flush_lock = threading.Lock()
+_output = None   # None なら書き出す時点の sys.stdout
+
+def set_output(stream):
+    """書き出し先を固定する（None で sys.stdout に戻す）。溜まっている分は元の書き出し先へ出してから切り替える"""
+    global _output
+    flush()
+    with _flush_lock:
+        _output = stream
+
+def _format(msg, args):
+    try:
+        return msg % args if args else msg
+    except Exception as e:
+        return f"[LOG] 書式エラー: {msg!r} {args!r}: {e}"
+
+def flush():
+    """溜まっている記録を時刻順に書き出す"""
+    with _flush_lock:
+        with _buffers_lock:
+            buffers = list(_buffers)
+        records, lines = [], []
+        for buf in buffers:
+            for _ in range(len(buf.records)):
+                records.append(buf.records.popleft())
+            dropped = buf.dropped
+            if dropped != buf.reported:
+                lines.append(f"[LOG] {buf.thread.name}: {dropped - buf.reported}件欠落（バッファ満杯）")
+                buf.reported = dropped
+            if not buf.records and not buf.thread.is_alive():
+                with _buffers_lock:
+                    _buffers.remove(buf)
+        records.sort(key=lambda r: (r[0], r[1]))
+        lines[:0] = [_format(msg, args) for _, _, msg, args in records]
+        if lines:
+            out = _output if _output is not None else sys.stdout
+            out.write("\n".join(lines) + "\n")
+            out.flush()
+
+def _flush_loop():
+    # 実時間で回す（timebase の参加スレッドにしない）
+    while True:
+        _wake.wait(FLUSH_INTERVAL)
+        _wake.clear()
+        try:
+            flush()
+        except Exception:
+            pass
+
+_wake = threading.Event()
+threading.Thread(target=_flush_loop, name="slotlog", daemon=True).start()
+atexit.register(flush)
@@ -0,0 +1,124 @@
+"""
+仮想時間で main_motor.py のラウンドを回し続ける耐久テスト（実機・サブ基盤不要）
+
+  python soak.py                    # 1000ラウンド
+  python soak.py -n 10000 --seed 1  # 再現したいときはシードを固定
+  python soak.py -n 200 --verbose   # main_motor.py の表示もそのまま出す
+
+シミュレータ（SLOT_BACKEND=sim）と自動プレイヤー（SLOT_SIM_AUTOPLAY=1）を使い、
+timebase.VirtualClock を入れてから main_motor.py を読み込む。sleep・演出シーケンス・
+センサー待ちはすべて仮想時間で進むので、1ラウンド数十秒の処理が実時間では一瞬で終わる。
+サブ基盤への送信は FIFO の代わりに protocol.Decoder で読み戻し、種別ごとに数える。
+当たりのラウンドは、終わったときに3リールとも7（センサー上）に止まっているかも確かめる。
+
+時刻が実時間で --stall 秒進まなければ（timebase を通らない待ちで止まっている等）
+全スレッドのスタックを出して終了する。
+"""
+import argparse
+import contextlib
+import faulthandler
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+
+import timebase
+
+class LoopbackFifo:
+    """rendezvous.FifoWriter の代わり：送ったフレームをその場でデコードして数える"""
+    def __init__(self):
+        import protocol
+        self.decoder = protocol.Decoder()
+        self.kinds = Counter()
+        self.outcomes = Counter()
+
+    def send(self, data):
+        for message in self.decoder.feed(data):
+            self.kinds[message.kind] += 1
+            if message.kind == "outcome":
+                self.outcomes[message.value] += 1
+
+    def close(self):
+        pass
+
+def _watchdog(clock, stall, stop):
+    """仮想時刻が進まなくなったらスタックを出して終了する（実時間で動く。参加スレッドではない）"""
+    last = clock.monotonic_ns()
+    while not stop.wait(stall):
+        now = clock.monotonic_ns()
+        if now == last:
+            sys.__stderr__.write(f"[SOAK] 仮想時刻が {stall} 秒進まない（{now / 1e9:.3f} s）\n")
+            faulthandler.dump_traceback(file=sys.__stderr__)
+            os._exit(2)
+        last = now
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="仮想時間で main_motor.py を回す耐久テスト")
+    parser.add_argument("-n", "--rounds", type=int, default=1000, help="ラウンド数")
+    parser.add_argument("--seed", type=int, default=None, help="抽選・自動プレイヤーの乱数シード")
+    parser.add_argument("--rpm", type=float, default=200.0, help="シミュレータのリール回転数")
+    parser.add_argument("--stall", type=float, default=10.0, help="仮想時刻が止まったとみなす実時間（秒）")
+    parser.add_argument("--verbose", action="store_true", help="main_motor.py の表示を出す")
+    args = parser.parse_args(argv)
+
+    os.environ["SLOT_BACKEND"] = "sim"
+    os.environ["SLOT_SIM_AUTOPLAY"] = "1"
+    os.environ["SLOT_SIM_RPM"] = str(args.rpm)
+    os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+    # 実機の共有メモリを上書きしないように一時ファイルへ
+    os.environ["SLOT_STATE_PATH"] = os.path.join(tempfile.mkdtemp(prefix="soak-"), "state")
+    if args.seed is not None:
+        random.seed(args.seed)
+
+    clock = timebase.install(timebase.VirtualClock())
+    stop = threading.Event()
+    threading.Thread(target=_watchdog, args=(clock, args.stall, stop), daemon=True).start()
+
+    out = sys.stdout if args.verbose else open(os.devnull, "w")
+    fifo = LoopbackFifo()
+    # 当たりのラウンドは、終わったときに3リールとも7（センサー上）で止まっていること
+    off_seven = Counter()
+
+    def check_round(outcome):
+        if not outcome.win:
+            return
+        for reel in (main_motor.reel1, main_motor.reel2, main_motor.reel3):
+            if main_motor.backend.gpio.input(reel.sensor_pin) != 1:
+                off_seven[reel.name] += 1
+
+    t0 = time.perf_counter()
+    # 溜まったログが redirect の後に書き出されないよう、書き出し先も固定する
+    import slotlog
+    slotlog.set_output(out)
+    with contextlib.redirect_stdout(out):
+        import main_motor
+        main_motor.set_fifo_global(fifo)
+        main_motor.loop(fifo, rounds=args.rounds, after_round=check_round)
+        slotlog.flush()
+    elapsed = time.perf_counter() - t0
+    stop.set()
+
+    virtual = clock.monotonic()
+    print(f"--- soak: {args.rounds} ラウンド / 仮想 {virtual / 3600:.2f} 時間 / 実時間 {elapsed:.1f} 秒"
+          f"（{args.rounds / elapsed * 60:.0f} ラウンド/分, {virtual / elapsed:.0f} 倍速, 時刻送り {clock.advances} 回） ---")
+    print("送信: " + " / ".join(f"{k} {v}" for k, v in sorted(fifo.kinds.items())))
+    import outcomes
+    print("結果: " + " / ".join(f"{outcomes.by_id(i).name} {v}" for i, v in sorted(fifo.outcomes.items())))
+    print(f"IPC 欠番 {fifo.decoder.lost} / 重複 {fifo.decoder.duplicated} / 破損 {fifo.decoder.corrupt}")
+    wins = sum(v for i, v in fifo.outcomes.items() if outcomes.by_id(i).win)
+    problems = []
+    if fifo.kinds["outcome"] != args.rounds:
+        problems.append(f"outcome 送信 {fifo.kinds['outcome']} ≠ ラウンド数 {args.rounds}")
+    if fifo.kinds["bonus"] != wins:
+        problems.append(f"bonus 送信 {fifo.kinds['bonus']} ≠ 当たり {wins}")
+    for name, n in sorted(off_seven.items()):
+        problems.append(f"{name} 当たりなのに7で止まっていない {n} 回")
+    for p in problems:
+        print("[SOAK] " + p)
+    return 1 if problems else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,11 @@
+"""
+計測レポート用の小さな統計（stop_trace・IPC・I2C・効果音・replay で共通）
+"""
+import math
+
+def percentile(sorted_values, p):
+    """最近傍順位法のパーセンタイル（sorted_values は昇順）"""
+    if not sorted_values:
+        return None
+    k = max(0, min(len(sorted_values) - 1, math.ceil(p / 100.0 * len(sorted_values)) - 1))
+    return sorted_values[k]
@@ -0,0 +1,133 @@
+"""
+STOP遅延トレース（ボタン押下 → サーボ停止）
+
+各段階を timebase.perf_counter_ns() で打刻し、リールごとのリングバッファに保存する。
+  BUTTON  : STOPボタン立ち下がりのコールバック（_btn_callback_factory）
+  REQUEST : request_stop() で受付
+  WAKE    : リールスレッドが停止処理を開始
+  SENSOR  : センサー反応
+  HALT    : servo.throttle = STOP_SPEED の書き込み完了
+
+report() でリール別・分岐別（slip7=7まで滑る / lose=はずれ滑り / predict=はずれ推定停止 /
+seven_early=7の手前で停止）の p50/p95/p99 を出す。
+SLOT_TRACE=1 のときだけ有効。無効時は mark() が即 return するだけ。
+"""
+import os
+import threading
+from array import array
+
+import timebase
+from stats import percentile
+
+STAGE_BUTTON = 0
+STAGE_REQUEST = 1
+STAGE_WAKE = 2
+STAGE_SENSOR = 3
+STAGE_HALT = 4
+N_STAGES = 5
+
+STAGE_NAMES = ("button", "request", "wake", "sensor", "halt")
+
+BRANCH_SLIP7 = 0
+BRANCH_LOSE = 1
+BRANCH_PREDICT = 2   # はずれ：センサーを待たず推定位置で停止
+BRANCH_SEVEN_EARLY = 3   # あたり：惰性の分だけ7の手前で停止
+BRANCH_NAMES = ("slip7", "lose", "predict", "seven_early")
+
+# レポートする区間（開始段階, 終了段階）
+SEGMENTS = (
+    (STAGE_BUTTON, STAGE_REQUEST),
+    (STAGE_REQUEST, STAGE_WAKE),
+    (STAGE_WAKE, STAGE_SENSOR),
+    (STAGE_SENSOR, STAGE_HALT),
+    (STAGE_BUTTON, STAGE_HALT),
+)
+
+class _ReelRing:
+    """1リール分：記録中の打刻 + 確定済み記録のリングバッファ"""
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.pending = array('q', [0]) * N_STAGES
+        self.stamps = array('q', [0]) * (capacity * N_STAGES)
+        self.branches = array('b', [0]) * capacity
+        self.count = 0
+
+    def commit(self, branch):
+        i = self.count % self.capacity
+        base = i * N_STAGES
+        for s in range(N_STAGES):
+            self.stamps[base + s] = self.pending[s]
+            self.pending[s] = 0
+        self.branches[i] = branch
+        self.count += 1
+
+    def records(self):
+        n = min(self.count, self.capacity)
+        for i in range(n):
+            base = i * N_STAGES
+            yield self.branches[i], self.stamps[base:base + N_STAGES]
+
+class StopTracer:
+    def __init__(self, reel_names, capacity=512, enabled=True):
+        self.enabled = enabled
+        self._rings = {name: _ReelRing(capacity) for name in reel_names}
+        self._lock = threading.Lock()
+
+    def mark(self, reel, stage, t_ns=None, first=False):
+        """first=True なら、この停止でまだ打刻していないときだけ打つ（ボタンの連打で上書きしない）"""
+        if not self.enabled:
+            return
+        pending = self._rings[reel].pending
+        if first and pending[stage]:
+            return
+        pending[stage] = timebase.perf_counter_ns() if t_ns is None else t_ns
+
+    def clear(self, reel):
+        """記録中の打刻を捨てる（回転開始のたびに呼ぶ）"""
+        if not self.enabled:
+            return
+        pending = self._rings[reel].pending
+        for s in range(N_STAGES):
+            pending[s] = 0
+
+    def commit(self, reel, branch):
+        """1回の停止が終わったら記録を確定する"""
+        if not self.enabled:
+            return
+        with self._lock:
+            self._rings[reel].commit(branch)
+
+    def latencies(self, reel=None, branch=None):
+        """{(開始, 終了): [ns, ...]} を返す（打刻が欠けた区間は除外）"""
+        out = {seg: [] for seg in SEGMENTS}
+        with self._lock:
+            rings = [self._rings[reel]] if reel is not None else list(self._rings.values())
+            recs = [(b, list(st)) for ring in rings for b, st in ring.records()]
+        for b, st in recs:
+            if branch is not None and b != branch:
+                continue
+            for a, z in SEGMENTS:
+                if st[a] and st[z] and st[z] >= st[a]:
+                    out[(a, z)].append(st[z] - st[a])
+        return out
+
+    def report(self):
+        lines = ["--- STOP遅延レポート（ms: p50 / p95 / p99, n） ---"]
+        for reel in self._rings:
+            for branch, bname in enumerate(BRANCH_NAMES):
+                lat = self.latencies(reel, branch)
+                n = max(len(v) for v in lat.values())
+                if n == 0:
+                    continue
+                lines.append(f"[{reel}] {bname}")
+                for (a, z), vals in lat.items():
+                    if not vals:
+                        continue
+                    vals.sort()
+                    p50, p95, p99 = (percentile(vals, p) / 1e6 for p in (50, 95, 99))
+                    lines.append(f"  {STAGE_NAMES[a]:>7} -> {STAGE_NAMES[z]:<7} "
+                                 f"{p50:9.3f} / {p95:9.3f} / {p99:9.3f}  (n={len(vals)})")
+        return "\n".join(lines)
+
+def from_env(reel_names):
+    return StopTracer(reel_names, enabled=os.environ.get("SLOT_TRACE") == "1")
@@ -1,4 +1,6 @@
-import cv2
+import time
+BOOT_T0 = time.perf_counter()   # 起動時間計測の基準（重い import より前）
+
 import pygame
 import random
 import sys
@@ -6,40 +8,121 @@ import os
 from datetime import datetime
 
 import threading
-import queue
-import time
 
-# ===== Raspberry Pi GPIO =====
+import audio
+import dispatcher
+import hal
+import io_trace
+import outcomes
+import preload
+import protocol
+import rendezvous
+import shared_state
+import slotlog
+import video
+
+# ===== GPIO（実機 / シミュレータ） =====
 GPIO_AVAILABLE = False
+backend = None
 try:
-    import RPi.GPIO as GPIO
+    backend = hal.get_backend()
+    # SLOT_IO_TRACE=<ディレクトリ> なら PUSHボタン・LED の入出力を記録する（python replay.py で再生）
+    io_trace.from_env("sub")
+    GPIO = io_trace.wrap_gpio(backend.gpio)
     GPIO_AVAILABLE = True
 except Exception as e:
     print(f"[GPIO] RPi.GPIO が使えません（Raspberry Pi以外等）: {e}")
     GPIO_AVAILABLE = False
 
+# ===================== ログ =====================
+# 受信スレッド・フレームごとの処理からは print せずに slotlog へ積む（書き出しは別スレッド）
+log = slotlog.get("SUB")
+
 # ===================== メッセージ受信 =====================
-msg_queue = queue.Queue()
+# 受信があったことをメインループ（pygame.event.wait）に知らせるイベント
+MSG_EVENT = pygame.USEREVENT + 1
+
+# 待ち関数で眠る最大時間（この周期でウィンドウのイベントだけ処理する）
+WAIT_PUMP_INTERVAL = 0.1
+
+# 待機中のメインループが何も無くても起きる周期（ms）
+IDLE_WAKE_MS = 1000
 
 # "bonus" はイベントで扱う（freeze保持解除・通常の当たり待ち両対応）
 bonus_event = threading.Event()
 
 def receiver_thread(fifo_path):
     """裏でひたすら受信してQueueに入れる係（bonusはイベントだけにする）"""
-    with open(fifo_path, 'r') as fifo:
-        for line in fifo:
-            msg = line.strip()
-            if msg == "bonus":
-                bonus_event.set()
-                continue  # ★bonusはQueueに入れない（取りこぼし/食い合い防止）
-            msg_queue.put(msg)
-
-def is_float(s):
+    while True:
+        # メイン基盤が落ちても、FIFOができ直す/開かれるのを待って再接続する
+        rendezvous.wait_for_path(fifo_path)
+        fd = os.open(fifo_path, os.O_RDONLY)
+        decoder.reset()
+        try:
+            while True:
+                data = os.read(fd, 4096)
+                if not data:
+                    break
+                for msg in decoder.feed(data):
+                    if msg.kind == "start":
+                        # FIFO のパスは残っているので、開けただけでは接続とは言えない。"start" で確定
+                        log.info("[FIFO] メイン基盤接続完了")
+                    if msg.kind == "bonus":
+                        bonus_event.set()
+                        continue  # ★bonusはQueueに入れない（取りこぼし/食い合い防止）
+                    messages.put(msg)
+        finally:
+            os.close(fd)
+        log.warn("[FIFO] メイン基盤切断：再接続待ち")
+
+def _post_wakeup():
+    # 中身は messages 側にある。ここではメインループを起こすだけ
     try:
-        float(s)
-        return True
-    except ValueError:
-        return False
+        pygame.event.post(pygame.event.Event(MSG_EVENT))
+    except pygame.error:
+        pass
+
+decoder = protocol.Decoder()
+messages = dispatcher.MessageDispatcher(kind=lambda m: m.kind, on_put=_post_wakeup)
+
+# ===================== 共有メモリ（メイン基盤のリール・ラウンド状態） =====================
+# 回転中のメインループが状態を見に起きる周期（ms）
+STATE_POLL_MS = 33
+
+reel_state = shared_state.StateReader()
+
+class ReelStateWatcher:
+    """共有メモリを読んで、前回から変わった所（リール停止・フェーズ）だけ拾う"""
+    def __init__(self, reader):
+        self.reader = reader
+        self.last = None
+
+    def poll(self):
+        snap = self.reader.read()
+        if snap is None or (self.last is not None and snap.seq == self.last.seq):
+            return snap
+        prev = self.last
+        self.last = snap
+        if prev is None or prev.round != snap.round:
+            return snap
+        if prev.phase != snap.phase:
+            self.on_phase(snap)
+        for i, (was, now) in enumerate(zip(prev.stopped, snap.stopped)):
+            if now and not was:
+                self.on_reel_stop(i, snap)
+        return snap
+
+    def on_phase(self, snap):
+        log.info("[STATE] R%s フェーズ: %s", snap.round, snap.phase_name)
+
+    def on_reel_stop(self, index, snap):
+        log.info("[STATE] R%s 第%dリール停止（spin_rn=%s）", snap.round, index + 1, snap.spin_rn)
+
+    @property
+    def spinning(self):
+        return self.last is not None and self.last.phase in (shared_state.PHASE_SPIN, shared_state.PHASE_FREEZE)
+
+reel_watcher = ReelStateWatcher(reel_state)
 
 # ===================== 設定 =====================
 SCREEN_WIDTH = 1280
@@ -70,12 +153,15 @@ LED_PIN = 18          # ★追加：BCM 18（PUSHボタンLED）
 STATE_IDLE = 0
 STATE_WIN = 1
 
+# デコード済みフレームキャッシュ（上限MB・起動時に先読みするか）
+FRAME_CACHE_BUDGET_MB = int(os.environ.get("SLOT_FRAME_CACHE_MB", "256"))
+FRAME_CACHE_PRELOAD = True
+VIDEO_PREFETCH = True   # キャッシュに載らない動画は別スレッドで先読みデコード（False: 同期デコード）
+
 # ===================== Pygame初期化 =====================
+# メイン基盤と同じミキサー設定（バッファ 512）にする
+audio.pre_init()
 pygame.init()
-try:
-    pygame.mixer.init()
-except pygame.error as e:
-    print(f"mixer initエラー: {e}")
 
 # ===================== GPIO初期化 =====================
 def gpio_init():
@@ -86,11 +172,15 @@ def gpio_init():
     # 事前プルアップ前提でも、念のためPUD_UP指定（問題になりにくい）
     GPIO.setup(GPIO_PIN_BUTTON, GPIO.IN, pull_up_down=GPIO.PUD_UP)
     print(f"[GPIO] BCM{GPIO_PIN_BUTTON} を入力(PUD_UP)で初期化")
+    io_trace.watch(GPIO, GPIO_PIN_BUTTON)
 
     # ★追加：LEDピンを出力にして初期消灯
     GPIO.setup(LED_PIN, GPIO.OUT, initial=GPIO.LOW)
     print(f"[GPIO] BCM{LED_PIN} を出力で初期化（LED消灯）")
 
+    if backend.simulated and os.environ.get("SLOT_SIM_AUTOPLAY") == "1":
+        backend.start_autoplay(push_pin=GPIO_PIN_BUTTON)
+
 def gpio_cleanup():
     if GPIO_AVAILABLE:
         # ★追加：終了時に必ず消灯
@@ -99,70 +189,63 @@ def gpio_cleanup():
         except Exception:
             pass
         GPIO.cleanup()
+        io_trace.close()
 
 # ===================== FIFO =====================
 fifo_path = '/tmp/notify_pipe'
-print("[FIFO] メイン基盤待機中...")
-while not os.path.exists(fifo_path):
-    pass
-print("[FIFO] メイン基盤接続完了")
-
-# ===================== 効果音ロード =====================
-se_win = None
-se_start = None
-se_stop = None
-se_pokyun = None
-se_freeze = None
 
-try:
-    se_win = pygame.mixer.Sound(SE_WIN_PATH)
-    se_start = pygame.mixer.Sound(SE_START_PATH)
-    se_stop = pygame.mixer.Sound(SE_STOP_PATH)
-    se_pokyun = pygame.mixer.Sound(SE_POKYUN_PATH)
-    se_freeze = pygame.mixer.Sound(FREEZE_SE_PATH)
-except (FileNotFoundError, pygame.error) as e:
-    print(f"効果音エラー: {e}")
+# ===================== 効果音・BGM =====================
+# 全部デコード済みでメモリに置く。演出の種類ごとにチャンネルを予約（お互いに奪わない）
+sound = audio.AudioEngine({"se": 2, "notice": 1, "freeze": 1, "bgm": 1})
+
+SOUND_ASSETS = [
+    # (名前, パス, グループ, 読めなければストリーム再生)
+    ("win", SE_WIN_PATH, "se", False),
+    ("start", SE_START_PATH, "se", False),
+    ("stop", SE_STOP_PATH, "se", False),
+    ("pokyun", SE_POKYUN_PATH, "notice", False),
+    ("freeze", FREEZE_SE_PATH, "freeze", False),
+    ("big_bgm", AUDIO_PATH, "bgm", True),
+    ("freeze_bgm", FREEZE_BGM_PATH, "bgm", True),
+]
+
+# ===================== フレームキャッシュ =====================
+frame_cache = video.FrameCache((SCREEN_WIDTH, SCREEN_HEIGHT), FRAME_CACHE_BUDGET_MB * 1024 * 1024)
 
 # ===================== ムービー再生 =====================
 def play_movie(screen, clock):
-    try:
-        pygame.mixer.music.load(AUDIO_PATH)
-    except pygame.error:
-        print("動画用音声が見つかりません")
+    if not sound.has("big_bgm"):
+        log.warn("動画用音声が見つかりません")
 
-    cap = cv2.VideoCapture(VIDEO_PATH)
-    if not cap.isOpened():
-        print("動画が開けません:", VIDEO_PATH)
+    src = video.open_source(VIDEO_PATH, (SCREEN_WIDTH, SCREEN_HEIGHT), frame_cache, prefetch=VIDEO_PREFETCH)
+    if src is None:
+        log.error("動画が開けません: %s", VIDEO_PATH)
         return
 
-    video_fps = cap.get(cv2.CAP_PROP_FPS)
-    if not video_fps or video_fps <= 1:
-        video_fps = 30
+    video_fps = src.fps
 
-    pygame.mixer.music.play()
+    sound.play("big_bgm")
     playing = True
 
     while playing:
         for event in pygame.event.get():
             if event.type == pygame.QUIT:
-                cap.release()
+                src.release()
                 pygame.quit()
                 gpio_cleanup()
                 sys.exit()
 
-        ret, frame = cap.read()
-        if ret:
-            frame = cv2.resize(frame, (SCREEN_WIDTH, SCREEN_HEIGHT))
-            frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-            surf = pygame.image.frombuffer(frame.tobytes(), (SCREEN_WIDTH, SCREEN_HEIGHT), 'RGB')
+        surf = src.next_surface()
+        if surf is not None:
             screen.blit(surf, (0, 0))
             pygame.display.update()
             clock.tick(video_fps)
         else:
             playing = False
 
-    pygame.mixer.music.stop()
-    cap.release()
+    sound.stop("big_bgm")
+    src.release()
+    video.print_stats(src, VIDEO_PATH)
     screen.fill((0, 0, 0))
     pygame.display.update()
 
@@ -170,30 +253,25 @@ def freeze_movie(screen, clock):
     """
     freeze_movie.mp4 を再生。
     - 再生開始と同時に freeze_se.wav
-    - 再生3秒後に freeze_bgm.wav（pygame.mixer.music）を再生（ループ）
+    - 再生3秒後に freeze_bgm.wav を再生
     - 再生終了後、最終フレームで保持し、bonus_event が立つまで待つ
     - bonus_event が立ったらBGM停止して復帰
     """
-    cap = cv2.VideoCapture(FREEZE_VIDEO_PATH)
-    if not cap.isOpened():
-        print("freeze動画が開けません:", FREEZE_VIDEO_PATH)
+    src = video.open_source(FREEZE_VIDEO_PATH, (SCREEN_WIDTH, SCREEN_HEIGHT), frame_cache, prefetch=VIDEO_PREFETCH)
+    if src is None:
+        log.error("freeze動画が開けません: %s", FREEZE_VIDEO_PATH)
         return
 
-    video_fps = cap.get(cv2.CAP_PROP_FPS)
-    if not video_fps or video_fps <= 1:
-        video_fps = 30
+    video_fps = src.fps
 
     # 再生開始と同時にSE
-    if se_freeze:
-        se_freeze.play()
+    sound.play("freeze")
 
     # 3秒後にBGM
     bgm_started = False
     start_time = time.time()
-    try:
-        pygame.mixer.music.load(FREEZE_BGM_PATH)
-    except pygame.error as e:
-        print(f"freeze BGMロード失敗: {e}")
+    if not sound.has("freeze_bgm"):
+        log.warn("freeze BGMロード失敗")
         bgm_started = True  # 再生不能なら試行しない
 
     last_surface = None
@@ -202,47 +280,44 @@ def freeze_movie(screen, clock):
     while playing:
         for event in pygame.event.get():
             if event.type == pygame.QUIT:
-                cap.release()
+                src.release()
                 pygame.quit()
                 gpio_cleanup()
                 sys.exit()
 
         if (not bgm_started) and (time.time() - start_time >= 3.0):
-            try:
-                pygame.mixer.music.play()  # ループせずに
-            except pygame.error as e:
-                print(f"freeze BGM再生失敗: {e}")
+            sound.play("freeze_bgm")  # ループせずに
             bgm_started = True
 
-        ret, frame = cap.read()
-        if ret:
-            frame = cv2.resize(frame, (SCREEN_WIDTH, SCREEN_HEIGHT))
-            frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-            last_surface = pygame.image.frombuffer(frame.tobytes(), (SCREEN_WIDTH, SCREEN_HEIGHT), 'RGB')
+        surf = src.next_surface()
+        if surf is not None:
+            last_surface = surf
             screen.blit(last_surface, (0, 0))
             pygame.display.update()
             clock.tick(video_fps)
         else:
             playing = False
 
-    cap.release()
+    src.release()
+    video.print_stats(src, FREEZE_VIDEO_PATH)
 
     # 最終フレームで保持（bonusが来るまで）
     if last_surface is not None:
         screen.blit(last_surface, (0, 0))
         pygame.display.update()
 
-    print("[FREEZE] 最終フレーム保持：bonus待ち...")
-    while not bonus_event.is_set():
+    log.info("[FREEZE] 最終フレーム保持：bonus待ち...")
+    # bonus_event で眠って待ち、WAIT_PUMP_INTERVAL ごとにウィンドウのイベントだけ処理する
+    while not bonus_event.wait(WAIT_PUMP_INTERVAL):
         for event in pygame.event.get():
             if event.type == pygame.QUIT:
                 pygame.quit()
                 gpio_cleanup()
                 sys.exit()
-        time.sleep(0.01)
+        reel_watcher.poll()
 
-    pygame.mixer.music.stop()
-    print("[FREEZE] bonus受信：freeze_movie終了")
+    sound.stop("freeze_bgm")
+    log.info("[FREEZE] bonus受信：freeze_movie終了")
     return
 
 def button_loop_movie_until_gpio_high(screen, clock):
@@ -251,30 +326,33 @@ def button_loop_movie_until_gpio_high(screen, clock):
     - 再生中はLED_PIN(BCM18)を点灯
     - 終了時にLEDを消灯
     """
+    io_trace.mark(io_trace.MARK_BUTTON_BEGIN)
+
     # ★追加：演出開始でLED点灯
     if GPIO_AVAILABLE:
         try:
             GPIO.output(LED_PIN, GPIO.HIGH)
-            print("[LED] ON (BCM18 HIGH)")
+            log.info("[LED] ON (BCM18 HIGH)")
         except Exception as e:
-            print(f"[LED] ON失敗: {e}")
+            log.error("[LED] ON失敗: %s", e)
 
-    cap = cv2.VideoCapture(BUTTON_VIDEO_PATH)
-    if not cap.isOpened():
-        print("button動画が開けません:", BUTTON_VIDEO_PATH)
+    src = video.open_source(BUTTON_VIDEO_PATH, (SCREEN_WIDTH, SCREEN_HEIGHT), frame_cache,
+                             prefetch=VIDEO_PREFETCH, loop=True)
+    if src is None:
+        log.error("button動画が開けません: %s", BUTTON_VIDEO_PATH)
         # ★失敗時も消灯
         if GPIO_AVAILABLE:
             try:
                 GPIO.output(LED_PIN, GPIO.LOW)
-                print("[LED] OFF (BCM18 LOW)")
+                log.info("[LED] OFF (BCM18 LOW)")
             except Exception:
                 pass
+        io_trace.mark(io_trace.MARK_BUTTON_END, 0)
         return False
 
+    confirmed = False
     try:
-        video_fps = cap.get(cv2.CAP_PROP_FPS)
-        if not video_fps or video_fps <= 1:
-            video_fps = 30
+        video_fps = src.fps
 
         # 起動直後からHIGHだと即終了しちゃうので、最初の状態を見て「LOW→HIGH」を優先
         initial_high = False
@@ -282,18 +360,17 @@ def button_loop_movie_until_gpio_high(screen, clock):
             try:
                 initial_high = (GPIO.input(GPIO_PIN_BUTTON) == GPIO.HIGH)
             except Exception as e:
-                print(f"[GPIO] 読み取り失敗: {e}")
+                log.error("[GPIO] 読み取り失敗: %s", e)
                 initial_high = False
 
-        print(f"[BUTTON] ループ再生開始（initial_high={initial_high}）")
+        log.info("[BUTTON] ループ再生開始（initial_high=%s）", initial_high)
 
-        confirmed = False
         waiting_for_rise = initial_high  # 初期がHIGHなら、一度LOWになるまで上昇扱いしない
 
         while True:
             for event in pygame.event.get():
                 if event.type == pygame.QUIT:
-                    cap.release()
+                    src.release()
                     pygame.quit()
                     gpio_cleanup()
                     sys.exit()
@@ -312,17 +389,14 @@ def button_loop_movie_until_gpio_high(screen, clock):
                             confirmed = True
                             break
                 except Exception as e:
-                    print(f"[GPIO] 読み取り失敗: {e}")
+                    log.error("[GPIO] 読み取り失敗: %s", e)
 
-            ret, frame = cap.read()
-            if not ret:
+            surf = src.next_surface()
+            if surf is None:
                 # ループ：先頭へ
-                cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+                src.rewind()
                 continue
 
-            frame = cv2.resize(frame, (SCREEN_WIDTH, SCREEN_HEIGHT))
-            frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-            surf = pygame.image.frombuffer(frame.tobytes(), (SCREEN_WIDTH, SCREEN_HEIGHT), 'RGB')
             screen.blit(surf, (0, 0))
             pygame.display.update()
             clock.tick(video_fps)
@@ -331,9 +405,9 @@ def button_loop_movie_until_gpio_high(screen, clock):
         pygame.display.update()
 
         if confirmed:
-            print("[BUTTON] GPIO HIGH 検出：確定")
+            log.info("[BUTTON] GPIO HIGH 検出：確定")
         else:
-            print("[BUTTON] 終了（未確定）")
+            log.info("[BUTTON] 終了（未確定）")
 
         return confirmed
 
@@ -342,189 +416,251 @@ def button_loop_movie_until_gpio_high(screen, clock):
         if GPIO_AVAILABLE:
             try:
                 GPIO.output(LED_PIN, GPIO.LOW)
-                print("[LED] OFF (BCM18 LOW)")
+                log.info("[LED] OFF (BCM18 LOW)")
             except Exception as e:
-                print(f"[LED] OFF失敗: {e}")
-        cap.release()
+                log.error("[LED] OFF失敗: %s", e)
+        src.release()
+        io_trace.mark(io_trace.MARK_BUTTON_END, 1 if confirmed else 0)
 
 # ===================== FIFO待ちユーティリティ =====================
-def wait_first_stop():
+def _wait_message(kind):
+    # 眠って待つ。ただし周期的に pygame のイベント処理だけは回す（無応答にしない）
     while True:
-        if not msg_queue.empty():
-            try:
-                message = msg_queue.get_nowait()
-                if message == "first_stop":
-                    print("[FIFO] 受信: 第一停止")
-                    return
-            except queue.Empty:
-                pass
+        message = messages.wait_for(kind, timeout=WAIT_PUMP_INTERVAL)
+        if message is not None:
+            return message
+        pygame.event.pump()
+        reel_watcher.poll()
+
+def wait_first_stop():
+    _wait_message("first_stop")
+    log.info("[FIFO] 受信: 第一停止")
 
 def wait_lose():
-    while True:
-        if not msg_queue.empty():
-            try:
-                message = msg_queue.get_nowait()
-                if message == "lose":
-                    print("[FIFO] 受信: ハズレ目停止")
-                    return
-            except queue.Empty:
-                pass
+    _wait_message("lose")
+    log.info("[FIFO] 受信: ハズレ目停止")
 
 # ===================== 当たり演出 =====================
-def winnnig(rn, screen, clock):
+def winnnig(outcome, screen, clock):
     """
-    当たり演出。
+    当たり演出（どの演出かは outcome のフラグで決まる）。
     戻り値:
       True  -> 当たり確定（STATE_WINへ遷移してOK）
       False -> まだ確定してない
     """
-    print("Num: " + str(rn))
+    log.info("Outcome: %s", outcome.describe())
 
-    # ★freeze演出（0.25〜0.30）
-    if 0.25 <= rn < 0.30:
-        print("FREEZE演出")
+    # ★freeze演出
+    if outcome.has(outcomes.FREEZE):
+        log.info("FREEZE演出")
         freeze_movie(screen, clock)
 
         # freeze_movie が bonus_event まで待って戻るので、ここでは待たない
-        if se_win:
-            se_win.play()
+        sound.play("win")
         return True
 
-    # ★新演出（0.30〜0.35）
-    if 0.30 <= rn < 0.35:
-        print("BUTTON演出（button.mp4 ループ → GPIO15 HIGH待ち）")
+    # ★新演出
+    if outcome.has(outcomes.BUTTON):
+        log.info("BUTTON演出（button.mp4 ループ → GPIO15 HIGH待ち）")
         ok = button_loop_movie_until_gpio_high(screen, clock)
         if ok:
-            if se_win:
-                se_win.play()
+            sound.play("win")
             return True
         else:
             # 通常はここに来ない（QUIT等で抜けた場合）
             return False
 
-    # --- 既存の当たり分岐（範囲を整理）---
-    if rn < 0.15:
+    # --- 既存の当たり分岐 ---
+    if outcome.has(outcomes.FIRST_STOP_NOTICE):
         wait_first_stop()
-        if se_win:
-            se_win.play()
+        sound.play("win")
         return True
 
-    elif rn < 0.25:
-        print("後告知")
+    elif outcome.has(outcomes.LOSE_THEN_WIN):
+        log.info("後告知")
         wait_lose()
-        if se_win:
-            se_win.play()
+        sound.play("win")
         return True
 
-    elif rn < 0.50:
-        # 0.35〜0.50 は従来の即告知系としてまとめ（必要なら細分化してOK）
-        print("即告知/通常当たり")
-        if se_win:
-            se_win.play()
+    elif outcome.win:
+        # 残りは即告知系としてまとめ（必要なら outcomes.py で細分化してOK）
+        log.info("即告知/通常当たり")
+        sound.play("win")
         return True
 
     return False
 
-def winnnig_after(rn):
+def winnnig_after(outcome):
     # bonus_event は receiver_thread が立てる
-    print("[FIFO] bonus待機（7停止）...")
-    bonus_event.wait()
-    print("[FIFO] bonus受信（7停止）")
+    log.info("[FIFO] bonus待機（7停止）...")
+    while not bonus_event.wait(WAIT_PUMP_INTERVAL):
+        reel_watcher.poll()
+    log.info("[FIFO] bonus受信（7停止）")
     bonus_event.clear()  # 次ラウンド用にクリア
 
+# ===================== 起動時読み込み =====================
+def _load_image(path):
+    # 読み込みだけプールでやる。画面形式への変換（convert_alpha）は
+    # SDL のスレッド安全の外なので、メインスレッドで loader.wait() の後に行う
+    return pygame.image.load(path)
+
+def start_preload():
+    """画像・効果音・動画インデックスを並行に読み始める（display.set_mode の後に呼ぶ）"""
+    loader = preload.Preloader(BOOT_T0)
+    loader.record("import", BOOT_T0, IMPORT_DONE_T)
+    loader.submit("image:" + IMG_BLACK_PATH, _load_image, IMG_BLACK_PATH)
+    loader.submit("image:" + IMG_LIGHT_PATH, _load_image, IMG_LIGHT_PATH)
+    for name, path, group, stream in SOUND_ASSETS:
+        loader.submit("sound:" + name, sound.load, name, path, group, stream)
+    for path in (FREEZE_VIDEO_PATH, BUTTON_VIDEO_PATH, VIDEO_PATH):
+        loader.submit("video:" + path, video.open_raw, path, (SCREEN_WIDTH, SCREEN_HEIGHT))
+    return loader
+
 # ===================== メイン =====================
 def main():
     gpio_init()
 
+    t0 = time.perf_counter()
     screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT), pygame.NOFRAME)
     pygame.display.set_caption("Bonus Lottery Machine")
     clock = pygame.time.Clock()
 
+    loader = start_preload()
+    loader.record("display", t0)
+
+    # 読み込みと並行してメイン基盤を待つ（つながったかは receiver_thread が "start" で表示する）
+    fifo_t0 = time.perf_counter()
+    print("[FIFO] メイン基盤待機中...")
+
     t = threading.Thread(target=receiver_thread, args=(fifo_path,), daemon=True)
     t.start()
 
-    try:
-        img_black = pygame.image.load(IMG_BLACK_PATH)
-        img_light = pygame.image.load(IMG_LIGHT_PATH)
-    except FileNotFoundError:
+    # 演出動画を裏で先読み（間に合わなければ初回再生時にデコード）
+    if FRAME_CACHE_PRELOAD:
+        threading.Thread(
+            target=frame_cache.preload,
+            args=([FREEZE_VIDEO_PATH, BUTTON_VIDEO_PATH, VIDEO_PATH],),
+            daemon=True,
+        ).start()
+
+    img_black = loader.result("image:" + IMG_BLACK_PATH)
+    img_light = loader.result("image:" + IMG_LIGHT_PATH)
+    loader.wait()
+    if img_black is None or img_light is None:
+        print(loader.report())
         print("画像ファイルが見つかりません")
         return
 
+    # 画面と同じピクセル形式にしておく（blit のたびの変換をなくす）
+    t0 = time.perf_counter()
+    img_black = img_black.convert_alpha()
+    img_light = img_light.convert_alpha()
+    loader.record("image:convert", t0)
+
     rect_black = img_black.get_rect(center=(SCREEN_WIDTH // 2, SCREEN_HEIGHT // 2))
     rect_light = img_light.get_rect(center=(SCREEN_WIDTH // 2, SCREEN_HEIGHT // 2))
 
     current_state = STATE_IDLE
 
     # start待ち
-    while True:
-        if not msg_queue.empty():
-            try:
-                message = msg_queue.get_nowait()
-                if message == "start":
-                    print("[FIFO] 受信: メイン基盤起動")
-                    break
-            except queue.Empty:
-                pass
+    _wait_message("start")
+    print("[FIFO] 受信: メイン基盤起動")
+    loader.record("fifo", fifo_t0)
+    print(loader.report())
+
+    lamp_rect = rect_black.union(rect_light)
+
+    def draw(full):
+        # 変わった所（ランプ部分）だけ描き直して、その矩形だけ転送する
+        if full:
+            screen.fill((0, 0, 0))
+        else:
+            screen.fill((0, 0, 0), lamp_rect)
+        if current_state == STATE_IDLE:
+            screen.blit(img_black, rect_black)
+        else:
+            screen.blit(img_light, rect_light)
+        if full:
+            pygame.display.update()
+        else:
+            pygame.display.update(lamp_rect)
+
+    def handle_message(message):
+        nonlocal outcome, current_state, need_full
+        log.info("[FIFO] 受信: %s", message)
+
+        if message.kind != "outcome":
+            return
+        try:
+            outcome = outcomes.by_id(message.value)
+        except KeyError:
+            log.warn("[FIFO] 不明な結果ID: %s（ハズレ扱い）", message.value)
+            outcome = outcomes.LOSE
+            return
+
+        if outcome.has(outcomes.START_SE):
+            sound.play("start")
+            time.sleep(0.3)
+
+        if outcome.has(outcomes.PREMIUM):
+            sound.play("pokyun")
+            log.info("先バレ告知")
+            time.sleep(0.3)
+
+        if outcome.win:
+            confirmed = winnnig(outcome, screen, clock)
+            # 演出動画が全画面を描いているので次は全体を描き直す
+            need_full = True
+            if confirmed:
+                log.info("当たり！")
+                current_state = STATE_WIN
+            else:
+                log.warn("当たり未確定（想定外）")
+        else:
+            log.info("ハズレ...")
 
-    rn = 1.0
+    outcome = outcomes.LOSE
     running = True
+    need_full = True
+    drawn_state = None
     try:
         while running:
-            for event in pygame.event.get():
-                if event.type == pygame.QUIT:
-                    running = False
-
-            if current_state == STATE_IDLE:
-                if not msg_queue.empty():
-                    try:
-                        message = msg_queue.get_nowait()
-                        print(f"[FIFO] 受信: {message}")
-
-                        if is_float(message):
-                            rn = float(message)
-
-                            if rn >= 0.1:
-                                if se_start:
-                                    se_start.play()
-                                time.sleep(0.3)
-
-                            if rn < 0.05:
-                                if se_pokyun:
-                                    se_pokyun.play()
-                                print("先バレ告知")
-                                time.sleep(0.3)
-
-                            if rn < 0.5:
-                                confirmed = winnnig(rn, screen, clock)
-                                if confirmed:
-                                    print("当たり！")
-                                    current_state = STATE_WIN
-                                else:
-                                    print("当たり未確定（想定外）")
-                            else:
-                                print("ハズレ...")
-
-                    except queue.Empty:
-                        pass
-
-            elif current_state == STATE_WIN:
-                winnnig_after(rn)
+            # 描画（変化があったときだけ）
+            if need_full or drawn_state != current_state:
+                draw(need_full)
+                need_full = False
+                drawn_state = current_state
+
+            if current_state == STATE_WIN:
+                winnnig_after(outcome)
                 play_movie(screen, clock)
                 current_state = STATE_IDLE
+                need_full = True
+                continue
 
-            # 描画（新演出中は動画描画してるので、ここは上書きされる）
-            screen.fill((0, 0, 0))
-            if current_state == STATE_IDLE:
-                screen.blit(img_black, rect_black)
-            else:
-                screen.blit(img_light, rect_light)
+            # 溜まっている受信を先に処理（動画再生中のイベント取得で起床通知が消えていることがある）
+            message = messages.get_nowait()
+            if message is not None:
+                handle_message(message)
+                continue
 
-            pygame.display.update()
-            clock.tick(60)
+            # 何も起きなければここで眠る（受信は MSG_EVENT で起こされる）
+            # 回転中は共有メモリを見るためにフレーム周期で起きる。それ以外のタイムアウトはシグナル（Ctrl+C）用
+            reel_watcher.poll()
+            event = pygame.event.wait(STATE_POLL_MS if reel_watcher.spinning else IDLE_WAKE_MS)
+            if event.type == pygame.QUIT:
+                running = False
 
     finally:
+        # 溜まっているログを先に出してからレポートを print する
+        slotlog.flush()
+        print(messages.latency_report())
+        print(decoder.report())
+        print(sound.latency_report())
         pygame.quit()
         gpio_cleanup()
 
+IMPORT_DONE_T = time.perf_counter()
+
 if __name__ == "__main__":
     main()
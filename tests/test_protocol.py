@@ -0,0 +1,55 @@
+"""protocol.Decoder の連番の追跡（欠番・重複・破損）"""
+import protocol
+
+def _frames(*kinds):
+    enc = protocol.Encoder()
+    return [enc.encode(kind, 3 if kind == "outcome" else None) for kind in kinds]
+
+def test_in_order():
+    dec = protocol.Decoder()
+    frames = _frames("start", "outcome", "first_stop", "bonus")
+    msgs = dec.feed(b"".join(frames))
+    assert [m.kind for m in msgs] == ["start", "outcome", "first_stop", "bonus"]
+    assert [m.seq for m in msgs] == [0, 1, 2, 3]
+    assert msgs[1].value == 3
+    assert (dec.lost, dec.duplicated, dec.corrupt) == (0, 0, 0)
+
+def test_split_frames():
+    dec = protocol.Decoder()
+    data = b"".join(_frames("start", "lose"))
+    msgs = []
+    for i in range(len(data)):
+        msgs += dec.feed(data[i:i + 1])
+    assert [m.kind for m in msgs] == ["start", "lose"]
+
+def test_gap_counts_lost():
+    dec = protocol.Decoder()
+    start, outcome, first_stop, lose = _frames("start", "outcome", "first_stop", "lose")
+    msgs = dec.feed(start + outcome + lose)
+    assert [m.kind for m in msgs] == ["start", "outcome", "lose"]
+    assert dec.lost == 1
+
+def test_reordered_frame_is_dropped_as_duplicate():
+    # 連番を振る順と書く順がずれると、先に振られた方が捨てられる（main_motor は1つのロックで送る）
+    dec = protocol.Decoder()
+    start, first_stop, bonus = _frames("start", "first_stop", "bonus")
+    msgs = dec.feed(start + bonus + first_stop)
+    assert [m.kind for m in msgs] == ["start", "bonus"]
+    assert dec.lost == 1
+    assert dec.duplicated == 1
+
+def test_corrupt_bytes_resync():
+    dec = protocol.Decoder()
+    start, lose = _frames("start", "lose")
+    msgs = dec.feed(b"\x00\xff" + start + b"\x01" + lose)
+    assert [m.kind for m in msgs] == ["start", "lose"]
+    assert dec.corrupt == 3
+    assert dec.lost == 0
+
+def test_start_restarts_sequence():
+    dec = protocol.Decoder()
+    dec.feed(b"".join(_frames("start", "outcome", "lose")))
+    # メイン基盤の再起動：連番が 0 からやり直しても欠番・重複にしない
+    msgs = dec.feed(b"".join(_frames("start", "outcome")))
+    assert [m.kind for m in msgs] == ["start", "outcome"]
+    assert (dec.lost, dec.duplicated) == (0, 0)
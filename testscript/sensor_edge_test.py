@@ -0,0 +1,126 @@
+import RPi.GPIO as GPIO
+import time
+import sys
+import board
+import busio
+from adafruit_pca9685 import PCA9685
+from adafruit_motor.servo import ContinuousServo
+
+# 従来の1msポーリング停止と、センサーエッジ割り込み停止を比較する計測スクリプト
+#   python sensor_edge_test.py [poll|edge] [回数]
+# - 停止誤差: センサー立ち上がり（割り込みで打刻）→ STOP書き込みまでの時間と角度
+# - CPU使用率: 計測中のプロセスCPU時間 / 経過時間
+
+SENSOR_PIN1 = 26
+PCA_CHANNEL = 15  # 第1リール
+
+COUNTER_CLOCKWISE_SPEED = 0.8
+STOP_SPEED = 0.3
+
+EDGE_TIMEOUT = 3.0  # この秒数センサーが来なければその回は止めて集計対象外
+
+def main():
+    mode = sys.argv[1] if len(sys.argv) > 1 else "edge"
+    count = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+
+    GPIO.setmode(GPIO.BCM)
+    GPIO.setup(SENSOR_PIN1, GPIO.IN, pull_up_down=GPIO.PUD_DOWN)
+
+    i2c = busio.I2C(board.SCL, board.SDA)
+    pca = PCA9685(i2c)
+    pca.frequency = 50
+    servo = ContinuousServo(pca.channels[PCA_CHANNEL], min_pulse=700, max_pulse=2300)
+
+    edge_times = []
+    state = {"armed": False, "halt_t": None}
+
+    def on_edge(channel):
+        t = time.perf_counter()
+        edge_times.append(t)
+        if mode == "edge" and state["armed"]:
+            servo.throttle = STOP_SPEED
+            state["halt_t"] = time.perf_counter()
+            state["armed"] = False
+
+    # どちらのモードでもエッジ時刻は割り込みで打刻して基準にする
+    GPIO.add_event_detect(SENSOR_PIN1, GPIO.RISING, callback=on_edge, bouncetime=5)
+
+    errors_ms = []
+    errors_deg = []
+    cpu_ratio = []
+
+    try:
+        for i in range(count):
+            servo.throttle = COUNTER_CLOCKWISE_SPEED
+            time.sleep(1.5)  # 回転が安定するまで
+
+            # 周期（度換算用）
+            if len(edge_times) >= 2:
+                period = edge_times[-1] - edge_times[-2]
+            else:
+                period = None
+
+            n_before = len(edge_times)
+            state["halt_t"] = None
+            wall0 = time.perf_counter()
+            cpu0 = time.process_time()
+
+            deadline = wall0 + EDGE_TIMEOUT
+            if mode == "poll":
+                while time.perf_counter() < deadline:
+                    if GPIO.input(SENSOR_PIN1) == 1:
+                        servo.throttle = STOP_SPEED
+                        state["halt_t"] = time.perf_counter()
+                        break
+                    time.sleep(0.001)
+            else:
+                state["armed"] = True
+                while state["halt_t"] is None and time.perf_counter() < deadline:
+                    time.sleep(0.05)
+                state["armed"] = False
+
+            if state["halt_t"] is None:
+                servo.throttle = STOP_SPEED
+                print(f"[{i + 1}/{count}] {EDGE_TIMEOUT:.0f}秒以内にセンサー反応なし（集計対象外）")
+                time.sleep(0.5)
+                continue
+
+            cpu = time.process_time() - cpu0
+            wall = time.perf_counter() - wall0
+            cpu_ratio.append(cpu / wall if wall > 0 else 0.0)
+
+            # ポーリングは割り込みより先に見つけることがあるので少し待ってから基準を取る
+            time.sleep(0.05)
+            if len(edge_times) > n_before and state["halt_t"] < edge_times[n_before]:
+                # ポーリングでセンサー上から始まった（立ち上がりより前に止めている）
+                print(f"[{i + 1}/{count}] センサー上から開始（集計対象外）")
+            elif len(edge_times) > n_before:
+                err = state["halt_t"] - edge_times[n_before]
+                errors_ms.append(err * 1000)
+                if period:
+                    errors_deg.append(err / period * 360)
+                print(f"[{i + 1}/{count}] 停止誤差 {err * 1000:.3f} ms  CPU {cpu_ratio[-1] * 100:.1f}%")
+            else:
+                print(f"[{i + 1}/{count}] エッジ未検出（集計対象外）")
+
+            time.sleep(0.5)
+
+        if errors_ms:
+            errors_ms.sort()
+            print(f"--- {mode} ---")
+            print(f"停止誤差 平均 {sum(errors_ms) / len(errors_ms):.3f} ms / 最大 {errors_ms[-1]:.3f} ms")
+            if errors_deg:
+                print(f"角度換算 平均 {sum(errors_deg) / len(errors_deg):.2f} deg / 最大 {max(errors_deg):.2f} deg")
+            print(f"待機中CPU 平均 {sum(cpu_ratio) / len(cpu_ratio) * 100:.1f}%")
+
+    except KeyboardInterrupt:
+        print("\nテストを終了します。")
+
+    finally:
+        servo.throttle = STOP_SPEED
+        time.sleep(0.1)
+        GPIO.cleanup()
+        pca.deinit()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,300 @@
+"""
+時計の差し替え（main_motor.py と、そこから使うモジュール用）
+
+時間に関わる処理（sleep・時刻・タイムアウト付きの待ち・スレッド起動）は
+time / threading / queue を直接呼ばず、ここの関数を通す。
+  timebase.sleep(0.5)  timebase.monotonic()  timebase.perf_counter_ns()
+  timebase.Event()  timebase.Condition()  timebase.Queue()  timebase.spawn(target)
+
+ふだんは RealClock（そのまま time / threading に渡すだけ）。
+soak.py は起動前に install(VirtualClock()) して、仮想時間で何千ラウンドも回す。
+
+VirtualClock の進め方：
+- spawn() したスレッドとメインスレッドを「参加スレッド」として数える
+- 参加スレッドが全部ここの待ち（sleep / Event.wait / Condition.wait / Queue.get）で眠っていて、
+  どれもすぐには起きられないときだけ、時刻を一番近い期限まで一気に進める
+- なので sleep が他のスレッドより先に終わったり、待ちすぎたりはしない（実時間はほぼかからない）
+- 参加スレッドが time.sleep や、ここを通さない待ちでブロックすると時刻が進まなくなる
+- sleep(0) / wait(0) も 1 ns 進むまで待つ（ポーリングで回り続けても時刻は進む）
+"""
+import heapq
+import itertools
+import math
+import queue
+import threading
+import time
+
+# ===================== 実時間 =====================
+class RealClock:
+    virtual = False
+
+    def monotonic(self):
+        return time.monotonic()
+
+    def monotonic_ns(self):
+        return time.monotonic_ns()
+
+    def perf_counter_ns(self):
+        return time.perf_counter_ns()
+
+    def sleep(self, seconds):
+        time.sleep(seconds)
+
+    def Event(self):
+        return threading.Event()
+
+    def Condition(self, lock=None):
+        return threading.Condition(lock)
+
+    def Queue(self):
+        return queue.Queue()
+
+    def PriorityQueue(self):
+        return queue.PriorityQueue()
+
+    def spawn(self, target, name=None, args=()):
+        thread = threading.Thread(target=target, name=name, args=args, daemon=True)
+        thread.start()
+        return thread
+
+# ===================== 仮想時間 =====================
+_TIMEOUT = object()
+
+class _Waiter:
+    __slots__ = ("ready", "deadline")
+
+    def __init__(self, ready, deadline):
+        self.ready = ready
+        self.deadline = deadline
+
+class VirtualClock:
+    virtual = True
+
+    def __init__(self, start_ns=0):
+        self._now = start_ns
+        self._cond = threading.Condition()
+        self._members = {threading.get_ident()}   # 参加スレッド（メインスレッドを含む）
+        self._idle = set()                         # 参加スレッドのうち待ちで眠っているもの
+        self._waiters = []
+        self.advances = 0
+
+    # ---------- 時刻 ----------
+    def monotonic(self):
+        return self._now / 1e9
+
+    def monotonic_ns(self):
+        return self._now
+
+    def perf_counter_ns(self):
+        return self._now
+
+    # ---------- 待ち ----------
+    def _advance_locked(self):
+        """参加スレッドが全員眠っていて、誰も起きられないなら一番近い期限まで進める（進めたら True）"""
+        if not self._members <= self._idle:
+            return False
+        deadlines = []
+        for w in self._waiters:
+            if w.deadline is not None and w.deadline <= self._now:
+                return False
+            if w.ready():
+                return False
+            if w.deadline is not None:
+                deadlines.append(w.deadline)
+        if not deadlines:
+            return False
+        self._now = min(deadlines)
+        self.advances += 1
+        self._cond.notify_all()
+        return True
+
+    def _block(self, ready, timeout=None, take=None):
+        """
+        ready() が真になるか timeout 秒たつまで眠る（ready はロック内で評価する）。
+        真になったら take() をロック内で呼んでその値を、タイムアウトなら _TIMEOUT / False を返す
+        """
+        with self._cond:
+            if ready():
+                return take() if take else True
+            if take and timeout is not None and timeout <= 0:
+                return _TIMEOUT
+            # 0 秒待ちでも 1 ns は進める（float の丸めで期限が「今」と同じになったまま回り続けないように）
+            deadline = None if timeout is None else self._now + max(1, math.ceil(timeout * 1e9))
+            me = threading.get_ident()
+            waiter = _Waiter(ready, deadline)
+            self._waiters.append(waiter)
+            self._idle.add(me)
+            try:
+                while True:
+                    if ready():
+                        return take() if take else True
+                    if deadline is not None and self._now >= deadline:
+                        return _TIMEOUT if take else False
+                    # 自分で時刻を進めたときは眠らずに確認し直す
+                    if not self._advance_locked():
+                        self._cond.wait()
+            finally:
+                self._waiters.remove(waiter)
+                self._idle.discard(me)
+
+    def _changed(self):
+        """待っている条件が変わったかもしれない（set / put / notify から呼ぶ）"""
+        with self._cond:
+            self._cond.notify_all()
+
+    def sleep(self, seconds):
+        self._block(lambda: False, max(seconds, 0.0))
+
+    def Event(self):
+        return _VirtualEvent(self)
+
+    def Condition(self, lock=None):
+        return _VirtualCondition(self, lock)
+
+    def Queue(self):
+        return _VirtualQueue(self, fifo=True)
+
+    def PriorityQueue(self):
+        return _VirtualQueue(self, fifo=False)
+
+    # ---------- スレッド ----------
+    def spawn(self, target, name=None, args=()):
+        started = threading.Event()
+
+        def run():
+            with self._cond:
+                self._members.add(threading.get_ident())
+            started.set()
+            try:
+                target(*args)
+            finally:
+                with self._cond:
+                    self._members.discard(threading.get_ident())
+                    self._advance_locked()
+
+        thread = threading.Thread(target=run, name=name, daemon=True)
+        thread.start()
+        # 参加してから戻る（起動直後に時刻が進んでしまわないように）
+        started.wait()
+        return thread
+
+class _VirtualEvent:
+    def __init__(self, clock):
+        self._clock = clock
+        self._flag = False
+
+    def is_set(self):
+        return self._flag
+
+    def set(self):
+        self._flag = True
+        self._clock._changed()
+
+    def clear(self):
+        self._flag = False
+
+    def wait(self, timeout=None):
+        return self._clock._block(lambda: self._flag, timeout)
+
+class _VirtualCondition:
+    """threading.Condition 相当（notify は notify_all として扱う。呼び出し側は条件を確認し直すこと）"""
+    def __init__(self, clock, lock=None):
+        self._clock = clock
+        self._lock = lock if lock is not None else threading.RLock()
+        self._gen = 0
+
+    def __enter__(self):
+        return self._lock.__enter__()
+
+    def __exit__(self, *exc):
+        return self._lock.__exit__(*exc)
+
+    def wait(self, timeout=None):
+        gen = self._gen
+        self._lock.release()
+        try:
+            return self._clock._block(lambda: self._gen != gen, timeout)
+        finally:
+            self._lock.acquire()
+
+    def notify(self, n=1):
+        self.notify_all()
+
+    def notify_all(self):
+        with self._clock._cond:
+            self._gen += 1
+            self._clock._cond.notify_all()
+
+class _VirtualQueue:
+    """queue.Queue / queue.PriorityQueue の put / get / qsize 相当"""
+    def __init__(self, clock, fifo):
+        self._clock = clock
+        self._fifo = fifo
+        self._items = []
+        self._order = itertools.count()
+
+    def qsize(self):
+        return len(self._items)
+
+    def put(self, item):
+        with self._clock._cond:
+            if self._fifo:
+                heapq.heappush(self._items, (next(self._order), item))
+            else:
+                heapq.heappush(self._items, item)
+            self._clock._cond.notify_all()
+
+    def _take(self):
+        item = heapq.heappop(self._items)
+        return item[1] if self._fifo else item
+
+    def get(self, block=True, timeout=None):
+        if not block:
+            timeout = 0
+        with self._clock._cond:
+            if self._items:
+                return self._take()
+        item = self._clock._block(lambda: bool(self._items), timeout, take=self._take)
+        if item is _TIMEOUT:
+            raise queue.Empty
+        return item
+
+# ===================== 現在の時計 =====================
+_clock = RealClock()
+
+def install(clock):
+    """時計を差し替える（Event などを作るモジュールを import する前に呼ぶこと）"""
+    global _clock
+    _clock = clock
+    return clock
+
+def current():
+    return _clock
+
+def monotonic():
+    return _clock.monotonic()
+
+def monotonic_ns():
+    return _clock.monotonic_ns()
+
+def perf_counter_ns():
+    return _clock.perf_counter_ns()
+
+def sleep(seconds):
+    _clock.sleep(seconds)
+
+def Event():
+    return _clock.Event()
+
+def Condition(lock=None):
+    return _clock.Condition(lock)
+
+def Queue():
+    return _clock.Queue()
+
+def PriorityQueue():
+    return _clock.PriorityQueue()
+
+def spawn(target, name=None, args=()):
+    """デーモンスレッドを起動する（仮想時間では参加スレッドとして数える）"""
+    return _clock.spawn(target, name, args)
@@ -0,0 +1,126 @@
+"""
+演出シーケンス（main_motor.py 用）
+
+フリーズ・後告知などの「何秒後に何をする」をデータ（Timeline）として書き、
+スケジューラスレッド1本が timebase.monotonic の絶対時刻で実行する。
+- 各ステップの時刻はシーケンス開始からの秒。sleep の積み重ねでずれていかない
+- play() はすぐ戻る。戻り値の Run で wait() / cancel() できる
+- ステップごとの遅れ（予定時刻との差）を記録し、終了時に表示する
+"""
+import heapq
+import itertools
+import threading
+from collections import namedtuple
+
+import slotlog
+import timebase
+
+_log = slotlog.get("TL")
+
+Step = namedtuple("Step", "at name action")
+
+class Timeline:
+    """
+    steps   : [(開始からの秒, 名前, 関数), ...]
+    duration: シーケンスの長さ（最後のステップの後も待つ時間を含める場合。省略時は最後のステップ）
+    """
+    def __init__(self, name, steps, duration=None):
+        self.name = name
+        self.steps = sorted((Step(*s) for s in steps), key=lambda s: s.at)
+        last = self.steps[-1].at if self.steps else 0.0
+        self.duration = last if duration is None else max(duration, last)
+
+class Run:
+    def __init__(self, timeline, start):
+        self.timeline = timeline
+        self.start = start
+        self.cancelled = False
+        self.log = []       # (ステップ名, 遅れms)
+        self._remaining = len(timeline.steps) + 1   # +1 は終端
+        self._done = timebase.Event()
+
+    @property
+    def done(self):
+        return self._done.is_set()
+
+    def wait(self, timeout=None):
+        """終わるまで待つ。最後まで実行されたら True、キャンセルされたら False"""
+        self._done.wait(timeout)
+        return self._done.is_set() and not self.cancelled
+
+    def cancel(self):
+        """まだ実行していないステップを捨てて終わらせる"""
+        self.cancelled = True
+        self._done.set()
+
+    def _finish_one(self):
+        self._remaining -= 1
+        if self._remaining == 0:
+            self._done.set()
+
+    def report(self):
+        worst = max((late for _, late in self.log), default=0.0)
+        head = f"[TL] {self.timeline.name}: {'キャンセル' if self.cancelled else '完了'}（最大遅れ {worst:.2f} ms）"
+        return "\n".join([head] + [f"  {name:<20} {late:+8.2f} ms" for name, late in self.log])
+
+class Scheduler:
+    def __init__(self, verbose=True):
+        self.verbose = verbose
+        self._cond = timebase.Condition()
+        self._heap = []     # (予定時刻, 順番, Run, Step or None)
+        self._order = itertools.count()
+        self._thread = timebase.spawn(self._run, name="timeline")
+
+    def play(self, timeline):
+        start = timebase.monotonic()
+        run = Run(timeline, start)
+        with self._cond:
+            for step in timeline.steps:
+                heapq.heappush(self._heap, (start + step.at, next(self._order), run, step))
+            heapq.heappush(self._heap, (start + timeline.duration, next(self._order), run, None))
+            self._cond.notify()
+        return run
+
+    def cancel_all(self):
+        """実行待ちのシーケンスをすべて止める（終了処理用）"""
+        with self._cond:
+            runs = {entry[2] for entry in self._heap}
+            self._heap.clear()
+        for run in runs:
+            run.cancel()
+
+    def run(self, timeline):
+        """play して終わるまで待つ（呼び出し側のスレッドはその間眠るだけ）"""
+        run = self.play(timeline)
+        run.wait()
+        return run
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while True:
+                    if not self._heap:
+                        self._cond.wait()
+                        continue
+                    due, _, run, step = self._heap[0]
+                    if run.cancelled:
+                        heapq.heappop(self._heap)
+                        continue
+                    delay = due - timebase.monotonic()
+                    if delay <= 0:
+                        heapq.heappop(self._heap)
+                        break
+                    self._cond.wait(delay)
+            # ステップの実行はロックの外（中で play() を呼んでもよい）
+            late = (timebase.monotonic() - due) * 1000
+            if step is None:
+                run._finish_one()
+                if self.verbose:
+                    _log.info("%s", run.report())
+                continue
+            run.log.append((step.name, late))
+            try:
+                step.action()
+            except Exception as e:
+                _log.error("[TL] %s/%s 失敗: %s", run.timeline.name, step.name, e)
+            run._finish_one()
@@ -0,0 +1,80 @@
+"""
+演出動画を表示サイズのRGB生フレーム（.rgbf）に事前変換するビルドツール
+
+  python transcode_assets.py                       # sub.py の演出動画をまとめて変換
+  python transcode_assets.py --size 1280x400 a.mp4 # 個別指定
+
+出力は動画と同じ場所の <名前>.rgbf。sub.py は起動時にこれを見つけると
+mmap でそのまま再生する（再生時のリサイズ・色変換なし）。
+"""
+import argparse
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+
+import rawframes
+import video
+
+# sub.py の表示サイズ・演出動画と合わせる
+SCREEN_WIDTH = 1280
+SCREEN_HEIGHT = 400
+DEFAULT_VIDEOS = ["bigbonus_fix2.mp4", "freeze_movie.mp4", "button.mp4"]
+
+def transcode(src, size, force=False):
+    dst = rawframes.raw_path(src)
+    if not force and os.path.exists(dst) and os.path.getmtime(dst) >= os.path.getmtime(src):
+        print(f"[SKIP] {dst} は最新です")
+        return True
+
+    cap = cv2.VideoCapture(src)
+    if not cap.isOpened():
+        print(f"[ERROR] 動画が開けません: {src}")
+        return False
+
+    fps = cap.get(cv2.CAP_PROP_FPS)
+    if not fps or fps <= 1:
+        fps = 30
+
+    t0 = time.perf_counter()
+    writer = rawframes.RawFrameWriter(dst, size, fps)
+    # 再生時（.mp4 を直接流すとき）と同じ変換を使う（補間が違うと .rgbf と見た目がずれる）
+    video.load_cv2()
+    w, h = size
+    resize_buf = np.empty((h, w, 3), dtype=np.uint8)
+    rgb = np.empty((h, w, 3), dtype=np.uint8)
+    try:
+        while True:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            video.convert_into(frame, size, resize_buf, rgb, bgr=False)
+            writer.write(rgb)
+        writer.close()
+    except BaseException:
+        writer.abort()
+        raise
+    finally:
+        cap.release()
+
+    mb = os.path.getsize(dst) / 1e6
+    print(f"[OK] {src} -> {dst}: {writer.count}フレーム {fps:.2f}fps {mb:.1f}MB ({time.perf_counter() - t0:.1f}s)")
+    return True
+
+def main():
+    parser = argparse.ArgumentParser(description="演出動画を .rgbf に事前変換")
+    parser.add_argument("videos", nargs="*", default=DEFAULT_VIDEOS)
+    parser.add_argument("--size", default=f"{SCREEN_WIDTH}x{SCREEN_HEIGHT}", help="出力サイズ WxH")
+    parser.add_argument("--force", action="store_true", help="最新でも作り直す")
+    args = parser.parse_args()
+
+    w, h = (int(v) for v in args.size.lower().split("x"))
+    ok = True
+    for path in args.videos:
+        ok = transcode(path, (w, h), args.force) and ok
+    return 0 if ok else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,433 @@
+"""
+動画フレーム供給（sub.py の演出動画用）
+
+open_source(path, size, cache) が返すフレームソースは共通で
+  .fps / next_surface() -> Surface or None（終端） / rewind() / release()
+を持つ。sub.py は blit と display.update だけを行う。
+
+- CachedSource  : 変換済み Surface を返すだけ。transcode_assets.py で作った .rgbf（mmap、最優先）か
+                  FrameCache に載ったクリップ（デコード・リサイズ・色変換済み）
+- PrefetchSource: キャッシュに載らないとき。別スレッドで先にデコードし、リングバッファから渡す
+- CaptureSource : 先読みなし（cv2 で毎フレーム変換し、1枚の Surface を書き換える）
+"""
+import os
+import queue
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+import pygame
+
+import rawframes
+
+DEFAULT_FPS = 30
+
+# cv2 は import だけで起動時間を食うので、最初にデコードするときに読み込む
+# （.rgbf だけで再生できる場合は一度も読み込まない）
+cv2 = None
+
+def load_cv2():
+    global cv2
+    if cv2 is None:
+        import cv2 as _cv2
+        cv2 = _cv2
+    return cv2
+
+def _clip_fps(cap):
+    fps = cap.get(cv2.CAP_PROP_FPS)
+    if not fps or fps <= 1:
+        fps = DEFAULT_FPS
+    return fps
+
+def frame_target(size):
+    """
+    1クリップで使い回す描画先（numpy バッファ + その上にかぶせた Surface）を作る。
+    cv2 の出力を dst= でこのバッファへ直接書けば、フレームごとの bytes/Surface 確保が消える。
+    pygame が 'BGR' を受け付ければ cv2 の並びのまま見せて色変換も省く。
+    戻り値: (buf, surface, bgr)
+    """
+    w, h = size
+    buf = np.empty((h, w, 3), dtype=np.uint8)
+    try:
+        return buf, pygame.image.frombuffer(buf, size, 'BGR'), True
+    except ValueError:
+        return buf, pygame.image.frombuffer(buf, size, 'RGB'), False
+
+def convert_into(frame, size, resize_buf, target, bgr):
+    """frame(BGR) を size にリサイズして target へ書き込む（確保なし。transcode_assets.py も同じ変換を使う）"""
+    if bgr:
+        cv2.resize(frame, size, dst=target)
+    else:
+        cv2.resize(frame, size, dst=resize_buf)
+        cv2.cvtColor(resize_buf, cv2.COLOR_BGR2RGB, dst=target)
+
+# ===================== デコード済みクリップ =====================
+class Clip:
+    """1クリップ分のRGBフレーム（1本の bytearray に連続格納し、Surfaceはその上のビュー）"""
+    def __init__(self, path, size, fps, data, count):
+        self.path = path
+        self.size = size
+        self.fps = fps
+        self.count = count
+        self._data = data
+        frame_bytes = size[0] * size[1] * 3
+        view = memoryview(data)
+        self.frames = [
+            pygame.image.frombuffer(view[i * frame_bytes:(i + 1) * frame_bytes], size, 'RGB')
+            for i in range(count)
+        ]
+
+    @property
+    def nbytes(self):
+        return len(self._data)
+
+def decode_clip(path, size, max_bytes=None):
+    """動画を一度だけデコードして Clip にする（max_bytes を超えるなら None）"""
+    load_cv2()
+    cap = cv2.VideoCapture(path)
+    if not cap.isOpened():
+        return None
+    try:
+        fps = _clip_fps(cap)
+        w, h = size
+        frame_bytes = w * h * 3
+        estimate = int(cap.get(cv2.CAP_PROP_FRAME_COUNT) or 0)
+        if max_bytes is not None and estimate * frame_bytes > max_bytes:
+            return None
+
+        capacity = max(estimate, 1)
+        data = bytearray(capacity * frame_bytes)
+        count = 0
+        while True:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            if count >= capacity:
+                # フレーム数の見積もりが外れた分だけ伸ばす
+                capacity = capacity * 2
+                if max_bytes is not None and capacity * frame_bytes > max_bytes:
+                    capacity = max_bytes // frame_bytes
+                    if count >= capacity:
+                        return None
+                data.extend(bytes((capacity * frame_bytes) - len(data)))
+            dst = np.frombuffer(data, dtype=np.uint8, count=frame_bytes, offset=count * frame_bytes).reshape(h, w, 3)
+            resized = cv2.resize(frame, size)
+            cv2.cvtColor(resized, cv2.COLOR_BGR2RGB, dst=dst)
+            # data を伸ばす・切り詰めるときに参照が残っていると BufferError になる
+            del dst
+            count += 1
+        if count == 0:
+            return None
+        del data[count * frame_bytes:]
+        return Clip(path, size, fps, data, count)
+    finally:
+        cap.release()
+
+# ===================== キャッシュ =====================
+class FrameCache:
+    """
+    デコード済みクリップのキャッシュ（メモリ上限つき・LRUで追い出し）
+    - get() は初回再生時にデコードし、以後はキャッシュを返す
+    - 上限に収まらないクリップは None（呼び出し側はストリーム再生にフォールバック）
+    """
+    def __init__(self, size, budget_bytes):
+        self.size = size
+        self.budget_bytes = budget_bytes
+        self._clips = OrderedDict()
+        self._failed = set()
+        self._lock = threading.Lock()
+        self._path_locks = {}
+
+    @property
+    def used_bytes(self):
+        with self._lock:
+            return sum(c.nbytes for c in self._clips.values())
+
+    def _path_lock(self, path):
+        with self._lock:
+            return self._path_locks.setdefault(path, threading.Lock())
+
+    def lookup(self, path):
+        with self._lock:
+            clip = self._clips.get(path)
+            if clip is not None:
+                self._clips.move_to_end(path)
+            return clip
+
+    def get(self, path):
+        clip = self.lookup(path)
+        if clip is not None:
+            return clip
+        # 同じクリップを二重にデコードしない（先読み中なら待つ）
+        with self._path_lock(path):
+            clip = self.lookup(path)
+            if clip is not None or path in self._failed:
+                return clip
+            try:
+                clip = decode_clip(path, self.size, self.budget_bytes)
+            except Exception as e:
+                print(f"[CACHE] デコード失敗（ストリーム再生で継続）: {path}: {e}")
+                clip = None
+            if clip is None:
+                self._failed.add(path)
+                return None
+            self._insert(clip)
+            return clip
+
+    def _insert(self, clip):
+        with self._lock:
+            used = sum(c.nbytes for c in self._clips.values())
+            while self._clips and used + clip.nbytes > self.budget_bytes:
+                _, old = self._clips.popitem(last=False)
+                used -= old.nbytes
+                print(f"[CACHE] 追い出し: {old.path}")
+            self._clips[clip.path] = clip
+            print(f"[CACHE] {clip.path}: {clip.count}フレーム {clip.nbytes / 1e6:.1f}MB（使用 {(used + clip.nbytes) / 1e6:.1f}MB）")
+
+    def preload(self, paths):
+        """起動時の先読み（別スレッドで呼ぶ想定）"""
+        for path in paths:
+            if open_raw(path, self.size) is not None:
+                continue
+            if os.path.exists(path):
+                self.get(path)
+
+# ===================== 事前変換済みコンテナ =====================
+_raw_lock = threading.Lock()
+_raw_clips = {}   # path -> (RawClip, [Surface]) / None（使えない）
+
+def open_raw(path, size):
+    """path に対応する .rgbf があり、表示サイズと一致すれば (RawClip, Surface一覧) を返す"""
+    with _raw_lock:
+        if path in _raw_clips:
+            return _raw_clips[path]
+        entry = None
+        rpath = rawframes.raw_path(path)
+        if os.path.exists(rpath):
+            try:
+                raw = rawframes.RawClip(rpath)
+                if raw.size != tuple(size):
+                    print(f"[RAW] サイズ不一致のため使いません: {rpath} {raw.size}")
+                    raw.close()
+                else:
+                    # mmap 上のビューとして Surface を一度だけ作る（再生中は確保なし）
+                    surfaces = [pygame.image.frombuffer(raw.frame(i), raw.size, 'RGB') for i in range(raw.count)]
+                    entry = (raw, surfaces)
+                    print(f"[RAW] {rpath}: {raw.count}フレーム {raw.fps:.2f}fps")
+            except (OSError, ValueError) as e:
+                print(f"[RAW] 読み込み失敗: {rpath}: {e}")
+        _raw_clips[path] = entry
+        return entry
+
+# ===================== フレームソース =====================
+class CachedSource:
+    """変換済み Surface の列を順に返す（FrameCache / .rgbf 共通）"""
+    def __init__(self, frames, fps):
+        self.fps = fps
+        self._frames = frames
+        self._pos = 0
+
+    def next_surface(self):
+        if self._pos >= len(self._frames):
+            return None
+        surf = self._frames[self._pos]
+        self._pos += 1
+        return surf
+
+    def rewind(self):
+        self._pos = 0
+
+    def release(self):
+        pass
+
+class CaptureSource:
+    """先読みなし。描画先 Surface は1つだけ確保し、毎フレームその中身を書き換える"""
+    def __init__(self, cap, size):
+        self._cap = cap
+        self._size = size
+        self.fps = _clip_fps(cap)
+        self._buf, self._surface, self._bgr = frame_target(size)
+        self._resize_buf = None if self._bgr else np.empty_like(self._buf)
+
+    def next_surface(self):
+        ret, frame = self._cap.read()
+        if not ret:
+            return None
+        convert_into(frame, self._size, self._resize_buf, self._buf, self._bgr)
+        return self._surface
+
+    def rewind(self):
+        self._cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+
+    def release(self):
+        self._cap.release()
+
+class PrefetchSource:
+    """
+    デコード先読み（生産者スレッド + 事前確保したリングバッファ）
+    - 生産者: cap.read -> resize（-> cvtColor）をリングの空きバッファへ直接書き込む
+    - 描画側: next_surface() で出来上がったフレームを受け取るだけ
+    - 描画が遅れたら期限切れのフレームを捨てて追いつく（dropped）
+    - 描画時にフレームが間に合っていなければ underruns を数えて待つ
+    loop=True なら終端で先頭に戻して生産を続ける（button.mp4 のループ再生用）
+    """
+    def __init__(self, cap, size, ring_size=6, loop=False):
+        if ring_size < 3:
+            raise ValueError("ring_size は3以上（表示中・デコード中・待機）")
+        self._cap = cap
+        self._size = size
+        self._loop = loop
+        self.fps = _clip_fps(cap)
+        targets = [frame_target(size) for _ in range(ring_size)]
+        self._bufs = [t[0] for t in targets]
+        self._surfaces = [t[1] for t in targets]
+        self._bgr = targets[0][2]
+        self._resize_buf = None if self._bgr else np.empty_like(self._bufs[0])
+
+        self._free = queue.Queue()
+        self._ready = queue.Queue()
+        self._held = None
+        self._ended = False
+        self._t0 = None
+
+        self.decoded = 0
+        self.shown = 0
+        self.dropped = 0
+        self.underruns = 0
+
+        self._start()
+
+    def _start(self):
+        for i in range(len(self._bufs)):
+            self._free.put(i)
+        self._stop = threading.Event()
+        # キューは生産者に渡しておく（rewind で作り直しても古いスレッドが新しいキューに書かない）
+        self._thread = threading.Thread(target=self._producer, args=(self._free, self._ready, self._stop), daemon=True)
+        self._thread.start()
+
+    def _producer(self, free, ready, stop):
+        idx = 0
+        try:
+            while True:
+                slot = free.get()
+                if slot is None or stop.is_set():
+                    return
+                ret, frame = self._cap.read()
+                if not ret and self._loop and idx > 0:
+                    self._cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+                    ret, frame = self._cap.read()
+                if not ret:
+                    return
+                convert_into(frame, self._size, self._resize_buf, self._bufs[slot], self._bgr)
+                self.decoded += 1
+                ready.put((slot, idx))
+                idx += 1
+        except Exception as e:
+            print(f"[VIDEO] デコード失敗: {e}")
+        finally:
+            # 終端・失敗どちらでも描画側を起こす（next_surface が ready.get() で止まらない）
+            ready.put(None)
+
+    def _take(self):
+        try:
+            return self._ready.get_nowait()
+        except queue.Empty:
+            item = self._ready.get()
+            # 終端の印はアンダーランに数えない
+            if item is not None:
+                self.underruns += 1
+            return item
+
+    def next_surface(self):
+        # 前回表示したバッファは blit 済みなので生産者へ返す
+        if self._held is not None:
+            self._free.put(self._held)
+            self._held = None
+        if self._ended:
+            return None
+
+        item = self._take()
+        if item is None:
+            self._ended = True
+            return None
+
+        # 遅れていたら期限切れのフレームを捨てる（次が既にあるときだけ）
+        if self._t0 is not None:
+            due = int((time.monotonic() - self._t0) * self.fps)
+            while item[1] < due:
+                try:
+                    nxt = self._ready.get_nowait()
+                except queue.Empty:
+                    break
+                if nxt is None:
+                    self._ready.put(None)
+                    break
+                self._free.put(item[0])
+                self.dropped += 1
+                item = nxt
+        else:
+            self._t0 = time.monotonic() - item[1] / self.fps
+
+        self._held = item[0]
+        self.shown += 1
+        return self._surfaces[item[0]]
+
+    def _shutdown(self):
+        """生産者を止める（1秒以内に抜けなければ False）"""
+        self._stop.set()
+        self._free.put(None)
+        self._thread.join(timeout=1.0)
+        return not self._thread.is_alive()
+
+    def rewind(self):
+        if not self._shutdown():
+            # まだ cap.read() の中なので cap には触らない（終端のまま。次の rewind でやり直す）
+            print("[VIDEO] 先読みスレッドが止まらないため巻き戻しを見送り")
+            self._ended = True
+            return
+        self._free = queue.Queue()
+        self._ready = queue.Queue()
+        self._held = None
+        self._ended = False
+        self._t0 = None
+        self._cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+        self._start()
+
+    def release(self):
+        if self._shutdown():
+            self._cap.release()
+            return
+        # まだ cap.read() の中なので、抜けるのを待ってから解放する
+        def _release_later():
+            self._thread.join()
+            self._cap.release()
+        threading.Thread(target=_release_later, daemon=True).start()
+
+    def stats(self):
+        return {"decoded": self.decoded, "shown": self.shown, "dropped": self.dropped, "underruns": self.underruns}
+
+def print_stats(src, name):
+    """先読み再生のカウンタを表示（先読み以外は何もしない）"""
+    stats = getattr(src, "stats", None)
+    if stats is not None:
+        s = stats()
+        print(f"[VIDEO] {name}: 表示 {s['shown']} / デコード {s['decoded']} / 破棄 {s['dropped']} / アンダーラン {s['underruns']}")
+
+def open_source(path, size, cache=None, prefetch=True, loop=False):
+    """再生用のフレームソースを返す（開けなければ None）"""
+    raw = open_raw(path, size)
+    if raw is not None:
+        clip, surfaces = raw
+        return CachedSource(surfaces, clip.fps)
+    if cache is not None:
+        clip = cache.get(path)
+        if clip is not None:
+            return CachedSource(clip.frames, clip.fps)
+    load_cv2()
+    cap = cv2.VideoCapture(path)
+    if not cap.isOpened():
+        return None
+    if prefetch:
+        return PrefetchSource(cap, size, loop=loop)
+    return CaptureSource(cap, size)